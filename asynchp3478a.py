@@ -0,0 +1,644 @@
+import time
+import asyncio
+from asyncprologix import AsyncPrologix
+from hp3478a import hp3478aCodec
+
+class AsyncHp3478a(object):
+    """asyncio variant of `hp3478a`
+
+    All methods communicating with the device are coroutines. Commands are
+    built and status readings decoded by `codec`, shared with `hp3478a`;
+    its constants and helpers like `getFunction` or `getRange` work on the
+    last status reading as before and are available here as well.
+
+    Attributes
+    ----------
+    gpib : AsyncPrologix
+        AsyncPrologix object used to communicate with the prologix dongle
+    codec : hp3478aCodec
+        Command set and last status of the device
+    priority : int
+        Bus arbitration priority used for transactions of this device
+    """
+
+    gpib: AsyncPrologix = None
+    codec: hp3478aCodec = None
+    priority: int = AsyncPrologix.PRIO_NORMAL
+
+    def __init__(self, addr: int, port: str=None, baud: int=921600, timeout: float=0.25, prologixGpib: AsyncPrologix=None, debug: bool=False, priority: int=AsyncPrologix.PRIO_NORMAL):
+        """
+
+        The adapter is not contacted before `connect` is awaited
+
+        Parameters
+        ----------
+        addr : int
+            Address of the targeted device
+        port : str, optional
+            path of the serial device to use. Example: `/dev/ttyACM0` or `COM3`
+            If set a new AsyncPrologix instance will be created
+            Either port or prologixGpib must be given
+            by default None
+        baud : int, optional
+            baudrate used for serial communication
+            only used when port is given
+            by default 921600
+        timeout : float, optional
+            number of seconds to wait at maximum for serial data to arrive
+            only used when port is given
+            by default 0.25 seconds
+        prologixGpib : AsyncPrologix, optional
+            AsyncPrologix instance to use for communication
+            Ths may be shared between multiple devices with different addresses
+            Either port or prologixGpib must be given
+            by default None
+        debug : bool, optional
+            Whether to print verbose status messages and all communication
+            by default False
+        priority : int, optional
+            Bus arbitration priority for transactions of this device
+            by default AsyncPrologix.PRIO_NORMAL
+        """
+        if port == None and prologixGpib == None:
+            print("!! You must supply either a serial port or a prologix object")
+
+        self.priority = priority
+
+        if prologixGpib is None:
+            prologixGpib = AsyncPrologix(port=port, baud=baud, timeout=timeout, debug=debug)
+        self.gpib = prologixGpib
+        self.codec = hp3478aCodec(addr, prologixGpib.codec)
+
+    def __getattr__(self, name):
+        return getattr(self.codec, name)
+
+    async def connect(self) -> bool:
+        """Connect to the adapter unless this was already done
+
+        Returns
+        -------
+        bool
+            Whether the adapter is ready
+        """
+        if self.gpib.transport is not None:
+            return True
+        return await self.gpib.connect()
+
+    async def getMeasure(self) -> float:
+        """Get last measurement as float
+
+        Returns
+        -------
+        float
+            last measurement
+        """
+        async with self.gpib.transaction(self.priority):
+            measurement = await self.gpib.cmdPoll(" ", self.addr, kind=self.codec.measureKind)
+
+        if measurement is None:
+            return None
+
+        return float(measurement)
+
+    async def stream(self, count: int=None, digits: float=3.5, autoZero: bool=False, range=None, text: str="STREAM", buffer=None):
+        """Acquire readings as fast as possible
+
+        see `hp3478a.stream`; an async generator, close it using `aclose`
+        to restore the previous configuration early
+
+        Yields
+        ------
+        tuple
+            (monotonic timestamp, value) for each reading; value is None on timeouts
+        """
+        newDigits = self.codec.parseDigits(digits)
+        if newDigits is None:
+            print("!! Invalid digits")
+            return
+        if range is None:
+            newRange = None
+        else:
+            newRange, newRangeF = self.codec.parseRange(range)
+            if newRange is None or newRange == "A":
+                print("!! Invalid range")
+                return
+        if self.codec.displayCmd(text, False) is None:
+            return
+
+        async with self.gpib.transaction(self.priority):
+            previous = await self.getStatus()
+            restore = self.codec.configCmd(previous)
+            if newRange is None:
+                newRange = self.codec.rangeCode(previous.range, previous.function)
+            function = previous.function
+            rng = newRange + self.RANGE_OFFSET[function]
+            await self.gpib.cmdWrite("N" + newDigits + "Z" + str(int(autoZero)) + "R" + str(newRange) + "T1" + "D3" + text, self.addr)
+            self.codec.measureKind = self.codec.readingKind(function, 6 - int(newDigits), autoZero)
+
+        try:
+            n = 0
+            while count is None or n < count:
+                value = await self.getMeasure()
+                timestamp = time.monotonic()
+                if buffer is not None:
+                    buffer.append(timestamp, value, function, rng, self.addr)
+                yield (timestamp, value)
+                n += 1
+        finally:
+            await self.gpib.cmdWrite(restore, self.addr)
+            self.codec.measureKind = self.codec.readingKind(previous.function, previous.digits, previous.autoZero)
+            if self.gpib.trace is not None:
+                self.gpib.log("Restored configuration " + restore)
+
+    async def acquire(self, count: int, **kwargs) -> list:
+        """Acquire a fixed number of readings as fast as possible
+
+        see `stream`
+
+        Returns
+        -------
+        list
+            (monotonic timestamp, value) for each reading
+        """
+        return [reading async for reading in self.stream(count, **kwargs)]
+
+    async def getStatus(self) -> hp3478aCodec.hp3478aStatus:
+        """Read current device status and populate status object
+
+        Returns
+        -------
+        hp3478aStatus
+            Updated status object
+        """
+        async with self.gpib.transaction(self.priority):
+            status = await self.gpib.cmdPoll("B", self.addr, binary=True, frame=5, kind="B")
+        return self.codec.decodeStatus(status)
+
+    async def getFrontRear(self) -> bool:
+        """Get position of Front/Rear switch
+
+        Returns
+        -------
+        bool
+            True  -> Front-Port
+            False -> Rear-Port
+            None  -> Device did not respond
+        """
+        async with self.gpib.transaction(self.priority):
+            check = await self.gpib.cmdPoll("S", self.addr)
+        if check == "1":
+            return True
+        elif check == "0":
+            return False
+        else:
+            return None
+
+    async def getCalibration(self, filename : str=None, chunk: int=32, retries: int=3, progress=None) -> bytearray:
+        """Read device calibration data
+
+        see `hp3478a.getCalibration`
+
+        Returns
+        -------
+        bytearray
+            Raw calibration data
+        """
+        if not await self.prepareCalibration():
+            return None
+
+        cdata = await self.readCalibration(chunk, retries, progress)
+
+        await self.callReset()
+
+        if cdata is not None and filename is not None:
+            with open(filename, "wb") as fp:
+                fp.write(cdata)
+
+        return cdata
+
+    async def setCalibration(self, cdata: bytes, chunk: int=32, retries: int=3, progress=None, force: bool=False) -> bool:
+        """Write device calibration data
+
+        see `hp3478a.setCalibration`
+        """
+        if len(cdata) not in (self.CAL_SIZE, self.CAL_SIZE_LEGACY):
+            print("!! Calibration data must contain " + str(self.CAL_SIZE) + " cells")
+            return False
+        bad = self.codec.calibrationErrors(cdata)
+        if len(bad) > 0 and not force:
+            print("!! Wrong checksum in calibration records " + ", ".join(str(record) for record in bad))
+            return False
+
+        if not await self.prepareCalibration("CAL WRITE"):
+            return False
+
+        ok = False
+        if not (await self.getStatus()).calRAM:
+            print("!! Calibration RAM is write protected, turn on CAL ENABLE")
+        else:
+            current = await self.readCalibration(chunk, retries, progress, checksums=False)
+            if current is not None:
+                changed = [cell for cell in range(len(cdata)) if current[cell] & 0xf != cdata[cell] & 0xf]
+                if self.gpib.trace is not None:
+                    self.gpib.log("" + str(len(changed)) + " calibration cells differ")
+                writer = self.codec.calibrationWriter(cdata, changed, chunk, retries)
+                try:
+                    cells, done = next(writer)
+                    while True:
+                        if progress is not None:
+                            progress(self, done, len(changed))
+                        cells, done = writer.send(await self.writeCalibrationCells(cells, cdata))
+                except StopIteration as result:
+                    ok = result.value
+                if progress is not None and ok:
+                    progress(self, len(changed), len(changed))
+
+        await self.callReset()
+        return ok
+
+    @staticmethod
+    async def getCalibrations(devices: list, filename: str=None, chunk: int=32, retries: int=3, progress=None) -> list:
+        """Read calibration data of many devices at once
+
+        Devices sharing an adapter are read round robin one transfer at a time,
+        different adapters are read concurrently, one task each.
+        see `hp3478a.getCalibrations`
+
+        Returns
+        -------
+        list
+            Raw calibration data or None per device
+        """
+        results = [None] * len(devices)
+        adapters = {}
+        for index, device in enumerate(devices):
+            adapters.setdefault(id(device.gpib), []).append(index)
+
+        async def run(indices):
+            readers = {}
+            for index in indices:
+                if await devices[index].prepareCalibration():
+                    readers[index] = devices[index].codec.calibrationReader(chunk, retries)
+            steps = {}
+            for index, reader in list(readers.items()):
+                steps[index] = next(reader)
+            while len(steps) > 0:
+                for index in list(steps):
+                    device = devices[index]
+                    cells, done = steps[index]
+                    if progress is not None:
+                        progress(device, done, device.CAL_SIZE)
+                    try:
+                        steps[index] = readers[index].send(await device.readCalibrationCells(cells))
+                    except StopIteration as result:
+                        del steps[index]
+                        results[index] = result.value
+                        if progress is not None and result.value is not None:
+                            progress(device, device.CAL_SIZE, device.CAL_SIZE)
+            for index in indices:
+                await devices[index].callReset()
+
+        await asyncio.gather(*(run(indices) for indices in adapters.values()))
+
+        if filename is not None:
+            for index, cdata in enumerate(results):
+                if cdata is not None:
+                    with open(filename.format(addr=devices[index].addr, index=index), "wb") as fp:
+                        fp.write(cdata)
+
+        return results
+
+    async def prepareCalibration(self, text: str="CAL READ") -> bool:
+        """Put the device on hold and show a message before accessing calibration data
+
+        see `hp3478a.prepareCalibration`
+        """
+        await self.callReset()
+        await self.setTrigger(self.TRIG_HLD)
+
+        check = await self.getFrontRear()
+        if check is None:
+            print("Can not connect to instrument")
+            return False
+
+        await self.setDisplay(text)
+        return True
+
+    async def readCalibration(self, chunk: int=32, retries: int=3, progress=None, checksums: bool=True) -> bytearray:
+        """Read the calibration RAM of a prepared device
+
+        see `hp3478a.readCalibration`
+        """
+        reader = self.codec.calibrationReader(chunk, retries, checksums)
+        try:
+            cells, done = next(reader)
+            while True:
+                if progress is not None:
+                    progress(self, done, self.CAL_SIZE)
+                cells, done = reader.send(await self.readCalibrationCells(cells))
+        except StopIteration as result:
+            cdata = result.value
+        if progress is not None and cdata is not None:
+            progress(self, self.CAL_SIZE, self.CAL_SIZE)
+        return cdata
+
+    async def readCalibrationCells(self, cells: list) -> bytes:
+        """Read calibration RAM cells in a single pipelined transfer
+
+        see `hp3478a.readCalibrationCells`
+        """
+        queries = [(self.addr, b"W" + self.gpib.escapeCmd(bytes([cell])), True, 1, "W") for cell in cells]
+        async with self.gpib.transaction(self.gpib.PRIO_LOW):
+            responses = await self.gpib.cmdPollMulti(queries)
+        return self.codec.checkCalibrationCells(responses)
+
+    async def writeCalibrationCells(self, cells: list, cdata: bytes) -> bytes:
+        """Write calibration RAM cells and read them back in a single pipelined transfer
+
+        see `hp3478a.writeCalibrationCells`
+        """
+        queries = [(self.addr, self.codec.calibrationWriteCmd(cell, cdata[cell]), True, 1, "X") for cell in cells]
+        async with self.gpib.transaction(self.gpib.PRIO_LOW):
+            responses = await self.gpib.cmdPollMulti(queries)
+        return self.codec.checkCalibrationCells(responses)
+
+    async def configure(self, function: int=None, range=None, digits: float=None, trigger: int=None, autoZero: bool=None, noUpdate: bool=False) -> bool:
+        """Change several settings in one transaction
+
+        see `hp3478a.configure`
+        """
+        async with self.gpib.transaction(self.priority):
+            cmd = self.codec.configureCmd(function, range, digits, trigger, autoZero)
+            if cmd is None:
+                return False
+            if cmd == "":
+                return True
+
+            if noUpdate:
+                await self.gpib.cmdWrite(cmd, self.addr)
+                return True
+
+            status = await self.gpib.cmdPoll(cmd + "B", self.addr, binary=True, frame=5, kind="B")
+            if status is None or len(status) < 5:
+                print("!! Configuration " + cmd + " sent but device status could not be read")
+                return False
+            self.codec.decodeStatus(status)
+
+        return self.codec.checkConfiguration(cmd, function, range, digits, trigger, autoZero)
+
+    async def setAutoZero(self, autoZero: bool, noUpdate: bool=False) -> bool:
+        """change Auto-Zero setting
+
+        see `hp3478a.setAutoZero`
+        """
+        async with self.gpib.transaction(self.priority):
+            await self.gpib.cmdWrite("Z" + str(int(autoZero)), self.addr)
+
+            if noUpdate:
+                return autoZero
+            await self.getStatus()
+            return self.codec.checkAutoZero(autoZero)
+
+    async def setDisplay(self, text: str=None, online: bool=True) -> bool:
+        """Change device display
+
+        see `hp3478a.setDisplay`
+        """
+        cmd = self.codec.displayCmd(text, online)
+        if cmd is None:
+            return False
+        async with self.gpib.transaction(self.priority):
+            await self.gpib.cmdWrite(cmd, self.addr)
+        return True
+
+    async def setFunction(self, function : int, noUpdate: bool=False) -> bool:
+        """Change current measurement function
+
+        see `hp3478a.setFunction`
+        """
+        if function <= 0 or function > 7:
+            print("!! Invalid function")
+            return False
+
+        async with self.gpib.transaction(self.priority):
+            await self.gpib.cmdWrite("F" + str(function), self.addr)
+
+            if noUpdate:
+                return True
+            await self.getStatus()
+            return self.codec.checkFunction(function)
+
+    async def setRange(self, range : str, noUpdate : bool=False) -> bool:
+        """Change current measurement range
+
+        see `hp3478a.setRange`
+        """
+        newRange, newRangeF = self.codec.parseRange(range)
+        if newRange is None:
+            print("!! Invalid range")
+            return False
+
+        async with self.gpib.transaction(self.priority):
+            await self.gpib.cmdWrite("R" + str(newRange), self.addr)
+
+            if noUpdate:
+                return True
+            await self.getStatus()
+            return self.codec.checkRange(range, newRange, newRangeF)
+
+    async def setDigits(self, digits : float, noUpdate : bool=False) -> bool:
+        """Change current measurement resolution
+
+        see `hp3478a.setDigits`
+        """
+        newDigits = self.codec.parseDigits(digits)
+        if newDigits is None:
+            print("!! Invalid digits")
+            return False
+
+        async with self.gpib.transaction(self.priority):
+            await self.gpib.cmdWrite("N"+newDigits, self.addr)
+
+            if noUpdate:
+                return True
+            await self.getStatus()
+            return self.codec.checkDigits(newDigits)
+
+    async def setTrigger(self, trigger : int, noUpdate : bool=False) -> bool:
+        """Change current measurement trigger
+
+        see `hp3478a.setTrigger`
+        """
+        if trigger <= 0 or trigger > 5:
+            print("!! Invalid digits")
+            return False
+
+        async with self.gpib.transaction(self.priority):
+            await self.gpib.cmdWrite("T" + str(trigger), self.addr)
+
+            if noUpdate:
+                return True
+            await self.getStatus()
+            return self.codec.checkTrigger(trigger)
+
+    async def setSRQ(self, srq:int) -> bool:
+        """Set Serial Poll Register Mask
+
+        see `hp3478a.setSRQ`
+        """
+        if srq < 0 or srq > 0b111111:
+            print("!! Invalid SRQ mask")
+            return False
+        async with self.gpib.transaction(self.priority):
+            await self.gpib.cmdWrite("M" + format(srq, '02o'), self.addr)
+        return True
+
+    async def serialPoll(self) -> int:
+        """Serial poll the device
+
+        Returns
+        -------
+        int|None
+            Serial Poll Register, see the SRQ_* class constants
+            None if the device did not respond
+        """
+        async with self.gpib.transaction(self.priority):
+            return await self.gpib.cmdSpoll(self.addr)
+
+    @staticmethod
+    async def groupTrigger(devices: list) -> tuple:
+        """Trigger multiple devices at once and read all readings
+
+        see `hp3478a.groupTrigger`
+
+        Returns
+        -------
+        tuple
+            (monotonic trigger timestamp, list of values in device order)
+            values are None for devices not responding
+        """
+        gpib = devices[0].gpib
+        async with gpib.transaction(min(device.priority for device in devices)):
+            await gpib.cmdTrigger([device.addr for device in devices])
+            timestamp = time.monotonic()
+            responses = await gpib.cmdPollMulti([(device.addr, " ", False, gpib.FRAME_LINE, device.measureKind) for device in devices])
+        values = []
+        for response in responses:
+            try:
+                values.append(float(response))
+            except (TypeError, ValueError):
+                values.append(None)
+        return (timestamp, values)
+
+    @staticmethod
+    async def groupStream(devices: list, count: int=None, trigger: int=hp3478aCodec.TRIG_HLD):
+        """Acquire synchronized readings of multiple devices using group trigger
+
+        see `hp3478a.groupStream`; an async generator
+
+        Yields
+        ------
+        tuple
+            (monotonic trigger timestamp, list of values in device order)
+        """
+        if len(devices) == 0:
+            return
+        if trigger != hp3478aCodec.TRIG_HLD and trigger != hp3478aCodec.TRIG_SIN:
+            print("!! Group trigger requires TRIG_HLD or TRIG_SIN")
+            return
+        previous = {}
+        for device in devices:
+            status = await device.getStatus()
+            if status.triggerInternal:
+                previous[device] = hp3478aCodec.TRIG_INT
+            elif status.triggerExternal:
+                previous[device] = hp3478aCodec.TRIG_EXT
+            else:
+                previous[device] = hp3478aCodec.TRIG_HLD
+            await device.setTrigger(trigger, noUpdate=True)
+
+        try:
+            n = 0
+            while count is None or n < count:
+                yield await AsyncHp3478a.groupTrigger(devices)
+                n += 1
+        finally:
+            for device in devices:
+                await device.setTrigger(previous[device], noUpdate=True)
+
+    @staticmethod
+    async def srqStream(devices: list, count: int=None, interval: float=0.001, onError=None):
+        """Acquire readings of multiple devices driven by SRQ instead of blind polling
+
+        see `hp3478a.srqStream`; an async generator, other tasks run while
+        the SRQ line is idle
+
+        Yields
+        ------
+        tuple
+            (monotonic timestamp, device, value) for each reading;
+            stops early if the adapter does not answer `++srq`
+        """
+        if len(devices) == 0:
+            return
+        gpib = devices[0].gpib
+        mask = hp3478aCodec.SRQ_READING | hp3478aCodec.SRQ_SYNTAX | hp3478aCodec.SRQ_HWERR
+        previous = {}
+        for device in devices:
+            previous[device] = device.getSRQ(await device.getStatus())
+            await device.setSRQ(mask)
+            await device.clearSPR()
+
+        try:
+            n = 0
+            while count is None or n < count:
+                srq = await gpib.cmdSrq()
+                if srq is None:
+                    print("!! Adapter did not report the SRQ line, stopping")
+                    return
+                if not srq:
+                    await asyncio.sleep(interval)
+                    continue
+                for device in devices:
+                    spr = await device.serialPoll()
+                    if spr is None:
+                        continue
+                    if spr & (hp3478aCodec.SRQ_SYNTAX | hp3478aCodec.SRQ_HWERR):
+                        err = None
+                        if spr & hp3478aCodec.SRQ_HWERR:
+                            err = await device.clearERR()
+                        await device.clearSPR()
+                        if onError is not None:
+                            onError(device, spr, err)
+                        else:
+                            print("!! Device " + str(device.addr) + " reported error; SPR " + str(spr) + ", ERR " + str(err))
+                    if spr & hp3478aCodec.SRQ_READING and (count is None or n < count):
+                        value = await device.getMeasure()
+                        yield (time.monotonic(), device, value)
+                        n += 1
+        finally:
+            for device in devices:
+                await device.setSRQ(previous[device])
+
+    async def clearSPR(self):
+        """Clear Serial Poll Register (SPR)
+        """
+        async with self.gpib.transaction(self.priority):
+            await self.gpib.cmdWrite("K", self.addr)
+
+    async def clearERR(self) -> bytearray:
+        """Clear Error Registers
+
+        Returns
+        -------
+        bytearray
+            Error register as octal digits
+        """
+        async with self.gpib.transaction(self.priority):
+            return await self.gpib.cmdPoll("E", self.addr, binary=True)
+
+    async def callReset(self):
+        """Reset the device
+        """
+        async with self.gpib.transaction(self.priority):
+            await self.gpib.cmdClr(self.addr)
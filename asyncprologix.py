@@ -0,0 +1,467 @@
+import time
+import asyncio
+import itertools
+import contextlib
+from collections import deque
+import serial_asyncio
+from prologix import prologix, prologixCodec
+
+class asyncArbiter(object):
+    """Serialize whole GPIB transactions between asyncio tasks
+
+    Counterpart of `busArbiter` for one event loop: waiting transactions are
+    granted by priority (lower value first), improved by `aging` every
+    second of waiting. A task already owning the bus may start nested
+    transactions which are granted immediately; tasks it spawns are not the
+    owner and have to wait.
+
+    Attributes
+    ----------
+    aging : float
+        Priority improvement per second of waiting
+    transactions : int
+        Number of granted (outermost) transactions
+    maxQueueDepth : int
+        Highest number of waiting transactions seen
+    waitTotal : float
+        Sum of all wait times in seconds
+    waitMax : float
+        Longest wait time in seconds
+    waits : deque
+        Most recent wait times in seconds
+    """
+
+    aging: float = 10.0
+    transactions: int = 0
+    maxQueueDepth: int = 0
+    waitTotal: float = 0.0
+    waitMax: float = 0.0
+
+    def __init__(self, aging: float=10.0, history: int=1000):
+        """
+
+        Parameters
+        ----------
+        aging : float, optional
+            Priority improvement per second of waiting
+            by default 10.0
+        history : int, optional
+            Number of recent wait times kept for percentiles
+            by default 1000
+        """
+        self.aging = aging
+        self.cond = asyncio.Condition()
+        self.owner = None
+        self.depth = 0
+        self.waiting = []
+        self.seq = itertools.count()
+        self.waits = deque(maxlen=history)
+
+    async def acquire(self, priority: int=10):
+        """Wait until the calling task owns the bus
+
+        Parameters
+        ----------
+        priority : int, optional
+            lower values are granted first
+            by default 10
+        """
+        me = asyncio.current_task()
+        async with self.cond:
+            if self.owner is me:
+                self.depth += 1
+                return
+            start = time.monotonic()
+            if self.owner is not None or len(self.waiting) > 0:
+                # see busArbiter.acquire
+                ticket = (priority + self.aging * start, next(self.seq))
+                self.waiting.append(ticket)
+                self.maxQueueDepth = max(self.maxQueueDepth, len(self.waiting))
+                try:
+                    await self.cond.wait_for(lambda: self.owner is None and min(self.waiting) == ticket)
+                finally:
+                    # A cancelled waiter must not block the ones behind it
+                    self.waiting.remove(ticket)
+                    self.cond.notify_all()
+            self.owner = me
+            self.depth = 1
+            waited = time.monotonic() - start
+            self.transactions += 1
+            self.waitTotal += waited
+            self.waitMax = max(self.waitMax, waited)
+            self.waits.append(waited)
+
+    async def release(self):
+        """Release the bus after `acquire`
+        """
+        async with self.cond:
+            if self.owner is not asyncio.current_task():
+                raise RuntimeError("Bus released by a task not owning it")
+            self.depth -= 1
+            if self.depth == 0:
+                self.owner = None
+                self.cond.notify_all()
+
+    @contextlib.asynccontextmanager
+    async def transaction(self, priority: int=10):
+        """Async context manager around `acquire` and `release`
+
+        Parameters
+        ----------
+        priority : int, optional
+            lower values are granted first
+            by default 10
+        """
+        await self.acquire(priority)
+        try:
+            yield self
+        finally:
+            await self.release()
+
+    def queueDepth(self) -> int:
+        """Get the number of waiting transactions
+
+        Returns
+        -------
+        int
+            waiting transactions
+        """
+        return len(self.waiting)
+
+class AsyncPrologix(object):
+    """asyncio variant of `prologix`
+
+    Same command semantics as `prologix` but all I/O methods are coroutines
+    and never block the event loop. Encoding, shadow state, learned timeouts
+    and tracing are shared with `prologix` through `codec`; its attributes
+    and helpers like `escapeCmd` are available here as well. Transactions are
+    serialized by an `asyncArbiter` so several tasks may share one adapter.
+
+    Requires pyserial-asyncio
+
+    Attributes
+    ----------
+    port : str
+        path of the serial device to use
+    baud : int
+        baudrate used for serial communication
+    codec : prologixCodec
+        Protocol state, change settings like `cache` or `timeout` here
+    transport : asyncio.Transport
+        Serial transport; None while not connected
+    arbiter : asyncArbiter
+        Serializes transactions of multiple tasks sharing this adapter
+    """
+
+    port: str = None
+    baud: int = 921600
+    codec: prologixCodec = None
+    transport: object = None
+    arbiter: asyncArbiter = None
+
+    PRIO_HIGH   = prologix.PRIO_HIGH
+    PRIO_NORMAL = prologix.PRIO_NORMAL
+    PRIO_LOW    = prologix.PRIO_LOW
+
+    class receiver(asyncio.Protocol):
+        """Collects received data for `AsyncPrologix`
+        """
+
+        def __init__(self, gpib):
+            self.gpib = gpib
+
+        def data_received(self, data: bytes):
+            self.gpib.buffer += data
+            self.gpib.received.set()
+
+        def connection_lost(self, exc):
+            self.gpib.transport = None
+            self.gpib.received.set()
+
+    def __init__(self, port: str, baud: int=921600, timeout: float=2.5, debug: bool=False, cache: bool=True, adaptive: bool=True, metrics: bool=False):
+        """
+
+        The serial port is not opened before `connect` is awaited
+
+        Parameters
+        ----------
+        port : str
+            path of the serial device to use. Example: `/dev/ttyACM0` or `COM3`
+        baud : int, optional
+            baudrate used for serial communication
+            by default 921600
+        timeout : float, optional
+            number of seconds to wait at maximum for serial data to arrive
+            by default 2.5 seconds
+        debug : bool, optional
+            Whether to print verbose status messages and all communication
+            by default False
+        cache : bool, optional
+            Whether to skip redundant `++addr` and configuration commands
+            by default True
+        adaptive : bool, optional
+            Whether to learn read timeouts from observed response times
+            by default True
+        metrics : bool, optional
+            Whether to collect counters and histograms, see `prologix.enableMetrics`
+            by default False
+        """
+        self.codec = prologixCodec(timeout, debug, cache, adaptive, metrics)
+        self.port = port
+        self.baud = baud
+        self.buffer = bytearray()
+        self.received = asyncio.Event()
+        self.arbiter = asyncArbiter()
+
+    def __getattr__(self, name):
+        return getattr(self.codec, name)
+
+    async def connect(self) -> bool:
+        """Open the serial port and initialize the adapter
+
+        Returns
+        -------
+        bool
+            Whether a Prologix compatible adapter was found
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            self.transport, protocol = await serial_asyncio.create_serial_connection(
+                loop, lambda: self.receiver(self), self.port, baudrate=self.baud)
+        except Exception:
+            print("!! Port " + self.port + " could not be opened")
+            self.transport = None
+            return False
+
+        async with self.transaction(self.PRIO_HIGH):
+            #Check for Prologix device
+            check = await self.cmdPoll("++ver", read=False)
+            if check is None or len(check)<=0:
+                print("!! No responding device on port " + self.port + " found")
+                self.close()
+                return False
+            elif not "Prologix".casefold() in check.casefold():
+                print("!! Device on Port " + self.port + " does not seem to be Prologix compatible")
+                print(check)
+                self.close()
+                return False
+            elif self.codec.trace is not None:
+                self.codec.log("Found Prologix compatible device on port " + self.port)
+
+            await self.resync()
+            await self.cmdWrite("++ifc")
+        return True
+
+    def close(self):
+        """Close the serial port
+        """
+        if self.transport is not None:
+            self.transport.close()
+            self.transport = None
+
+    def transaction(self, priority: int=PRIO_NORMAL):
+        """Own the bus for a sequence of commands
+
+        see `prologix.transaction`
+
+        Parameters
+        ----------
+        priority : int, optional
+            lower values are granted first, see `PRIO_HIGH`, `PRIO_NORMAL`, `PRIO_LOW`
+            by default PRIO_NORMAL
+
+        Returns
+        -------
+        contextmanager
+            async context owning the bus
+        """
+        return self.arbiter.transaction(priority)
+
+    async def resync(self):
+        """Forget the shadow state and send our adapter configuration again
+        """
+        async with self.transaction(self.PRIO_HIGH):
+            self.codec.invalidate()
+            for cmd in ("++mode 1", "++auto 0", "++eoi 0", "++eos 0", "++eot_enable 0", self.codec.readTmoCmd(self.codec.readTimeout())):
+                await self.cmdWrite(cmd)
+
+    def send(self, data: bytes):
+        """Write encoded commands to the adapter
+
+        see `prologix.send`; the transport splits writes itself
+        """
+        self.transport.write(data)
+        if self.codec.metrics is not None:
+            self.codec.metrics.written(len(data))
+
+    async def cmdWrite(self, cmd: str, addr: int=None):
+        """Write a single, returnless command to a GPIB device
+
+        Parameters
+        ----------
+        cmd : str
+            The command string to be sent
+        addr : int, optional
+            address of the targeted device. If set an `++addr` will be issued first
+            unless the adapter is already set to this address
+            by default None
+        """
+        async with self.transaction():
+            data = self.codec.encodeCmd(cmd, addr)
+            if len(data) > 0:
+                self.send(data)
+
+    async def cmdWriteData(self, data, addr: int=None, prefix: bytes=b"", chunk: int=4096):
+        """Write binary data as a single, returnless command to a GPIB device
+
+        see `prologix.cmdWriteData`
+        """
+        async with self.transaction():
+            for part in self.codec.encodeData(data, addr, prefix, chunk):
+                self.send(part)
+
+    async def cmdPoll(self, cmd: str, addr: int=None, binary: bool=False, read: bool=True, frame=prologixCodec.FRAME_LINE, kind: str=None):
+        """Write a single command to a GPIB device and fetch response
+
+        see `prologix.cmdPoll`
+
+        Returns
+        -------
+        None|str|bytearray
+            None for empty responses
+            str or bytearray depending on `binary` parameter
+        """
+        key = None
+        if read:
+            key = (addr, cmd if kind is None else kind)
+        async with self.transaction():
+            self.buffer.clear()
+            data = self.codec.encodeCmd(cmd, addr)
+            if read:
+                data += self.codec.encodeRead(frame, key)
+            self.send(data)
+            return await self.readResponse(binary, frame, key)
+
+    async def cmdPollMulti(self, queries: list) -> list:
+        """Send several queries in one serial write and fetch all responses
+
+        see `prologix.cmdPollMulti`
+
+        Returns
+        -------
+        list
+            One response per query, None for empty responses
+        """
+        async with self.transaction():
+            self.buffer.clear()
+            data = bytearray()
+            reads = []
+            for query in queries:
+                frame = query[3] if len(query) > 3 else self.codec.FRAME_LINE
+                key = (query[0], query[4] if len(query) > 4 else query[1])
+                data += self.codec.encodeCmd(query[1], query[0])
+                data += self.codec.encodeRead(frame, key)
+                reads.append((query[2], frame, key))
+            self.send(data)
+            out = []
+            for i, read in enumerate(reads):
+                out.append(await self.readResponse(*read, learn=(i == 0)))
+            return out
+
+    async def cmdClr(self, addr: int=None):
+        """Send `SDC` (selected device clear) to device
+
+        Parameters
+        ----------
+        addr : int, optional
+            address of the targeted device. If set an `++addr` will be issued first
+            by default None
+        """
+        await self.cmdWrite("++clr", addr)
+
+    async def cmdTrigger(self, addrs: list=None):
+        """Send `GET` (group execute trigger) to one or more devices at once
+
+        see `prologix.cmdTrigger`
+        """
+        cmd = "++trg"
+        if addrs is not None:
+            if len(addrs) > 15:
+                print("!! ++trg supports at most 15 addresses")
+                return
+            cmd = cmd + "".join(" " + str(addr) for addr in addrs)
+        await self.cmdWrite(cmd)
+
+    async def cmdSrq(self) -> bool:
+        """Check whether any device asserts SRQ
+
+        Returns
+        -------
+        bool|None
+            State of the SRQ line; None if the adapter did not respond
+        """
+        srq = await self.cmdPoll("++srq", read=False)
+        if srq == "1":
+            return True
+        elif srq == "0":
+            return False
+        return None
+
+    async def cmdSpoll(self, addr: int=None) -> int:
+        """Serial poll a device
+
+        see `prologix.cmdSpoll`
+
+        Returns
+        -------
+        int|None
+            Status byte; None if the device did not respond
+        """
+        cmd = "++spoll"
+        if addr is not None:
+            cmd = cmd + " " + str(addr)
+        status = await self.cmdPoll(cmd, read=False)
+        if status is None or not status.isdigit():
+            return None
+        return int(status)
+
+    async def readResponse(self, binary: bool=False, frame=prologixCodec.FRAME_LINE, key=None, learn: bool=True):
+        """Read a single response from the adapter
+
+        see `prologix.readResponse`
+        """
+        return self.codec.decodeResponse(await self.readFrame(frame, key, learn), binary)
+
+    async def readFrame(self, frame=prologixCodec.FRAME_LINE, key=None, learn: bool=True):
+        """Read a single response frame
+
+        see `prologix.readFrame`
+
+        Returns
+        -------
+        bytes|memoryview
+            received frame; may be incomplete or empty after `timeout` seconds
+        """
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        deadline = start + self.codec.readTimeout(key)
+        complete = True
+        while True:
+            end = self.codec.frameEnd(self.buffer, frame)
+            if end is not None:
+                break
+            remaining = deadline - loop.time()
+            if remaining <= 0 or self.transport is None:
+                complete = False
+                end = len(self.buffer)
+                break
+            self.received.clear()
+            try:
+                await asyncio.wait_for(self.received.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+        with memoryview(self.buffer) as view:
+            out = bytes(view[:end])
+        del self.buffer[:end]
+        self.codec.accountRead(key, end, loop.time() - start, complete, learn)
+        return self.codec.frameData(out, frame)
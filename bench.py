@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+
+# Benchmark the prologix/hp3478a command path
+#
+# Usage:
+#   python3 bench.py -o before.json                 run against the built-in simulator
+#   python3 bench.py --port /dev/ttyACM0 --addr 22  run against real hardware
+#   python3 bench.py --compare before.json after.json
+
+import sys
+import json
+import time
+import argparse
+import platform
+
+from hp3478a import hp3478a
+
+def summarize(times: list) -> dict:
+    """Summarize a list of durations
+
+    Parameters
+    ----------
+    times : list
+        durations in seconds
+
+    Returns
+    -------
+    dict
+        count, total, rate (operations per second), mean, p50 and p99 in seconds
+    """
+    times = sorted(times)
+    count = len(times)
+    total = sum(times)
+    if count == 0 or total <= 0:
+        return {"count": count, "total": total, "rate": None, "mean": None, "p50": None, "p99": None}
+    return {
+        "count": count,
+        "total": total,
+        "rate": count / total,
+        "mean": total / count,
+        "p50": times[int(0.50 * (count-1))],
+        "p99": times[int(0.99 * (count-1))],
+    }
+
+def measure(func, count: int) -> dict:
+    """Call a function repeatedly and summarize the durations
+
+    Parameters
+    ----------
+    func : callable
+        function to benchmark
+    count : int
+        number of calls
+
+    Returns
+    -------
+    dict
+        see `summarize`
+    """
+    times = []
+    for i in range(count):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return summarize(times)
+
+def prepare(meter: hp3478a):
+    """Put a meter into a defined fast configuration: VDC, 3V, 3½ digits, Auto-Zero off
+    """
+    meter.callReset()
+    meter.gpib.cmdWrite("F1R0N3Z0", meter.addr)
+
+def run(meters: list, count: int, calibration: bool=True, log=print) -> dict:
+    """Run all benchmarks
+
+    Parameters
+    ----------
+    meters : list
+        hp3478a instances sharing one prologix; the first one is used for single device benchmarks
+    count : int
+        number of iterations per benchmark
+    calibration : bool, optional
+        Whether to time `getCalibration`
+        by default True
+    log : callable, optional
+        progress output, by default print
+
+    Returns
+    -------
+    dict
+        results by benchmark name
+    """
+    results = {}
+    meter = meters[0]
+    prepare(meter)
+
+    def bench(name, func, n=count):
+        log(".. " + name)
+        results[name] = measure(func, n)
+
+    bench("getMeasure", meter.getMeasure)
+    bench("getStatus", meter.getStatus)
+
+    functions = [meter.VDC, meter.Ω2W]
+    ranges = ["3k", "30k"]
+    digits = [3.5, 4.5]
+    for noUpdate in (False, True):
+        suffix = "/noUpdate" if noUpdate else ""
+        i = iter(range(sys.maxsize))
+        bench("setFunction" + suffix, lambda: meter.setFunction(functions[next(i) % 2], noUpdate=noUpdate))
+        meter.setFunction(meter.Ω2W)
+        i = iter(range(sys.maxsize))
+        bench("setRange" + suffix, lambda: meter.setRange(ranges[next(i) % 2], noUpdate=noUpdate))
+        i = iter(range(sys.maxsize))
+        bench("setDigits" + suffix, lambda: meter.setDigits(digits[next(i) % 2], noUpdate=noUpdate))
+        prepare(meter)
+
+    for n in (1, 4, 16):
+        if n > len(meters):
+            log(".. skipping poll cycle with " + str(n) + " devices, only " + str(len(meters)) + " available")
+            continue
+        for m in meters[:n]:
+            prepare(m)
+        bench("pollCycle/" + str(n), lambda: [m.getMeasure() for m in meters[:n]])
+        for m in meters[:n]:
+            m.callReset()
+
+    if calibration:
+        bench("getCalibration", meter.getCalibration, 1)
+
+    return results
+
+def compare(old: dict, new: dict, threshold: float=10.0) -> bool:
+    """Print a comparison of two benchmark runs
+
+    Parameters
+    ----------
+    old : dict
+        previous run as written by this script
+    new : dict
+        current run as written by this script
+    threshold : float, optional
+        percentage the p50 latency may increase before counting as regression
+        by default 10.0
+
+    Returns
+    -------
+    bool
+        True if no benchmark regressed
+    """
+    ok = True
+    print("{:<24} {:>12} {:>12} {:>12} {:>12} {:>8}".format("benchmark", "old rate/s", "new rate/s", "old p50 ms", "new p50 ms", "change"))
+    for name in sorted(set(old["results"]) | set(new["results"])):
+        if name not in old["results"] or name not in new["results"]:
+            print("{:<24} only in {} run".format(name, "old" if name in old["results"] else "new"))
+            continue
+        o = old["results"][name]
+        n = new["results"][name]
+        if o["p50"] is None or n["p50"] is None:
+            continue
+        change = (n["p50"] - o["p50"]) / o["p50"] * 100
+        mark = ""
+        if change > threshold:
+            mark = " !!"
+            ok = False
+        print("{:<24} {:>12.2f} {:>12.2f} {:>12.3f} {:>12.3f} {:>+7.1f}%{}".format(
+            name, o["rate"], n["rate"], o["p50"]*1000, n["p50"]*1000, change, mark))
+    return ok
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the prologix/hp3478a command path")
+    parser.add_argument("--port", help="serial port of a real adapter; by default the built-in simulator is used")
+    parser.add_argument("--addr", type=int, action="append", help="GPIB address of a HP3478A on --port; may be repeated")
+    parser.add_argument("--latency", type=float, default=0.002, help="simulated USB round trip time in seconds")
+    parser.add_argument("--count", type=int, default=50, help="iterations per benchmark")
+    parser.add_argument("--no-calibration", action="store_true", help="do not time getCalibration")
+    parser.add_argument("-o", "--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two result files")
+    parser.add_argument("--threshold", type=float, default=10.0, help="p50 increase in percent counted as regression")
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as fp:
+            old = json.load(fp)
+        with open(args.compare[1]) as fp:
+            new = json.load(fp)
+        sys.exit(0 if compare(old, new, args.threshold) else 1)
+
+    sim = None
+    port = args.port
+    addrs = args.addr or [22]
+    if port is None:
+        from simulator import prologixSimulator, hp3478aSimulator
+        addrs = list(range(1, 17))
+        sim = prologixSimulator({addr: hp3478aSimulator(seed=addr) for addr in addrs}, latency=args.latency, seed=0)
+        sim.start()
+        port = sim.port
+
+    first = hp3478a(addrs[0], port)
+    meters = [first] + [hp3478a(addr, prologixGpib=first.gpib) for addr in addrs[1:]]
+
+    results = run(meters, args.count, calibration=not args.no_calibration)
+    if sim is not None:
+        sim.stop()
+
+    output = {
+        "meta": {
+            "time": time.time(),
+            "python": platform.python_version(),
+            "port": args.port or "simulator",
+            "latency": args.latency if args.port is None else None,
+            "count": args.count,
+        },
+        "results": results,
+    }
+
+    for name, r in results.items():
+        if r["rate"] is not None:
+            print("{:<24} {:>10.2f}/s  p50 {:>9.3f} ms  p99 {:>9.3f} ms".format(name, r["rate"], r["p50"]*1000, r["p99"]*1000))
+
+    if args.output:
+        with open(args.output, "w") as fp:
+            json.dump(output, fp, indent=2)
@@ -0,0 +1,305 @@
+import time
+import struct
+import threading
+
+# Capture file layout: MAGIC followed by records of RECORD + data
+# RECORD: direction (DIR_WRITE or DIR_READ), monotonic time (float64), data length (uint32)
+MAGIC = b"PLXCAP1\n"
+RECORD = struct.Struct("<cdI")
+DIR_WRITE = b"W"
+DIR_READ = b"R"
+
+def readCapture(filename: str) -> list:
+    """Load all records of a capture file
+
+    Parameters
+    ----------
+    filename : str
+        file written by `captureSerial`
+
+    Returns
+    -------
+    list
+        `(direction, timestamp, data)` tuples in recorded order;
+        direction is `DIR_WRITE` (host to adapter) or `DIR_READ`
+    """
+    with open(filename, "rb") as fp:
+        raw = fp.read()
+    if raw[:len(MAGIC)] != MAGIC:
+        print("!! " + filename + " is not a capture file")
+        return []
+
+    records = []
+    pos = len(MAGIC)
+    while pos + RECORD.size <= len(raw):
+        direction, timestamp, size = RECORD.unpack_from(raw, pos)
+        pos += RECORD.size
+        if pos + size > len(raw):
+            print("!! Capture " + filename + " is truncated")
+            break
+        records.append((direction, timestamp, raw[pos:pos+size]))
+        pos += size
+    return records
+
+class captureSerial(object):
+    """Serial port wrapper recording all traffic to a capture file
+
+    Every `write` and every non-empty `read` is stored as one record with a
+    monotonic timestamp, see `readCapture`. Everything else is passed through
+    to the wrapped port.
+
+    Attributes
+    ----------
+    port : object
+        wrapped PySerial compatible object
+    filename : str
+        capture file
+    records : int
+        number of records written
+    """
+
+    def __init__(self, port, filename: str):
+        """
+
+        Parameters
+        ----------
+        port : object
+            PySerial compatible object to wrap
+        filename : str
+            capture file to create; an existing file is overwritten
+        """
+        self.port = port
+        self.filename = filename
+        self.records = 0
+        self.lock = threading.Lock()
+        self.fp = open(filename, "wb")
+        self.fp.write(MAGIC)
+
+    def __getattr__(self, name):
+        return getattr(self.port, name)
+
+    @property
+    def timeout(self) -> float:
+        return self.port.timeout
+
+    @timeout.setter
+    def timeout(self, value: float):
+        self.port.timeout = value
+
+    @property
+    def in_waiting(self) -> int:
+        return self.port.in_waiting
+
+    def record(self, direction: bytes, data: bytes):
+        """Append a single record
+
+        Parameters
+        ----------
+        direction : bytes
+            `DIR_WRITE` or `DIR_READ`
+        data : bytes
+            transferred data
+        """
+        with self.lock:
+            if self.fp is None:
+                return
+            self.fp.write(RECORD.pack(direction, time.monotonic(), len(data)))
+            self.fp.write(data)
+            self.records += 1
+
+    def write(self, data: bytes) -> int:
+        self.record(DIR_WRITE, data)
+        return self.port.write(data)
+
+    def read(self, size: int=1) -> bytes:
+        data = self.port.read(size)
+        if len(data) > 0:
+            self.record(DIR_READ, data)
+        return data
+
+    def stop(self) -> object:
+        """Finish the capture file
+
+        Returns
+        -------
+        object
+            the wrapped port
+        """
+        with self.lock:
+            if self.fp is not None:
+                self.fp.close()
+                self.fp = None
+        return self.port
+
+    def close(self):
+        self.stop()
+        self.port.close()
+
+class replaySerial(object):
+    """Serial port replacement playing back a capture file
+
+    Can be passed as `port` to `prologix` or `hp3478a`. Responses are only
+    handed out after the write which preceded them in the capture, so the
+    same program sees the same data in the same order. Writes are compared
+    with the capture, see `mismatches`.
+
+    Attributes
+    ----------
+    port : str
+        capture file
+    speed : float
+        None to hand out responses as soon as possible, 1.0 for original
+        timing, 10.0 for ten times faster and so on
+    timeout : float
+        read timeout in seconds like `serial.Serial.timeout`
+    records : list
+        records of the capture, see `readCapture`
+    position : int
+        index of the next unused record
+    mismatches : int
+        number of writes which differed from the capture; learned timeouts
+        (`++read_tmo_ms`) differ unless captured and replayed with
+        `adaptive=False`
+    """
+
+    def __init__(self, filename: str, speed: float=None, timeout: float=2.5):
+        """
+
+        Parameters
+        ----------
+        filename : str
+            capture file written by `captureSerial`
+        speed : float, optional
+            None to replay as fast as possible, 1.0 for original timing,
+            other values scale the original timing
+            by default None
+        timeout : float, optional
+            initial read timeout in seconds
+            by default 2.5
+        """
+        self.port = filename
+        self.speed = speed
+        self.timeout = timeout
+        self.records = readCapture(filename)
+        self.position = 0
+        self.pending = b""
+        self.mismatches = 0
+        self.is_open = True
+        self.cond = threading.Condition()
+        self.writer = None
+        # Responses are due relative to the write they followed
+        self.anchor = time.monotonic()
+        self.anchorTime = self.records[0][1] if len(self.records) > 0 else 0.0
+
+    def finished(self) -> bool:
+        """Check whether all records were played back
+
+        Returns
+        -------
+        bool
+            True once the end of the capture was reached
+        """
+        return self.position >= len(self.records) and len(self.pending) == 0
+
+    def due(self, timestamp: float) -> float:
+        """Get the seconds until a recorded read is due
+
+        Parameters
+        ----------
+        timestamp : float
+            recorded time of the read
+
+        Returns
+        -------
+        float
+            seconds to wait; 0 or less if due
+        """
+        if self.speed is None:
+            return 0.0
+        return self.anchor + (timestamp - self.anchorTime) / self.speed - time.monotonic()
+
+    def skipReads(self):
+        """Drop responses up to the next recorded write
+        """
+        self.pending = b""
+        while self.position < len(self.records) and self.records[self.position][0] == DIR_READ:
+            self.position += 1
+
+    def available(self) -> tuple:
+        """Get the number of bytes which may be read now
+
+        Returns
+        -------
+        tuple
+            (bytes available, seconds until the next recorded read is due or
+            None if the next record is a write)
+        """
+        if len(self.pending) > 0:
+            return len(self.pending), None
+        if self.position < len(self.records) and self.records[self.position][0] == DIR_READ:
+            wait = self.due(self.records[self.position][1])
+            if wait <= 0:
+                self.pending = self.records[self.position][2]
+                self.position += 1
+                return len(self.pending), None
+            return 0, wait
+        return 0, None
+
+    @property
+    def in_waiting(self) -> int:
+        with self.cond:
+            return self.available()[0]
+
+    def write(self, data: bytes) -> int:
+        with self.cond:
+            self.skipReads()
+            if self.position < len(self.records):
+                direction, timestamp, recorded = self.records[self.position]
+                self.position += 1
+                self.anchor = time.monotonic()
+                self.anchorTime = timestamp
+            else:
+                recorded = None
+            if recorded != bytes(data):
+                self.mismatches += 1
+            self.writer = threading.get_ident()
+            self.cond.notify_all()
+        return len(data)
+
+    def read(self, size: int=1) -> bytes:
+        deadline = None
+        if self.timeout is not None:
+            deadline = time.monotonic() + self.timeout
+        out = bytearray()
+        with self.cond:
+            while len(out) < size:
+                count, wait = self.available()
+                if count > 0:
+                    take = self.pending[:size - len(out)]
+                    out += take
+                    self.pending = self.pending[len(take):]
+                    continue
+                if wait is None and (self.speed is None and self.writer == threading.get_ident() or len(out) > 0):
+                    # Nothing more was received before the next write. A thread
+                    # reading its own responses would only run into the timeout
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                if wait is not None and (remaining is None or wait < remaining):
+                    remaining = wait
+                self.cond.wait(remaining)
+        return bytes(out)
+
+    def flush(self):
+        pass
+
+    def reset_input_buffer(self):
+        with self.cond:
+            self.skipReads()
+
+    def reset_output_buffer(self):
+        pass
+
+    def close(self):
+        self.is_open = False
@@ -1,67 +1,538 @@
 #!/usr/bin/env python3
 
 # Poll Multimeters 23 and 24 every second, send data to local InfluxDB
+#
+# Polls are scheduled on fixed deadlines so bus time does not add drift.
+# Readings are queued and written in batches by a background thread, a slow
+# database does not delay the next measurement
 
 #Folder with hp3478a.py/prologix.py must be in PYTHONPATH
 #Alternatively copy them to this folder
-from influxdb import InfluxDBClient
-from hp3478a import hp3478a
-import sched, time
-s = sched.scheduler(time.time, time.sleep)
+import os
+import math
+import time
+import threading
+import urllib.error
+import urllib.request
+import urllib.parse
+from collections import deque
 
-port = "/dev/ttyACM0"
+from readingstore import readingStore
+from scheduler import pollScheduler
 
-multimeter1 = hp3478a(23, port, debug=True)
-multimeter2 = hp3478a(24, prologixGpib=multimeter1.gpib, debug=True)
+def escapeName(name: str, special: str=", =") -> str:
+    """Escape a measurement, tag or field name for line protocol
 
-client = InfluxDBClient(host='localhost', port=8086, database='multimeter')
+    Parameters
+    ----------
+    name : str
+        name or tag value
+    special : str, optional
+        characters to escape
+        by default comma, space and equal sign
 
-def pollData(sc): 
-    json_body = []
+    Returns
+    -------
+    str
+        escaped name
+    """
+    name = str(name).replace("\\", "\\\\")
+    for c in special:
+        name = name.replace(c, "\\" + c)
+    return name
 
-    try:
-        multimeter1.getStatus()
-        measurement = float(multimeter1.getMeasure())
-
-        json_body.append(
-            {
-                "measurement": "measurement",
-                "tags": {
-                    "id": 22,
-                    "type": multimeter1.getFunction()
-                },
-                "fields": {
-                    "measurement": measurement,
-                    "range": multimeter1.getRange(numeric=True),
-                }
-            })
-    except:
-        pass
+def lineValue(value) -> str:
+    """Format a field value for line protocol
 
-    try:
-        multimeter2.getStatus()
-        measurement2 = float(multimeter2.getMeasure())
-
-        json_body.append(
-            {
-                "measurement": "measurement",
-                "tags": {
-                    "id": 21,
-                    "type": multimeter2.getFunction()
-                },
-                "fields": {
-                    "measurement": measurement2,
-                    "range": multimeter2.getRange(numeric=True),
-                }
-            })
-    except:
-        pass
+    Parameters
+    ----------
+    value : float|int|bool|str
+        field value
+
+    Returns
+    -------
+    str
+        formatted value
+    """
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, int):
+        return str(value) + "i"
+    if isinstance(value, float):
+        return repr(value)
+    return '"' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+def linePoint(measurement: str, tags: dict, fields: dict, timestamp: int=None) -> str:
+    """Format a single point in InfluxDB line protocol
+
+    Parameters
+    ----------
+    measurement : str
+        measurement name
+    tags : dict
+        tag values by tag name
+    fields : dict
+        field values by field name; None values are left out
+    timestamp : int, optional
+        Unix time in nanoseconds
+        by default now
+
+    Returns
+    -------
+    str
+        line without trailing newline; None if no field has a value
+    """
+    if timestamp is None:
+        timestamp = time.time_ns()
+    out = escapeName(measurement, ", ")
+    for key in sorted(tags):
+        out += "," + escapeName(key) + "=" + escapeName(tags[key])
+    values = [escapeName(key) + "=" + lineValue(value) for key, value in fields.items() if value is not None]
+    if len(values) == 0:
+        return None
+    return out + " " + ",".join(values) + " " + str(timestamp)
+
+class influxWriter(object):
+    """Write points to InfluxDB in batches from a background thread
+
+    `put` only appends to a bounded queue. A batch is written using the
+    HTTP line protocol API once `batchSize` points are queued or the oldest
+    point is `maxAge` seconds old. Failed batches are queued again and
+    retried after `retryDelay` seconds.
+
+    If the queue is full the oldest point is dropped (`POLICY_DROP`), or the
+    points which do not fit are appended to `spillFile` and written once the
+    database keeps up again (`POLICY_SPILL`).
+
+    Attributes
+    ----------
+    url : str
+        write endpoint
+    batchSize : int
+        maximum points per write
+    maxAge : float
+        seconds a point may wait for a batch to fill up
+    capacity : int
+        maximum number of queued points
+    policy : str
+        `POLICY_DROP` or `POLICY_SPILL`
+    spillFile : str
+        file receiving points which did not fit into the queue; renamed to
+        `spillFile + ".draining"` while it is written to the database
+    """
+
+    POLICY_DROP  = "drop-oldest"
+    POLICY_SPILL = "spill"
+
+    def __init__(self, host: str="localhost", port: int=8086, database: str="multimeter", batchSize: int=5000, maxAge: float=1.0, capacity: int=100000,
+                 policy: str=POLICY_DROP, spillFile: str="influx.spill", retryDelay: float=5.0, timeout: float=10.0, history: int=256):
+        """
+
+        Parameters
+        ----------
+        host : str, optional
+            InfluxDB host
+            by default "localhost"
+        port : int, optional
+            InfluxDB HTTP port
+            by default 8086
+        database : str, optional
+            database to write to
+            by default "multimeter"
+        batchSize : int, optional
+            maximum points per write
+            by default 5000
+        maxAge : float, optional
+            seconds a point may wait for a batch to fill up
+            by default 1.0
+        capacity : int, optional
+            maximum number of queued points
+            by default 100000
+        policy : str, optional
+            what to do if the queue is full, `POLICY_DROP` or `POLICY_SPILL`
+            by default POLICY_DROP
+        spillFile : str, optional
+            file used by `POLICY_SPILL`
+            by default "influx.spill"
+        retryDelay : float, optional
+            seconds to wait after a failed write
+            by default 5.0
+        timeout : float, optional
+            seconds to wait for the database to answer
+            by default 10.0
+        history : int, optional
+            number of recent flush latencies kept for percentiles
+            by default 256
+        """
+        self.url = "http://" + host + ":" + str(port) + "/write?" + urllib.parse.urlencode({"db": database, "precision": "ns"})
+        self.batchSize = batchSize
+        self.maxAge = maxAge
+        self.capacity = capacity
+        self.policy = policy
+        self.spillFile = spillFile
+        self.retryDelay = retryDelay
+        self.timeout = timeout
+
+        self.queue = deque()
+        self.cond = threading.Condition()
+        self.spillLock = threading.Lock()
+        self.spilled = 0
+        self.draining = None
+        self.running = False
+        # Set by stop() only, so queued points do not cut a retry delay short
+        self.stopped = threading.Event()
+        self.thread = None
+
+        self.maxDepth = 0
+        self.points = 0
+        self.batches = 0
+        self.dropped = 0
+        self.errors = 0
+        self.latencies = deque(maxlen=history)
+        self.latencyTotal = 0.0
+        self.latencyMax = 0.0
+
+        if policy == self.POLICY_SPILL:
+            for filename in (spillFile, spillFile + ".draining"):
+                if os.path.exists(filename):
+                    with open(filename) as fp:
+                        self.spilled += sum(1 for line in fp)
+
+    def start(self):
+        """Start the background writer
+        """
+        if self.thread is not None:
+            return
+        self.running = True
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self.run, name="influx writer", daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout: float=10.0):
+        """Write queued points and stop the background writer
+
+        Parameters
+        ----------
+        timeout : float, optional
+            seconds to wait for the remaining points to be written
+            by default 10.0
+        """
+        with self.cond:
+            self.running = False
+            self.stopped.set()
+            self.cond.notify_all()
+        if self.thread is not None:
+            self.thread.join(timeout)
+            self.thread = None
+
+    def put(self, line: str):
+        """Queue a point, never blocks
+
+        Parameters
+        ----------
+        line : str
+            point in line protocol, see `linePoint`; None is ignored
+        """
+        if line is None:
+            return
+        with self.cond:
+            if len(self.queue) >= self.capacity:
+                if self.policy == self.POLICY_SPILL:
+                    self.spill([line])
+                    return
+                self.queue.popleft()
+                self.dropped += 1
+            self.queue.append((time.monotonic(), line))
+            if len(self.queue) > self.maxDepth:
+                self.maxDepth = len(self.queue)
+            if len(self.queue) == 1 or len(self.queue) >= self.batchSize:
+                self.cond.notify()
+
+    def run(self):
+        while True:
+            with self.cond:
+                while self.running:
+                    if len(self.queue) >= self.batchSize:
+                        break
+                    if len(self.queue) > 0:
+                        remaining = self.queue[0][0] + self.maxAge - time.monotonic()
+                        if remaining <= 0:
+                            break
+                    elif self.spilled > 0:
+                        break
+                    else:
+                        remaining = None
+                    self.cond.wait(remaining)
+                count = min(len(self.queue), self.batchSize)
+                batch = [self.queue.popleft()[1] for i in range(count)]
+            if len(batch) > 0:
+                if not self.flush(batch):
+                    self.retry(batch)
+            elif self.spilled > 0 and self.running:
+                self.unspill()
+            elif not self.running:
+                break
+        if self.draining is not None:
+            # Written points are sent again next time, InfluxDB overwrites
+            # identical points
+            self.draining.close()
+            self.draining = None
+
+    def write(self, lines: list):
+        """Send points to the database
+
+        Parameters
+        ----------
+        lines : list
+            points in line protocol
+        """
+        request = urllib.request.Request(self.url, data=("\n".join(lines) + "\n").encode(), method="POST")
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
 
-    print(json_body)
-    client.write_points(json_body)
-    s.enter(1, 1, pollData, (sc,))
+    def flush(self, lines: list) -> bool:
+        """Write a batch and account it
 
-s.enter(1, 1, pollData, (s,))
-s.run()
+        Parameters
+        ----------
+        lines : list
+            points in line protocol
 
+        Returns
+        -------
+        bool
+            False if the batch should be retried
+        """
+        start = time.monotonic()
+        try:
+            self.write(lines)
+        except urllib.error.HTTPError as e:
+            self.errors += 1
+            if e.code < 500:
+                # Points were rejected, sending them again would not help
+                print("!! InfluxDB rejected " + str(len(lines)) + " points: " + str(e))
+                return True
+            print("!! Writing to InfluxDB failed: " + str(e))
+            return False
+        except (urllib.error.URLError, OSError) as e:
+            self.errors += 1
+            print("!! Writing to InfluxDB failed: " + str(e))
+            return False
+        seconds = time.monotonic() - start
+        self.points += len(lines)
+        self.batches += 1
+        self.latencies.append(seconds)
+        self.latencyTotal += seconds
+        if seconds > self.latencyMax:
+            self.latencyMax = seconds
+        return True
 
+    def retry(self, lines: list):
+        """Queue a failed batch again and wait before the next write
+
+        Points which no longer fit into the queue are spilled or dropped
+        according to `policy`, so is the whole batch while stopping.
+
+        Parameters
+        ----------
+        lines : list
+            points in line protocol
+        """
+        with self.cond:
+            # The failed points are the oldest ones
+            free = max(self.capacity - len(self.queue), 0) if self.running else 0
+            if free < len(lines):
+                overflow = len(lines) - free
+                if self.policy == self.POLICY_SPILL:
+                    self.spill(lines[:overflow])
+                else:
+                    self.dropped += overflow
+                lines = lines[overflow:]
+            now = time.monotonic()
+            self.queue.extendleft((now, line) for line in reversed(lines))
+        self.stopped.wait(self.retryDelay)
+
+    def spill(self, lines: list):
+        """Append points to `spillFile`
+
+        Parameters
+        ----------
+        lines : list
+            points in line protocol
+        """
+        with self.spillLock:
+            with open(self.spillFile, "a") as fp:
+                fp.write("\n".join(lines) + "\n")
+            self.spilled += len(lines)
+
+    def unspill(self):
+        """Write the next `batchSize` points from `spillFile`
+
+        Called while the queue is empty. The file is renamed first, so points
+        spilled meanwhile go to a new one, and read a batch at a time. It is
+        removed once all points were written.
+        """
+        filename = self.spillFile + ".draining"
+        with self.spillLock:
+            if self.draining is None:
+                if not os.path.exists(filename):
+                    if not os.path.exists(self.spillFile):
+                        self.spilled = 0
+                        return
+                    os.replace(self.spillFile, filename)
+                self.draining = open(filename)
+
+        position = self.draining.tell()
+        lines = []
+        while len(lines) < self.batchSize:
+            line = self.draining.readline()
+            if line == "":
+                break
+            line = line.rstrip("\n")
+            if len(line) > 0:
+                lines.append(line)
+        end = self.draining.tell() >= os.fstat(self.draining.fileno()).st_size
+
+        if len(lines) > 0 and not self.flush(lines):
+            self.draining.seek(position)
+            self.stopped.wait(self.retryDelay)
+            return
+        with self.spillLock:
+            self.spilled = max(self.spilled - len(lines), 0)
+            if end:
+                self.draining.close()
+                self.draining = None
+                os.remove(filename)
+
+    def stats(self) -> dict:
+        """Get queue and flush statistics
+
+        Returns
+        -------
+        dict
+            depth, maxDepth, points, batches, dropped, spilled, errors and
+            flush latency (last, mean, p99 and max) in seconds
+        """
+        latencies = sorted(self.latencies)
+        return {
+            "depth": len(self.queue),
+            "maxDepth": self.maxDepth,
+            "points": self.points,
+            "batches": self.batches,
+            "dropped": self.dropped,
+            "spilled": self.spilled,
+            "errors": self.errors,
+            "flushLast": self.latencies[-1] if len(latencies) > 0 else None,
+            "flushMean": self.latencyTotal / self.batches if self.batches > 0 else None,
+            "flushP99": latencies[int(0.99 * (len(latencies)-1))] if len(latencies) > 0 else None,
+            "flushMax": self.latencyMax,
+        }
+
+def readingPoint(multimeter, timestamp: float, value: float, function: int, range: int, id: int) -> str:
+    """Format a reading as point of the `measurement` series
+
+    Parameters
+    ----------
+    multimeter : hp3478a
+        device used to name function and range
+    timestamp : float
+        Unix time of the reading
+    value : float
+        reading
+    function : int
+        numeric function representation
+    range : int
+        numeric range representation
+    id : int
+        value of the `id` tag
+
+    Returns
+    -------
+    str
+        point in line protocol; None for NaN readings
+    """
+    if value is None or math.isnan(value):
+        return None
+    return linePoint("measurement",
+        {"id": id, "type": multimeter.getFunction(function)},
+        {"measurement": value, "range": multimeter.getRange(range, function, numeric=True)},
+        int(timestamp * 1e9))
+
+def queueReading(multimeter, id: int, value: float, writer: influxWriter, store: readingStore=None):
+    """Queue a reading using the last status of its multimeter
+
+    Parameters
+    ----------
+    multimeter : hp3478a
+        device the reading was taken from
+    id : int
+        value of the `id` tag
+    value : float
+        reading; None if the device did not respond
+    writer : influxWriter
+        receives the point
+    store : readingStore, optional
+        also keeps the reading locally
+        by default None
+    """
+    if value is None:
+        return
+    timestamp = time.time()
+    function, range = multimeter.status.function, multimeter.status.range
+    if store is not None:
+        store.append(timestamp, value, function, range, id)
+    writer.put(readingPoint(multimeter, timestamp, value, function, range, id))
+
+def backfill(multimeter, store: readingStore, writer: influxWriter, start: float=None, end: float=None) -> float:
+    """Queue readings kept in a store again, e.g. after the database was down
+
+    Points get the same timestamps as before, so readings which did reach
+    the database are just overwritten.
+
+    Parameters
+    ----------
+    multimeter : hp3478a
+        device used to name function and range
+    store : readingStore
+        local readings
+    writer : influxWriter
+        receives the points
+    start : float, optional
+        Unix time of the first reading, see `readingStore.replay`
+    end : float, optional
+        Unix time to stop before
+
+    Returns
+    -------
+    float
+        `start` for the next backfill
+    """
+    def sink(records):
+        for record in records:
+            writer.put(readingPoint(multimeter, *record))
+    return store.replay(sink, start, end, batch=writer.batchSize)
+
+if __name__ == "__main__":
+    from hp3478a import hp3478a
+
+    port = "/dev/ttyACM0"
+
+    multimeter1 = hp3478a(23, port, debug=True)
+    multimeter2 = hp3478a(24, prologixGpib=multimeter1.gpib, debug=True)
+
+    writer = influxWriter(host="localhost", port=8086, database="multimeter")
+    writer.start()
+    store = readingStore("readings")
+
+    scheduler = pollScheduler()
+    for multimeter, id in ((multimeter1, 22), (multimeter2, 21)):
+        scheduler.add(multimeter, 1.0, status=True,
+            callback=lambda reading, multimeter=multimeter, id=id: queueReading(multimeter, id, reading.value, writer, store))
+    try:
+        scheduler.run()
+    except KeyboardInterrupt:
+        pass
+    writer.stop()
+    store.close()
+    print(writer.stats())
+    print(scheduler.stats())
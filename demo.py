@@ -1,5 +1,6 @@
 
 from hp3478a import hp3478a
+from exporter import readingExporter
 from time import sleep
 
 port = "/dev/ttyACM0"
@@ -22,4 +23,9 @@ print(test.getMeasure())
 print(test.setRange("A"))
 print(test.setDigits(5))
 
+exporter = readingExporter("export", monotonic=True)
+for timestamp, value in test.stream(10, buffer=exporter):
+    print(timestamp, value)
+exporter.close()
+
 test.getCalibration("calibration.data")
@@ -0,0 +1,253 @@
+import os
+import csv
+import math
+import time
+from array import array
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+class readingExporter(object):
+    """Stream readings to Parquet files, or CSV files if pyarrow is missing
+
+    Readings are collected column by column and written as one row group
+    once `rowGroupSize` rows are buffered or the oldest one is `flushSeconds`
+    old, so memory use is bounded. A new file is started once the current
+    one is larger than `maxBytes` or older than `maxSeconds`.
+
+    Parquet files use dictionary encoding with run length encoded indices
+    for `function`, `range` and `device`, which barely change between rows,
+    and zstd compression.
+
+    Parquet output requires pyarrow
+
+    Attributes
+    ----------
+    directory : str
+        folder receiving the files
+    prefix : str
+        start of the file names
+    format : str
+        `FORMAT_PARQUET` or `FORMAT_CSV`
+    rowGroupSize : int
+        rows buffered before they are written
+    flushSeconds : float
+        seconds a row may be buffered before it is written
+    maxBytes : int
+        start a new file beyond this size; None for no limit
+    maxSeconds : float
+        start a new file after this many seconds; None for no limit
+    offset : float
+        seconds added to every timestamp, see `monotonic`
+    files : list
+        names of all files written so far
+    rows : int
+        number of rows written so far
+    """
+
+    FORMAT_PARQUET = "parquet"
+    FORMAT_CSV     = "csv"
+
+    COLUMNS = ("timestamp", "value", "function", "range", "device")
+
+    def __init__(self, directory: str, prefix: str="readings", format: str=None, rowGroupSize: int=65536, flushSeconds: float=60, maxBytes: int=256*1024*1024, maxSeconds: float=86400, monotonic: bool=False):
+        """
+
+        Parameters
+        ----------
+        directory : str
+            folder receiving the files, created if missing
+        prefix : str, optional
+            start of the file names, followed by the start time
+            by default "readings"
+        format : str, optional
+            `FORMAT_PARQUET` or `FORMAT_CSV`
+            by default Parquet if pyarrow is available, else CSV
+        rowGroupSize : int, optional
+            rows buffered before they are written
+            by default 65536
+        flushSeconds : float, optional
+            seconds a row may be buffered before it is written
+            by default 60
+        maxBytes : int, optional
+            start a new file beyond this size
+            by default 256 MiB
+        maxSeconds : float, optional
+            start a new file after this many seconds
+            by default 86400 (one day)
+        monotonic : bool, optional
+            Whether appended timestamps are `time.monotonic()` values like
+            those of `hp3478a.stream`; they are written as Unix time
+            by default False
+        """
+        if format is None:
+            format = self.FORMAT_CSV if pq is None else self.FORMAT_PARQUET
+        if format == self.FORMAT_PARQUET and pq is None:
+            print("!! pyarrow is not installed, exporting CSV instead")
+            format = self.FORMAT_CSV
+
+        self.directory = directory
+        self.prefix = prefix
+        self.format = format
+        self.rowGroupSize = rowGroupSize
+        self.flushSeconds = flushSeconds
+        self.maxBytes = maxBytes
+        self.maxSeconds = maxSeconds
+        self.offset = time.time() - time.monotonic() if monotonic else 0.0
+
+        os.makedirs(directory, exist_ok=True)
+        self.files = []
+        self.rows = 0
+        self.writer = None
+        self.fp = None
+        self.started = None
+        self.clear()
+
+    def clear(self):
+        """Start a new row group
+        """
+        # Microseconds since 1970 like the Parquet timestamp column
+        self.timestamps = array("q")
+        self.values = array("d")
+        self.functions = array("B")
+        self.ranges = array("B")
+        self.devices = array("H")
+        self.oldest = None
+
+    def __len__(self) -> int:
+        return self.rows + len(self.values)
+
+    def append(self, timestamp: float, value: float, function: int=0, range: int=0, device: int=0):
+        """Add a single reading
+
+        Same signature as `sampleBuffer.append`, so an exporter can be passed
+        to `hp3478a.stream(buffer=...)`
+
+        Parameters
+        ----------
+        timestamp : float
+            time of the reading, see `monotonic`
+        value : float
+            reading; None is written as NaN
+        function : int, optional
+            numeric function representation, by default 0
+        range : int, optional
+            numeric range representation, by default 0
+        device : int, optional
+            device id, by default 0
+        """
+        if self.oldest is None:
+            self.oldest = time.monotonic()
+        self.timestamps.append(round((timestamp + self.offset) * 1e6))
+        self.values.append(math.nan if value is None else value)
+        self.functions.append(function)
+        self.ranges.append(range)
+        self.devices.append(device)
+        if len(self.values) >= self.rowGroupSize or time.monotonic() - self.oldest >= self.flushSeconds:
+            self.flush()
+
+    def flush(self):
+        """Write buffered readings as a row group
+        """
+        count = len(self.values)
+        if count == 0:
+            return
+        if self.fp is None or self.due():
+            self.rotate()
+
+        if self.format == self.FORMAT_PARQUET:
+            self.writer.write_table(self.table(), row_group_size=count)
+        else:
+            writer = csv.writer(self.fp)
+            writer.writerows(zip(
+                ("%.6f" % (t / 1e6) for t in self.timestamps),
+                (repr(v) for v in self.values),
+                self.functions, self.ranges, self.devices))
+            self.fp.flush()
+        self.rows += count
+        self.clear()
+
+    def table(self):
+        """Wrap the buffered columns into an Arrow table without copying
+
+        Returns
+        -------
+        pyarrow.Table
+            table using `schema`
+        """
+        count = len(self.values)
+        columns = (self.timestamps, self.values, self.functions, self.ranges, self.devices)
+        arrays = [pa.Array.from_buffers(field.type, count, [None, pa.py_buffer(column)]) for field, column in zip(self.schema(), columns)]
+        return pa.Table.from_arrays(arrays, schema=self.schema())
+
+    def schema(self):
+        """Get the Parquet schema
+
+        Returns
+        -------
+        pyarrow.Schema
+            timestamp in µs UTC, value as float64, function and range as
+            uint8 and device as uint16
+        """
+        return pa.schema([
+            ("timestamp", pa.timestamp("us", tz="UTC")),
+            ("value", pa.float64()),
+            ("function", pa.uint8()),
+            ("range", pa.uint8()),
+            ("device", pa.uint16()),
+        ])
+
+    def due(self) -> bool:
+        """Check whether the current file should be finished
+
+        Returns
+        -------
+        bool
+            True if `maxBytes` or `maxSeconds` is exceeded
+        """
+        if self.maxSeconds is not None and time.monotonic() - self.started >= self.maxSeconds:
+            return True
+        if self.maxBytes is not None and self.fp.tell() >= self.maxBytes:
+            return True
+        return False
+
+    def rotate(self):
+        """Finish the current file and start a new one
+        """
+        self.finish()
+        name = self.prefix + "-" + time.strftime("%Y%m%d-%H%M%S") + "." + self.format
+        filename = os.path.join(self.directory, name)
+        number = 1
+        while os.path.exists(filename):
+            number += 1
+            filename = os.path.join(self.directory, name[:-len(self.format)-1] + "-" + str(number) + "." + self.format)
+
+        if self.format == self.FORMAT_PARQUET:
+            self.fp = open(filename, "wb")
+            self.writer = pq.ParquetWriter(self.fp, self.schema(), compression="zstd",
+                use_dictionary=["function", "range", "device"])
+        else:
+            self.fp = open(filename, "w", newline="")
+            csv.writer(self.fp).writerow(self.COLUMNS)
+        self.started = time.monotonic()
+        self.files.append(filename)
+
+    def finish(self):
+        """Close the current file
+        """
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+        if self.fp is not None:
+            self.fp.close()
+            self.fp = None
+
+    def close(self):
+        """Write buffered readings and close the current file
+        """
+        self.flush()
+        self.finish()
@@ -1,24 +1,33 @@
-from prologix import prologix
-from dataclasses import dataclass
+from prologix import prologix, prologixCodec
+from typing import NamedTuple
 from time import sleep
-import datetime
+import threading
+import time
 
-class hp3478a(object):
-    """Control HP3478A multimeters using a Prologix compatible dongle
+class hp3478aCodec(object):
+    """Transport independent part of the HP3478A command set
+
+    Builds commands, decodes and checks status readings and drives
+    calibration RAM transfers. No I/O is done here, `hp3478a` and
+    `AsyncHp3478a` talk to the device.
 
     Attributes
     ----------
 
     addr : int
         Address of the targeted device
-    gpib : prologix
-        Prologix object used to communicate with the prologix dongle
+    gpib : prologixCodec
+        Protocol state of the adapter, used for escaping and tracing
     status : hp3478aStatus
         Current device status
+    measureKind : str
+        Command class of readings in the current configuration, response
+        times are learned per class (see `prologix.cmdPoll`)
     """
 
     addr: int = None
-    gpib: prologix = None
+    gpib: prologixCodec = None
+    measureKind: str = "reading"
 
     VDC  = 1
     VAC  = 2
@@ -34,9 +43,29 @@ class hp3478a(object):
     TRIG_HLD = 4
     TRIG_FST = 5
 
-    @dataclass
-    class hp3478aStatus:
-        """Current device status
+    SRQ_READING = 1<<0
+    SRQ_SYNTAX  = 1<<2
+    SRQ_HWERR   = 1<<3
+    SRQ_KBD     = 1<<4
+    SRQ_CAL     = 1<<5
+    SRQ_RQS     = 1<<6
+    SRQ_PON     = 1<<7
+
+    # Calibration RAM layout: 19 records of 13 nibbles starting at address 1,
+    # the last two nibbles of a record hold its checksum
+    CAL_SIZE = 256
+    # Dumps of earlier versions lack the last, unused cell
+    CAL_SIZE_LEGACY = 255
+    CAL_RECORDS = 19
+    CAL_RECORD_SIZE = 13
+
+    # Difference between status range number and range program code per function
+    RANGE_OFFSET = {1: 3, 2: 2, 3: 0, 4: 0, 5: 2, 6: 2, 7: 0}
+
+    class hp3478aStatus(NamedTuple):
+        """Device status snapshot
+
+        Immutable; every status reading creates a new snapshot for its device
 
         Attributes
         ----------
@@ -115,8 +144,8 @@ class hp3478a(object):
         dac: int
             Raw DAC value
 
-        fetched: datetime
-            Date and time this status was updated
+        fetched: float
+            Monotonic time (`time.monotonic()`) this status was read
         """
         function: int = None
         range: int = None
@@ -141,64 +170,50 @@ class hp3478a(object):
         errRAM: bool = None
         errChecksum: bool = None
         dac: int = None
-        fetched: datetime = None
+        fetched: float = None
     status = hp3478aStatus()
 
-    def __init__(self, addr: int, port: str=None, baud: int=921600, timeout: float=0.25, prologixGpib: prologix=None, debug: bool=False):
+    # Lookup tables decoding each status byte into the hp3478aStatus fields in order
+    STATUS_SB1 = tuple((sb >> 5 & 0b111, sb >> 2 & 0b111, sb & 0b11) for sb in range(256))
+    STATUS_SB2 = tuple(tuple(sb & (1<<bit) != 0 for bit in (6, 5, 4, 3, 2, 1, 0)) for sb in range(256))
+    STATUS_SB3 = tuple(tuple(sb & (1<<bit) != 0 for bit in (7, 5, 4, 3, 2, 0)) for sb in range(256))
+    STATUS_SB4 = tuple(tuple(sb & (1<<bit) != 0 for bit in (5, 4, 3, 2, 1, 0)) for sb in range(256))
+
+    DIGITS = {1: 5.5, 2: 4.5, 3: 3.5}
+
+    FUNCTIONS = {1: "VDC", 2: "VAC", 3: "Ω2W", 4: "Ω4W", 5: "ADC", 6: "AAC", 7: "ExtΩ"}
+
+    # (range, function) -> (maximum value, human readable)
+    RANGE_TABLE = {
+        (1, 1): (0.03, "30mV"),         (1, 2): (0.3, "300mV"),
+        (1, 3): (30.0, "30Ω"),          (1, 4): (30.0, "30Ω"),
+        (1, 5): (0.3, "300mA"),         (1, 6): (0.3, "300mA"),
+        (2, 1): (0.3, "300mV"),         (2, 2): (3.0, "3V"),
+        (2, 3): (300.0, "300Ω"),        (2, 4): (300.0, "300Ω"),
+        (2, 5): (3.0, "3A"),            (2, 6): (3.0, "3A"),
+        (3, 1): (3.0, "3V"),            (3, 2): (30.0, "30V"),
+        (3, 3): (3000.0, "3kΩ"),        (3, 4): (3000.0, "3kΩ"),
+        (4, 1): (30.0, "30V"),          (4, 2): (300.0, "300V"),
+        (4, 3): (30000.0, "30kΩ"),      (4, 4): (30000.0, "30kΩ"),
+        (5, 1): (300.0, "300V"),
+        (5, 3): (300000.0, "300kΩ"),    (5, 4): (300000.0, "300kΩ"),
+        (6, 3): (3000000.0, "3MΩ"),     (6, 4): (3000000.0, "3MΩ"),
+        (7, 3): (30000000.0, "30MΩ"),   (7, 4): (30000000.0, "30MΩ"),
+    }
+
+    def __init__(self, addr: int, gpib: prologixCodec=None):
         """
 
         Parameters
         ----------
         addr : int
             Address of the targeted device
-        port : str, optional
-            path of the serial device to use. Example: `/dev/ttyACM0` or `COM3`
-            If set a new prologix instance will be created
-            Either port or prologixGpib must be given
-            by default None
-        baud : int, optional
-            baudrate used for serial communication
-            only used when port is given
-            921600 should work with most USB dongles
-            115200 or 9600 are common for devices using UART in between
-            by default 921600
-        timeout : float, optional
-            number of seconds to wait at maximum for serial data to arrive
-            only used when port is given
-            by default 2.5 seconds
-        prologixGpib : prologix, optional
-            Prologix instance to use for communication
-            Ths may be shared between multiple devices with different addresses
-            Either port or prologixGpib must be given
+        gpib : prologixCodec, optional
+            Protocol state of the adapter used to reach the device
             by default None
-        debug : bool, optional
-            Whether to print verbose status messages and all communication
-            by default False
         """
-        if port == None and prologixGpib == None:
-            print("!! You must supply either a serial port or a prologix object")
-
         self.addr = addr
-
-        if prologixGpib is None:
-            self.gpib = prologix(port=port, baud=baud, timeout=timeout, debug=debug)
-        else:
-            self.gpib = prologixGpib
-
-    def getMeasure(self) -> float:
-        """Get last measurement as float
-
-        Returns
-        -------
-        float
-            last measurement
-        """
-        measurement = self.gpib.cmdPoll(" ", self.addr)
-
-        if measurement is None:
-            return None
-
-        return float(measurement)
+        self.gpib = gpib
 
     def getDigits(self, digits: int=None) -> float:
         """Get a human readable representation of currently used resolution
@@ -219,13 +234,7 @@ class hp3478a(object):
         if digits is None:
             digits = self.status.digits
 
-        if digits == 1:
-            return 5.5
-        elif digits == 2:
-            return 4.5
-        elif digits == 3:
-            return 3.5
-        return None
+        return self.DIGITS.get(digits)
     
     def getFunction(self, function: int=None) -> str:
         """Get a human readable representation of currently used measurement function
@@ -253,22 +262,7 @@ class hp3478a(object):
         if function is None:
             function = self.status.function
 
-        if function == 1:
-            return "VDC"
-        elif function == 2:
-            return "VAC"
-        elif function == 3:
-            return "Ω2W"
-        elif function == 4:
-            return "Ω4W"
-        elif function == 5:
-            return "ADC"
-        elif function == 6:
-            return "AAC"
-        elif function == 7:
-            return "ExtΩ"
-        else:
-            return None
+        return self.FUNCTIONS.get(function)
     
     def getRange(self, range: int=None, function: int=None, numeric: bool=False):
         """Get a human readable representation of currently used measurement range
@@ -297,400 +291,457 @@ class hp3478a(object):
         if function is None:
             function = self.status.function
         
-        if range == 1:
-            if function == 1:
-                if numeric:
-                    return 0.03
-                else:
-                    return "30mV"
-            elif function == 2:
-                if numeric:
-                    return 0.3
-                else:
-                    return "300mV"
-            elif function == 3 or function == 4:
-                if numeric:
-                    return 30.0
-                else:
-                    return "30Ω"
-            elif function == 5 or function == 6:
-                if numeric:
-                    return 0.3
-                else:
-                    return "300mA"
-            else:
-                return None
-        elif range == 2:
-            if function == 1:
-                if numeric:
-                    return 0.3
-                else:
-                    return "300mV"
-            elif function == 2:
-                if numeric:
-                    return 3.0
-                else:
-                    return "3V"
-            elif function == 3 or function == 4:
-                if numeric:
-                    return 300.0
-                else:
-                    return "300Ω"
-            elif function == 5 or function == 6:
-                if numeric:
-                    return 3.0
-                else:
-                    return "3A"
-            else:
-                return None
-        elif range == 3:
-            if function == 1:
-                if numeric:
-                    return 3.0
-                else:
-                    return "3V"
-            elif function == 2:
-                if numeric:
-                    return 30.0
-                else:
-                    return "30V"
-            elif function == 3 or function == 4:
-                if numeric:
-                    return 3000.0
-                else:
-                    return "3kΩ"
-            else:
-                return None
-        elif range == 4:
-            if function == 1:
-                if numeric:
-                    return 30.0
-                else:
-                    return "30V"
-            elif function == 2:
-                if numeric:
-                    return 300.0
-                else:
-                    return "300V"
-            elif function == 3 or function == 4:
-                if numeric:
-                    return 30000.0
-                else:
-                    return "30kΩ"
-            else:
-                return None
-        elif range == 5:
-            if function == 1:
-                if numeric:
-                    return 300.0
-                else:
-                    return "300V"
-            elif function == 3 or function == 4:
-                if numeric:
-                    return 300000.0
-                else:
-                    return "300kΩ"
-            else:
-                return None
-        elif range == 6:
-            if function == 3 or function == 4:
-                if numeric:
-                    return 3000000.0
-                else:
-                    return "3MΩ"
-            else:
-                return None
-        elif range == 7:
-            if function == 3 or function == 4:
-                if numeric:
-                    return 30000000.0
-                else:
-                    return "30MΩ"
-            else:
-                return None
+        entry = self.RANGE_TABLE.get((range, function))
+        if entry is None:
+            return None
+        if numeric:
+            return entry[0]
+        return entry[1]
 
-    def getStatus(self) -> hp3478aStatus:
-        """Read current device status and populate status object
+    def configCmd(self, status: hp3478aStatus) -> str:
+        """Build a program string restoring a configuration
+
+        Parameters
+        ----------
+        status : hp3478aStatus
+            status reading describing the configuration
 
         Returns
         -------
-        hp3478aStatus
-            Updated status object
+        str
+            command restoring function, range, digits, trigger, Auto-Zero and display
         """
-        status = self.gpib.cmdPoll("B", self.addr, binary=True)
-        
-        #Update last readout time
-        self.status.fetched = datetime.datetime.now()
-
-        #Byte 5: RAW DAC value
-        self.status.dac = status[4]
-
-        #Byte 4: Error Information
-        self.status.errChecksum     = (status[3]&(1<<0) != 0)
-        self.status.errRAM          = (status[3]&(1<<1) != 0)
-        self.status.errROM          = (status[3]&(1<<2) != 0)
-        self.status.errADSlope      = (status[3]&(1<<3) != 0)
-        self.status.errADSelfTest   = (status[3]&(1<<4) != 0)
-        self.status.errADLink       = (status[3]&(1<<5) != 0)
-
-        #Byte 3: Serial Poll Mask
-        self.status.srqReading      = (status[2]&(1<<0) != 0)
-            #Bit 1 not used
-        self.status.srqSyntaxErr    = (status[2]&(1<<2) != 0)
-        self.status.srqHWErr        = (status[2]&(1<<3) != 0)
-        self.status.srqKbd          = (status[2]&(1<<4) != 0)
-        self.status.srqCalFailed    = (status[2]&(1<<5) != 0)
-            #Bit 6 always zero
-        self.status.srqPon          = (status[2]&(1<<7) != 0)
-
-        #Byte 2: Status Bits
-        self.status.triggerInternal = (status[1]&(1<<0) != 0)
-        self.status.autoRange       = (status[1]&(1<<1) != 0)
-        self.status.autoZero        = (status[1]&(1<<2) != 0)
-        self.status.freq50Hz        = (status[1]&(1<<3) != 0)
-        self.status.frontPorts      = (status[1]&(1<<4) != 0)
-        self.status.calRAM          = (status[1]&(1<<5) != 0)
-        self.status.triggerExternal = (status[1]&(1<<6) != 0)
-
-        #Byte 1: Function/Range/Digits
-        sb1 = status[0]
-        self.status.digits = (sb1 & 0b00000011)
-        sb1 = sb1 >> 2
-        self.status.range = (sb1 & 0b00000111)
-        sb1 = sb1 >> 3
-        self.status.function = (sb1 & 0b00000111)
+        if status.autoRange:
+            rng = "A"
+        else:
+            rng = str(self.rangeCode(status.range, status.function))
+        if status.triggerInternal:
+            trigger = self.TRIG_INT
+        elif status.triggerExternal:
+            trigger = self.TRIG_EXT
+        else:
+            trigger = self.TRIG_HLD
+        return "F" + str(status.function) + "R" + rng + "N" + str(6 - status.digits) + "T" + str(trigger) + "Z" + str(int(status.autoZero)) + "D1"
+
+    def rangeCode(self, range: int=None, function: int=None) -> int:
+        """Translate a status range number into a range program code
+
+        Parameters
+        ----------
+        range : int, optional
+            numeric range representation as in `hp3478aStatus.range`
+            If None is given the last status reading is used
+            by default None
+        function : int, optional
+            numeric function representation
+            If None is given the last status reading is used
+            by default None
+
+        Returns
+        -------
+        int
+            program code as used by the `R` command
+        """
+        if range is None:
+            range = self.status.range
+        if function is None:
+            function = self.status.function
+        return range - self.RANGE_OFFSET[function]
+
+    def decodeStatus(self, status: bytes) -> hp3478aStatus:
+        """Create a new status snapshot from the raw 5 byte status
+
+        Parameters
+        ----------
+        status : bytes
+            Raw status as returned by the `B` command
 
+        Returns
+        -------
+        hp3478aStatus
+            New status snapshot, also available as `status`
+        """
+        self.status = self.hp3478aStatus(
+            *self.STATUS_SB1[status[0]],    # Function/Range/Digits
+            *self.STATUS_SB2[status[1]],    # Status Bits
+            *self.STATUS_SB3[status[2]],    # Serial Poll Mask
+            *self.STATUS_SB4[status[3]],    # Error Information
+            status[4],                      # RAW DAC value
+            time.monotonic(),
+        )
+        self.measureKind = self.readingKind(self.status.function, self.status.digits, self.status.autoZero)
         return self.status
 
-    def getFrontRear(self) -> bool:
-        """Get position of Front/Rear switch
+    def readingKind(self, function: int, digits: int, autoZero: bool) -> str:
+        """Get the command class of readings for learning response times
 
-        May also be used to easily determine if the device is responding
+        The time a reading takes depends on function, resolution and Auto-Zero
+
+        Parameters
+        ----------
+        function : int
+            numeric function representation
+        digits : int
+            numeric resolution representation, see `hp3478aStatus.digits`
+        autoZero : bool
+            Auto-Zero setting
 
         Returns
         -------
-        bool
-            True  -> Front-Port
-            False -> Rear-Port
-            None  -> Device did not respond
+        str
+            command class, e.g. `F1N5Z1` for DC voltage at 5½ digits with Auto-Zero
         """
-        check = self.gpib.cmdPoll("S")
-        if check == "1":
-            return True
-        elif check == "0":
-            return False
-        else:
-            return None
+        return "F" + str(function) + "N" + str(6 - digits) + "Z" + str(int(autoZero))
 
-    def getCalibration(self, filename : str=None) -> bytearray:
-        """Read device calibration data
+    def checkCalibrationCells(self, responses: list) -> bytes:
+        """Join responses to `W` commands if all of them are valid
 
-        Code based on work by
-            Steve1515 (EEVblog)
-            fenugrec (EEVblog)
-            Luke Mester (https://mesterhome.com/)
+        Parameters
+        ----------
+        responses : list
+            one response per cell
+
+        Returns
+        -------
+        bytes
+            Raw data, one byte per cell; None if any response is invalid
+        """
+        for response in responses:
+            if response is None or len(response) != 1 or response[0] & 0xf0 != 0x40:
+                return None
+        return b"".join(responses)
+
+    def calibrationReader(self, chunk: int=32, retries: int=3, checksums: bool=True):
+        """Generator driving a calibration RAM dump independent of the transport
+
+        Yields `(cells, done)` with the cell addresses to read next and the
+        number of cells read so far. The raw data read for those cells, or
+        None if the read failed, must be passed back using `send`.
 
         Parameters
         ----------
-        filename : str, optional
-            filename to save calibration to
-            file will be overwritten if it exists
-            by default None
+        chunk : int, optional
+            number of cells read per transfer
+            by default 32
+        retries : int, optional
+            number of additional passes for failed cells
+            by default 3
+        checksums : bool, optional
+            Whether to read records with a wrong checksum again
+            by default True
 
         Returns
         -------
         bytearray
-            Raw calibration data
+            Raw calibration data as value of `StopIteration`
+            None if not all cells could be read
         """
-        
-        self.callReset()
-        self.setTrigger(self.TRIG_HLD)
-
-        check = self.getFrontRear()
-        if check is None:
-            print("Can not connect to instrument")
+        cdata = bytearray(self.CAL_SIZE)
+        done = set()
+        pending = list(range(self.CAL_SIZE))
+        for attempt in range(retries + 1):
+            if attempt > 0:
+                # a single bad response discards its whole transfer, so retry in smaller ones
+                chunk = max(1, chunk // 4)
+                if self.gpib.trace is not None:
+                    self.gpib.log("Reading " + str(len(pending)) + " calibration cells again")
+            for start in range(0, len(pending), chunk):
+                cells = pending[start:start+chunk]
+                data = yield cells, len(done)
+                if data is not None:
+                    for cell, byte in zip(cells, data):
+                        cdata[cell] = byte
+                    done.update(cells)
+
+            bad = []
+            badCells = set()
+            for record in (self.calibrationErrors(cdata) if checksums else []):
+                cells = range(1 + record*self.CAL_RECORD_SIZE, 1 + (record+1)*self.CAL_RECORD_SIZE)
+                if all(cell in done for cell in cells):
+                    bad.append(record)
+                    badCells.update(cells)
+            done.difference_update(badCells)
+            pending = [cell for cell in range(self.CAL_SIZE) if cell not in done]
+            if len(pending) == 0:
+                break
+
+        failed = [cell for cell in pending if cell not in badCells]
+        if len(failed) > 0:
+            print("!! " + str(len(failed)) + " calibration cells could not be read")
             return None
+        for record in bad:
+            print("!! Checksum of calibration record " + str(record) + " is wrong")
+        return cdata
 
-        self.setDisplay("CAL READ 00%")
+    def calibrationWriteCmd(self, cell: int, value: int) -> bytes:
+        """Build the command writing and reading back one calibration RAM cell
 
-        p  = 0
-        lp = 0
-        cdata = b""
+        Parameters
+        ----------
+        cell : int
+            cell address
+        value : int
+            new nibble, higher bits are ignored
 
-        for dbyte in range(0, 255):
-            din = self.gpib.cmdPoll(self.gpib.escapeCmd("W"+chr(dbyte)), binary=True)
-            cdata += din
-            p = (int)(dbyte/25.5)
-            if p != lp:
-                self.setDisplay("CAL READ " + str(p) + "0%")
-                lp = p
+        Returns
+        -------
+        bytes
+            escaped `X` and `W` program codes
+        """
+        return self.gpib.escapeCmd(b"X" + bytes([cell, 0x40 | (value & 0xf)]) + b"W" + bytes([cell]))
 
-        self.setDisplay("CAL READ OK")
+    def calibrationWriter(self, cdata: bytes, cells: list, chunk: int=32, retries: int=3):
+        """Generator driving a calibration RAM upload independent of the transport
 
-        if filename is not None:
-            fp = open("calibration.data", "wb")
-            for byte in cdata:
-                fp.write(byte.to_bytes(1, byteorder='big'))
-            fp.close()
+        Yields `(cells, done)` with the cell addresses to write next and the
+        number of cells verified so far. The raw data read back for those
+        cells, or None if the transfer failed, must be passed back using `send`.
 
-        sleep(1)
-        self.setDisplay(None)
+        Parameters
+        ----------
+        cdata : bytes
+            Raw calibration data containing the new values
+        cells : list
+            cell addresses to write
+        chunk : int, optional
+            number of cells written per transfer
+            by default 32
+        retries : int, optional
+            number of additional passes for failed cells
+            by default 3
 
-        self.callReset()
+        Returns
+        -------
+        bool
+            Whether all cells were verified, as value of `StopIteration`
+        """
+        done = 0
+        pending = list(cells)
+        for attempt in range(retries + 1):
+            if len(pending) == 0:
+                break
+            if attempt > 0:
+                chunk = max(1, chunk // 4)
+                if self.gpib.trace is not None:
+                    self.gpib.log("Writing " + str(len(pending)) + " calibration cells again")
+            failed = []
+            for start in range(0, len(pending), chunk):
+                part = pending[start:start+chunk]
+                data = yield part, done
+                for cell, byte in zip(part, data if data is not None else [None]*len(part)):
+                    if byte is not None and byte & 0xf == cdata[cell] & 0xf:
+                        done += 1
+                    else:
+                        failed.append(cell)
+            pending = failed
+
+        if len(pending) > 0:
+            print("!! " + str(len(pending)) + " calibration cells could not be written")
+            return False
+        return True
 
-        return cdata
+    def calibrationErrors(self, cdata: bytes) -> list:
+        """Validate the checksums of all calibration records
 
+        Parameters
+        ----------
+        cdata : bytes
+            Raw calibration data as returned by `getCalibration`
 
-    def setAutoZero(self, autoZero: bool, noUpdate: bool=False) -> bool:
-        """change Auto-Zero setting
+        Returns
+        -------
+        list
+            numbers of records with a wrong checksum
+        """
+        bad = []
+        for record in range(self.CAL_RECORDS):
+            base = 1 + record*self.CAL_RECORD_SIZE
+            nibbles = [b & 0xf for b in cdata[base:base+self.CAL_RECORD_SIZE]]
+            if sum(nibbles[:11]) + (nibbles[11] << 4 | nibbles[12]) != 0xff:
+                bad.append(record)
+        return bad
+
+    def configureCmd(self, function: int=None, range=None, digits: float=None, trigger: int=None, autoZero: bool=None) -> str:
+        """Build the program string for `configure`
+
+        Settings already matching the last status reading are left out.
+        Without a status reading all given settings are included.
+
+        Returns
+        -------
+        str
+            program string; empty if nothing has to be changed, None on invalid settings
+        """
+        if function is not None and (function <= 0 or function > 7):
+            print("!! Invalid function")
+            return None
+        if range is not None:
+            newRange, newRangeF = self.parseRange(range)
+            if newRange is None:
+                print("!! Invalid range")
+                return None
+        if digits is not None:
+            newDigits = self.parseDigits(digits)
+            if newDigits is None:
+                print("!! Invalid digits")
+                return None
+        if trigger is not None and (trigger <= 0 or trigger > 5):
+            print("!! Invalid trigger")
+            return None
+
+        known = self.status
+        if known.fetched is None:
+            known = self.hp3478aStatus()
+
+        cmd = ""
+        if function is not None and known.function != function:
+            cmd += "F" + str(function)
+        # the range code depends on the function, so always send it after F
+        if range is not None:
+            if newRange == "A":
+                if cmd != "" or not known.autoRange:
+                    cmd += "RA"
+            elif cmd != "" or known.autoRange or self.getRange(known.range, known.function, numeric=True) != newRangeF:
+                cmd += "R" + str(newRange)
+        if digits is not None and known.digits != 6 - int(newDigits):
+            cmd += "N" + newDigits
+        # status only tells internal and external trigger apart
+        if trigger is not None:
+            if not ((trigger == self.TRIG_INT and known.triggerInternal) or (trigger == self.TRIG_EXT and known.triggerExternal)):
+                cmd += "T" + str(trigger)
+        if autoZero is not None and known.autoZero != autoZero:
+            cmd += "Z" + str(int(autoZero))
+        return cmd
+
+    def checkConfiguration(self, cmd: str, function: int=None, range=None, digits: float=None, trigger: int=None, autoZero: bool=None) -> bool:
+        """Compare the last status reading with the settings given to `configure`
+
+        All mismatches are reported in a single message
+
+        Returns
+        -------
+        bool
+            Whether all settings match
+        """
+        status = self.status
+        mismatches = []
+        if function is not None and status.function != function:
+            mismatches.append("function " + self.getFunction(function) + " is " + str(self.getFunction()))
+        if range is not None:
+            newRange, newRangeF = self.parseRange(range)
+            if newRange == "A":
+                if not status.autoRange:
+                    mismatches.append("Auto-Range is off")
+            elif self.getRange(numeric=True) != newRangeF:
+                mismatches.append("range " + str(range) + " is " + str(self.getRange()))
+        if digits is not None:
+            newDigits = self.parseDigits(digits)
+            if status.digits != 6 - int(newDigits):
+                mismatches.append("digits " + newDigits + "½ is " + str(self.getDigits()))
+        if trigger is not None:
+            if trigger == self.TRIG_EXT and not status.triggerExternal:
+                mismatches.append("external trigger is off")
+            elif trigger == self.TRIG_INT and not status.triggerInternal:
+                mismatches.append("internal trigger is off")
+            elif trigger in (self.TRIG_SIN, self.TRIG_HLD, self.TRIG_FST) and status.triggerInternal:
+                mismatches.append("internal trigger is still on")
+        if autoZero is not None and status.autoZero != autoZero:
+            mismatches.append("Auto-Zero " + str(autoZero) + " is " + str(status.autoZero))
+
+        if len(mismatches) > 0:
+            print("!! Configuration " + cmd + " failed: " + ", ".join(mismatches))
+            return False
+        elif self.gpib.trace is not None:
+            self.gpib.log("Changed configuration using " + cmd)
+        return True
+
+    def checkAutoZero(self, autoZero: bool) -> bool:
+        """Verify Auto-Zero setting against the last status reading
 
         Parameters
         ----------
         autoZero : bool
-            Whether to enable or disable Auto-Zero
-        noUpdate : bool, optional
-            If True do not update status object to verify change was successful
-            by default False
+            Expected Auto-Zero setting
 
         Returns
         -------
         bool
-            new status of autoZero; presumed status if `noUpdate` was True
+            status of autoZero
         """
-        setVal = 0
-        if autoZero: setVal = 1
-
-        self.gpib.cmdWrite("Z"+str(autoZero), self.addr)
-
-        if noUpdate:
-            if self.gpib.debug:
-                print(".. AutoZero changed to " + setVal + " without verification.")
-            return setVal
-        else:
-            self.getStatus()
-            if autoZero != self.status.autoZero:
-                print("!! Error while changing AutoZero - tried to set " + str(autoZero) + " but verification was " + str(self.status.autoZero))
-            elif self.gpib.debug:
-                print(".. AutoZero successfully changed to " + str(self.status.autoZero))
-            return self.status.autoZero
+        if autoZero != self.status.autoZero:
+            print("!! Error while changing AutoZero - tried to set " + str(autoZero) + " but verification was " + str(self.status.autoZero))
+        elif self.gpib.trace is not None:
+            self.gpib.log("AutoZero successfully changed to " + str(self.status.autoZero))
+        return self.status.autoZero
 
-    def setDisplay(self, text: str=None, online: bool=True) -> bool:
-        """Change device display
+    def displayCmd(self, text: str=None, online: bool=True) -> str:
+        """Build the display command for `setDisplay`
 
         Parameters
         ----------
         text : str, optional
-            When text is None or empty device will resume standard display mode
-                as in show measurements
-            When text is set it will be displayed on the device
-            
-            Only ASCII 32-95 are valid. Function aborts for invalid characters
-            Must be <= 12 Characters while , and . do not count as character.
-                consecutive , and . may not work
-                using . or , after character 12 may not work
-                Function aborts for too long strings
+            see `setDisplay`
         online : bool, optional
-            When True the device just shows the text but keeps all functionality online
-            When False the device will turn off all dedicated annunciators and stop updating
-                the display once the text was drwn. This will free up ressources and enable
-                faster measurement speeds. Using False takes about 30mS to complete. If the
-                updating is stopped for over 10 minutes if will shut down as in blank screen.
-            by default True
+            see `setDisplay`
 
         Returns
         -------
-        bool
-            Wheather setting the text worked as expected
+        str|None
+            Command to send; None if text is invalid
         """
         if text is None or text == "":
             # Reset display
-            self.gpib.cmdWrite("D1", self.addr)
-            if self.gpib.debug:
-                print("Display reset to standard mode")
-            return True
-        
+            return "D1"
+
         len = 0
         for c in text:
             if ord(c) < 32 or ord(c) > 95:
                 print("!! Character '" + c + "' is not supported")
-                return False
+                return None
             if c != "," and c != ".":
                 len = len+1
             
             if len > 12:
                 print("!! Text too long; max 12 characters")
-                return False
+                return None
             
-        cmd = "D2"
-        dt = ""
         if not online:
-            cmd = "D3"
-            dt = " (updates paused)"
-
-        self.gpib.cmdWrite(cmd + text, self.addr)
-        
-        if self.gpib.debug:
-            print(".. Display changed to '" + text + "'" + dt)
-
-        #@TODO we could check status/errors to catch syntax errors here
-        return True
+            return "D3" + text
+        return "D2" + text
 
-    def setFunction(self, function : int, noUpdate: bool=False) -> bool:
-        """Change current measurement function
+    def checkFunction(self, function: int) -> bool:
+        """Verify measurement function against the last status reading
 
         Parameters
         ----------
         function : int
-            numeric function representation
-            you may also use the following class constants:
-                VDC,VAC,Ω2W,Ω4W,ADC,AAC,EXTΩ
-        noUpdate : bool, optional
-            If True do not update status object to verify change was successful
-            by default False
+            Expected numeric function representation
 
         Returns
         -------
         bool
-            Whether update succeeded or not; not verified if `noUpdate` was True
+            Whether the device uses the expected function
         """
-        if function <= 0 or function > 7:
-            print("!! Invalid function")
+        if self.status.function != function:
+            print("!! Set failed. Tried to set " + self.getFunction(function) + " but device returned " + str(self.getFunction(self.status.function)))
             return False
-        
-        self.gpib.cmdWrite("F" + str(function), self.addr)
-
-        if not noUpdate:
-            self.getStatus()
-            if self.status.function != function:
-                print("!! Set failed. Tried to set " + self.getFunction(function) + " but device returned " + self.getFunction(self.status.function))
-                return False
-            elif self.gpib.debug:
-                print(".. Changed to function " + self.getFunction(function))
-        elif self.gpib.debug:
-            print(".. Probably changed to function " + self.getFunction(function))
-        
+        elif self.gpib.trace is not None:
+            self.gpib.log("Changed to function " + self.getFunction(function))
         return True
 
-    def setRange(self, range : str, noUpdate : bool=False) -> bool:
-        """Change current measurement range
+    def parseRange(self, range) -> tuple:
+        """Translate a range given to `setRange` into a program code
 
         Parameters
         ----------
         range : str|float
-            Range as SI-Value or float
-            Valid values:
-            A or AUTO to enable Auto-Range
-            30m,300m,3,30,300,3k,30k,300k,3M,30M
-            0.03,0.3,3,30,300,3000,30000,300000,3000000,30000000
-            Not all ranges can be used in all measurement functions
-        noUpdate : bool, optional
-            If True do not update status object to verify change was successful
-            by default False
+            see `setRange`
 
         Returns
         -------
-        bool
-            Whether update succeeded or not; not verified if `noUpdate` was True
+        tuple
+            (program code, maximum value as float)
+            program code is "A" for Auto-Range and None for invalid ranges
         """
         newRange = None
         newRangeF = None
@@ -724,35 +775,808 @@ class hp3478a(object):
         elif range == "30M"     or range == 30000000:
             newRange  = 7
             newRangeF = 30000000
-        elif range.lower() == "a" or range.lower() == "auto":
+        elif isinstance(range, str) and (range.lower() == "a" or range.lower() == "auto"):
             newRange = "A"
-        
-        if newRange is None:
-            print("!! Invalid range")
+        return newRange, newRangeF
+
+    def checkRange(self, range, newRange, newRangeF: float) -> bool:
+        """Verify measurement range against the last status reading
+
+        Parameters
+        ----------
+        range : str|float
+            Range as given to `setRange`
+        newRange : int|str
+            program code as returned by `parseRange`
+        newRangeF : float
+            maximum value as returned by `parseRange`
+
+        Returns
+        -------
+        bool
+            Whether the device uses the expected range
+        """
+        if newRange == "A":
+            if not self.status.autoRange:
+                print("!! Tried to enable Auto-Range but device refused")
+                return False
+            elif self.gpib.trace is not None:
+                self.gpib.log("Enabled Auto-Range")
+        else:
+            newRangeC = self.getRange(numeric=True)
+            if newRangeF != newRangeC:
+                print("!! Tried to set range to " + str(range) + " but device reported " + str(self.getRange()))
+                return False
+            elif self.gpib.trace is not None:
+                self.gpib.log("Set range to " + self.getRange())
+        return True
+
+    def parseDigits(self, digits: float) -> str:
+        """Translate digits given to `setDigits` into a program code
+
+        Parameters
+        ----------
+        digits : float
+            see `setDigits`
+
+        Returns
+        -------
+        str|None
+            "3", "4" or "5"; None for invalid values
+        """
+        if digits == 3 or digits == 3.5:
+            return "3"
+        elif digits == 4 or digits == 4.5:
+            return "4"
+        elif digits == 5 or digits == 5.5:
+            return "5"
+        return None
+
+    def checkDigits(self, newDigits: str) -> bool:
+        """Verify measurement resolution against the last status reading
+
+        Parameters
+        ----------
+        newDigits : str
+            program code as returned by `parseDigits`
+
+        Returns
+        -------
+        bool
+            Whether the device uses the expected resolution
+        """
+        if self.getDigits() is None or int(self.getDigits()) != int(newDigits):
+            print("!! Tried to set digits to " + str(int(newDigits)) + "½ but device reported " + str(self.getDigits()))
             return False
-        
-        self.gpib.cmdWrite("R" + str(newRange), self.addr)
+        elif self.gpib.trace is not None:
+            self.gpib.log("Set digits to " + str(int(self.getDigits())) + "½")
+        return True
 
-        if not noUpdate:
-            self.getStatus()
-            if newRange == "A":
-                if not self.status.autoRange:
-                    print("!! Tried to enable Auto-Range but device refused")
-                    return False
-                elif self.gpib.debug:
-                    print(".. Enabled Auto-Range")
+    def checkTrigger(self, trigger: int) -> bool:
+        """Verify trigger mode against the last status reading
+
+        Parameters
+        ----------
+        trigger : int
+            Expected trigger mode
+
+        Returns
+        -------
+        bool
+            Whether the status flags match the expected trigger mode
+        """
+        if trigger == self.TRIG_EXT and not self.status.triggerExternal:
+            print("!! Tried to enable external trigger but flag did not update")
+            return False
+        elif trigger == self.TRIG_SIN and self.status.triggerInternal:
+            print("!! Tried to enable singe trigger but auto trigger flag is still active")
+            return False
+        elif trigger == self.TRIG_INT and not self.status.triggerInternal:
+            print("!! Tried to enable internal trigger but auto trigger flag is not active")
+            return False
+        elif trigger == self.TRIG_HLD and self.status.triggerInternal:
+            print("!! Tried to enable trigger hold but auto trigger flag is still active")
+            return False
+        return True
+
+    def getSRQ(self, status: hp3478aStatus=None) -> int:
+        """Get Serial Poll Register Mask from a status reading
+
+        Parameters
+        ----------
+        status : hp3478aStatus, optional
+            status reading to use
+            by default the last status reading
+
+        Returns
+        -------
+        int
+            mask as used by `setSRQ`
+        """
+        if status is None:
+            status = self.status
+        srq = 0
+        if status.srqReading:   srq |= self.SRQ_READING
+        if status.srqSyntaxErr: srq |= self.SRQ_SYNTAX
+        if status.srqHWErr:     srq |= self.SRQ_HWERR
+        if status.srqKbd:       srq |= self.SRQ_KBD
+        if status.srqCalFailed: srq |= self.SRQ_CAL
+        return srq
+
+class hp3478a(hp3478aCodec):
+    """Control HP3478A multimeters using a Prologix compatible dongle
+
+    Adds the blocking communication to `hp3478aCodec`
+
+    Attributes
+    ----------
+
+    gpib : prologix
+        Prologix object used to communicate with the prologix dongle
+    priority : int
+        Bus arbitration priority used for transactions of this device
+    """
+
+    gpib: prologix = None
+    priority: int = prologix.PRIO_NORMAL
+
+    def __init__(self, addr: int, port: str=None, baud: int=921600, timeout: float=0.25, prologixGpib: prologix=None, debug: bool=False, priority: int=prologix.PRIO_NORMAL):
+        """
+
+        Parameters
+        ----------
+        addr : int
+            Address of the targeted device
+        port : str|object, optional
+            path of the serial device to use. Example: `/dev/ttyACM0` or `COM3`
+            or an opened PySerial compatible object, see `prologix`
+            If set a new prologix instance will be created
+            Either port or prologixGpib must be given
+            by default None
+        baud : int, optional
+            baudrate used for serial communication
+            only used when port is given
+            921600 should work with most USB dongles
+            115200 or 9600 are common for devices using UART in between
+            by default 921600
+        timeout : float, optional
+            number of seconds to wait at maximum for serial data to arrive
+            only used when port is given
+            by default 2.5 seconds
+        prologixGpib : prologix, optional
+            Prologix instance to use for communication
+            Ths may be shared between multiple devices with different addresses
+            Either port or prologixGpib must be given
+            by default None
+        debug : bool, optional
+            Whether to print verbose status messages and all communication
+            by default False
+        priority : int, optional
+            Bus arbitration priority for transactions of this device
+            Lower values are served first when multiple threads share an adapter
+            by default prologix.PRIO_NORMAL
+        """
+        if port == None and prologixGpib == None:
+            print("!! You must supply either a serial port or a prologix object")
+
+        self.priority = priority
+
+        if prologixGpib is None:
+            prologixGpib = prologix(port=port, baud=baud, timeout=timeout, debug=debug)
+        super().__init__(addr, prologixGpib)
+
+    def getMeasure(self) -> float:
+        """Get last measurement as float
+
+        Returns
+        -------
+        float
+            last measurement
+        """
+        with self.gpib.transaction(self.priority):
+            measurement = self.gpib.cmdPoll(" ", self.addr, kind=self.measureKind)
+
+            if measurement is None:
+                return None
+
+            return float(measurement)
+
+    def stream(self, count: int=None, digits: float=3.5, autoZero: bool=False, range=None, text: str="STREAM", buffer=None):
+        """Acquire readings as fast as possible
+
+        Applies a high speed profile in a single command: selected resolution,
+        Auto-Zero off, fixed range, internal trigger and display updates paused.
+        Readings are then polled without status checks in between. The previous
+        configuration is restored once the generator finishes or is closed.
+
+        Parameters
+        ----------
+        count : int, optional
+            number of readings to acquire
+            by default None (until the generator is closed)
+        digits : float, optional
+            resolution, see `setDigits`; 3.5 is fastest
+            by default 3.5
+        autoZero : bool, optional
+            Whether to keep Auto-Zero enabled; disabling doubles the reading rate
+            by default False
+        range : str|float, optional
+            fixed range, see `setRange`
+            by default None (keep current range but disable Auto-Range)
+        text : str, optional
+            text to show on the paused display
+            by default "STREAM"
+        buffer : sampleBuffer, optional
+            if given every reading is also appended to this buffer
+            together with function, range and device address
+            by default None
+
+        Yields
+        ------
+        tuple
+            (monotonic timestamp, value) for each reading; value is None on timeouts
+        """
+        newDigits = self.parseDigits(digits)
+        if newDigits is None:
+            print("!! Invalid digits")
+            return
+        if range is None:
+            newRange = None
+        else:
+            newRange, newRangeF = self.parseRange(range)
+            if newRange is None or newRange == "A":
+                print("!! Invalid range")
+                return
+        if self.displayCmd(text, False) is None:
+            return
+
+        with self.gpib.transaction(self.priority):
+            previous = self.getStatus()
+            restore = self.configCmd(previous)
+            if newRange is None:
+                newRange = self.rangeCode(previous.range, previous.function)
+            function = previous.function
+            rng = newRange + self.RANGE_OFFSET[function]
+            self.gpib.cmdWrite("N" + newDigits + "Z" + str(int(autoZero)) + "R" + str(newRange) + "T1" + "D3" + text, self.addr)
+            self.measureKind = self.readingKind(function, 6 - int(newDigits), autoZero)
+
+        try:
+            n = 0
+            while count is None or n < count:
+                value = self.getMeasure()
+                timestamp = time.monotonic()
+                if buffer is not None:
+                    buffer.append(timestamp, value, function, rng, self.addr)
+                yield (timestamp, value)
+                n += 1
+        finally:
+            self.gpib.cmdWrite(restore, self.addr)
+            self.measureKind = self.readingKind(previous.function, previous.digits, previous.autoZero)
+            if self.gpib.trace is not None:
+                self.gpib.log("Restored configuration " + restore)
+
+    def acquire(self, count: int, **kwargs) -> list:
+        """Acquire a fixed number of readings as fast as possible
+
+        Parameters
+        ----------
+        count : int
+            number of readings to acquire
+        **kwargs
+            see `stream`
+
+        Returns
+        -------
+        list
+            (monotonic timestamp, value) for each reading
+        """
+        return list(self.stream(count, **kwargs))
+
+    def getStatus(self) -> hp3478aCodec.hp3478aStatus:
+        """Read current device status into a new status snapshot
+
+        Returns
+        -------
+        hp3478aStatus
+            New status snapshot, also available as `status`
+        """
+        with self.gpib.transaction(self.priority):
+            status = self.gpib.cmdPoll("B", self.addr, binary=True, frame=5, kind="B")
+            return self.decodeStatus(status)
+
+    def getFrontRear(self) -> bool:
+        """Get position of Front/Rear switch
+
+        May also be used to easily determine if the device is responding
+
+        Returns
+        -------
+        bool
+            True  -> Front-Port
+            False -> Rear-Port
+            None  -> Device did not respond
+        """
+        check = self.gpib.cmdPoll("S", self.addr)
+        if check == "1":
+            return True
+        elif check == "0":
+            return False
+        else:
+            return None
+
+    def getCalibration(self, filename : str=None, chunk: int=32, retries: int=3, progress=None) -> bytearray:
+        """Read device calibration data
+
+        Cells are read using pipelined `W` commands, `chunk` cells per
+        transfer. Cells which could not be read and records with a wrong
+        checksum are read again up to `retries` times in smaller transfers.
+
+        Code based on work by
+            Steve1515 (EEVblog)
+            fenugrec (EEVblog)
+            Luke Mester (https://mesterhome.com/)
+
+        Parameters
+        ----------
+        filename : str, optional
+            filename to save calibration to
+            file will be overwritten if it exists
+            by default None
+        chunk : int, optional
+            number of cells read per transfer
+            by default 32
+        retries : int, optional
+            number of additional passes for failed cells
+            by default 3
+        progress : callable, optional
+            called as `progress(device, done, total)` after each transfer
+            by default None
+
+        Returns
+        -------
+        bytearray
+            Raw calibration data, one byte (0x40 | nibble) per cell
+            None if not all cells could be read
+        """
+        if not self.prepareCalibration():
+            return None
+
+        cdata = self.readCalibration(chunk, retries, progress)
+
+        self.callReset()
+
+        if cdata is not None and filename is not None:
+            with open(filename, "wb") as fp:
+                fp.write(cdata)
+
+        return cdata
+
+    def setCalibration(self, cdata: bytes, chunk: int=32, retries: int=3, progress=None, force: bool=False) -> bool:
+        """Write device calibration data
+
+        The CAL ENABLE switch on the front panel must be turned on.
+        The calibration RAM is read first and only differing cells are
+        written. Each cell is read back in the same command as it is
+        written, so writing and verifying takes a single pipelined pass.
+
+        Parameters
+        ----------
+        cdata : bytes
+            Raw calibration data as returned by `getCalibration`
+            255 byte dumps of earlier versions leave the last cell unchanged
+        chunk : int, optional
+            number of cells written per transfer
+            by default 32
+        retries : int, optional
+            number of additional passes for failed cells
+            by default 3
+        progress : callable, optional
+            called as `progress(device, done, total)` after each transfer,
+            first while reading, then while writing
+            by default None
+        force : bool, optional
+            Whether to write data with wrong record checksums
+            by default False
+
+        Returns
+        -------
+        bool
+            Whether all cells were written and verified
+        """
+        if len(cdata) not in (self.CAL_SIZE, self.CAL_SIZE_LEGACY):
+            print("!! Calibration data must contain " + str(self.CAL_SIZE) + " cells")
+            return False
+        bad = self.calibrationErrors(cdata)
+        if len(bad) > 0 and not force:
+            print("!! Wrong checksum in calibration records " + ", ".join(str(record) for record in bad))
+            return False
+
+        if not self.prepareCalibration("CAL WRITE"):
+            return False
+
+        ok = False
+        if not self.getStatus().calRAM:
+            print("!! Calibration RAM is write protected, turn on CAL ENABLE")
+        else:
+            current = self.readCalibration(chunk, retries, progress, checksums=False)
+            if current is not None:
+                changed = [cell for cell in range(len(cdata)) if current[cell] & 0xf != cdata[cell] & 0xf]
+                if self.gpib.trace is not None:
+                    self.gpib.log("" + str(len(changed)) + " calibration cells differ")
+                writer = self.calibrationWriter(cdata, changed, chunk, retries)
+                try:
+                    cells, done = next(writer)
+                    while True:
+                        if progress is not None:
+                            progress(self, done, len(changed))
+                        cells, done = writer.send(self.writeCalibrationCells(cells, cdata))
+                except StopIteration as result:
+                    ok = result.value
+                if progress is not None and ok:
+                    progress(self, len(changed), len(changed))
+
+        self.callReset()
+        return ok
+
+    def prepareCalibration(self, text: str="CAL READ") -> bool:
+        """Put the device on hold and show a message before accessing calibration data
+
+        Parameters
+        ----------
+        text : str, optional
+            message to display
+            by default "CAL READ"
+
+        Returns
+        -------
+        bool
+            Whether the device responded
+        """
+        self.callReset()
+        self.setTrigger(self.TRIG_HLD)
+
+        check = self.getFrontRear()
+        if check is None:
+            print("Can not connect to instrument")
+            return False
+
+        self.setDisplay(text)
+        return True
+
+    def readCalibration(self, chunk: int=32, retries: int=3, progress=None, checksums: bool=True) -> bytearray:
+        """Read the calibration RAM of a prepared device
+
+        see `getCalibration`, which also prepares and resets the device
+
+        Parameters
+        ----------
+        checksums : bool, optional
+            Whether to read records with a wrong checksum again
+            by default True
+
+        Returns
+        -------
+        bytearray
+            Raw calibration data; None if not all cells could be read
+        """
+        reader = self.calibrationReader(chunk, retries, checksums)
+        try:
+            cells, done = next(reader)
+            while True:
+                if progress is not None:
+                    progress(self, done, self.CAL_SIZE)
+                cells, done = reader.send(self.readCalibrationCells(cells))
+        except StopIteration as result:
+            cdata = result.value
+        if progress is not None and cdata is not None:
+            progress(self, self.CAL_SIZE, self.CAL_SIZE)
+        return cdata
+
+    def readCalibrationCells(self, cells: list) -> bytes:
+        """Read calibration RAM cells in a single pipelined transfer
+
+        Parameters
+        ----------
+        cells : list
+            cell addresses to read
+
+        Returns
+        -------
+        bytes
+            Raw data, one byte per cell; None if any cell failed as later
+            responses can not be attributed reliably then
+        """
+        queries = [(self.addr, b"W" + self.gpib.escapeCmd(bytes([cell])), True, 1, "W") for cell in cells]
+        with self.gpib.transaction(prologix.PRIO_LOW):
+            responses = self.gpib.cmdPollMulti(queries)
+        return self.checkCalibrationCells(responses)
+
+    def writeCalibrationCells(self, cells: list, cdata: bytes) -> bytes:
+        """Write calibration RAM cells and read them back in a single pipelined transfer
+
+        Parameters
+        ----------
+        cells : list
+            cell addresses to write
+        cdata : bytes
+            Raw calibration data containing the new values
+
+        Returns
+        -------
+        bytes
+            Raw data read back, one byte per cell; None if any cell failed
+        """
+        queries = [(self.addr, self.calibrationWriteCmd(cell, cdata[cell]), True, 1, "X") for cell in cells]
+        with self.gpib.transaction(prologix.PRIO_LOW):
+            responses = self.gpib.cmdPollMulti(queries)
+        return self.checkCalibrationCells(responses)
+
+    @staticmethod
+    def getCalibrations(devices: list, filename: str=None, chunk: int=32, retries: int=3, progress=None) -> list:
+        """Read calibration data of many devices at once
+
+        Devices sharing an adapter are read round robin one transfer at a time,
+        different adapters are read in parallel threads.
+
+        Parameters
+        ----------
+        devices : list
+            hp3478a instances
+        filename : str, optional
+            filename template to save calibrations to, formatted with `addr`
+            and `index` (position in `devices`). Example: `cal-{index}-{addr}.data`
+            by default None
+        chunk : int, optional
+            see `getCalibration`, by default 32
+        retries : int, optional
+            see `getCalibration`, by default 3
+        progress : callable, optional
+            see `getCalibration`, by default None
+
+        Returns
+        -------
+        list
+            Raw calibration data or None per device
+        """
+        results = [None] * len(devices)
+        adapters = {}
+        for index, device in enumerate(devices):
+            adapters.setdefault(id(device.gpib), []).append(index)
+
+        def run(indices):
+            readers = {}
+            for index in indices:
+                if devices[index].prepareCalibration():
+                    readers[index] = devices[index].calibrationReader(chunk, retries)
+            steps = {}
+            for index, reader in list(readers.items()):
+                steps[index] = next(reader)
+            while len(steps) > 0:
+                for index in list(steps):
+                    device = devices[index]
+                    cells, done = steps[index]
+                    if progress is not None:
+                        progress(device, done, device.CAL_SIZE)
+                    try:
+                        steps[index] = readers[index].send(device.readCalibrationCells(cells))
+                    except StopIteration as result:
+                        del steps[index]
+                        results[index] = result.value
+                        if progress is not None and result.value is not None:
+                            progress(device, device.CAL_SIZE, device.CAL_SIZE)
+            for index in indices:
+                devices[index].callReset()
+
+        threads = [threading.Thread(target=run, args=(indices,), daemon=True) for indices in adapters.values()]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        if filename is not None:
+            for index, cdata in enumerate(results):
+                if cdata is not None:
+                    with open(filename.format(addr=devices[index].addr, index=index), "wb") as fp:
+                        fp.write(cdata)
+
+        return results
+
+
+    def configure(self, function: int=None, range=None, digits: float=None, trigger: int=None, autoZero: bool=None, noUpdate: bool=False) -> bool:
+        """Change several settings in one transaction
+
+        All changes are sent as one combined program string, e.g. `F3R3N4T1Z1`.
+        Settings already matching the last status reading are left out. The
+        status is read back in the same round trip and all mismatches are
+        reported together.
+
+        Parameters
+        ----------
+        function : int, optional
+            see `setFunction`, by default None (unchanged)
+        range : str|float, optional
+            see `setRange`, by default None (unchanged)
+        digits : float, optional
+            see `setDigits`, by default None (unchanged)
+        trigger : int, optional
+            see `setTrigger`, by default None (unchanged)
+        autoZero : bool, optional
+            see `setAutoZero`, by default None (unchanged)
+        noUpdate : bool, optional
+            If True do not read back the status to verify changes were successful
+            by default False
+
+        Returns
+        -------
+        bool
+            Whether all changes succeeded; not verified if `noUpdate` was True
+        """
+        with self.gpib.transaction(self.priority):
+            cmd = self.configureCmd(function, range, digits, trigger, autoZero)
+            if cmd is None:
+                return False
+            if cmd == "":
+                if self.gpib.trace is not None:
+                    self.gpib.log("Configuration already up to date")
+                return True
+
+            if noUpdate:
+                self.gpib.cmdWrite(cmd, self.addr)
+                if self.gpib.trace is not None:
+                    self.gpib.log("Probably changed configuration using " + cmd)
+                return True
+
+            status = self.gpib.cmdPoll(cmd + "B", self.addr, binary=True, frame=5, kind="B")
+            if status is None or len(status) < 5:
+                print("!! Configuration " + cmd + " sent but device status could not be read")
+                return False
+            self.decodeStatus(status)
+
+        return self.checkConfiguration(cmd, function, range, digits, trigger, autoZero)
+
+    def setAutoZero(self, autoZero: bool, noUpdate: bool=False) -> bool:
+        """change Auto-Zero setting
+
+        Parameters
+        ----------
+        autoZero : bool
+            Whether to enable or disable Auto-Zero
+        noUpdate : bool, optional
+            If True do not update status object to verify change was successful
+            by default False
+
+        Returns
+        -------
+        bool
+            new status of autoZero; presumed status if `noUpdate` was True
+        """
+        with self.gpib.transaction(self.priority):
+            self.gpib.cmdWrite("Z" + str(int(autoZero)), self.addr)
+
+            if noUpdate:
+                if self.gpib.trace is not None:
+                    self.gpib.log("AutoZero changed to " + str(autoZero) + " without verification.")
+                return autoZero
             else:
-                newRangeC = self.getRange(numeric=True)
-                if newRangeF != newRangeC:
-                    print("!! Tried to set range to " + str(range) + " but device reported " + self.getRange())
-                    return False
-                elif self.gpib.debug:
-                    print(".. Set range to " + self.getRange())
-        elif self.gpib.debug:
-            print(".. Probably changed to range " + str(range))
-        
+                self.getStatus()
+                return self.checkAutoZero(autoZero)
+
+    def setDisplay(self, text: str=None, online: bool=True) -> bool:
+        """Change device display
+
+        Parameters
+        ----------
+        text : str, optional
+            When text is None or empty device will resume standard display mode
+                as in show measurements
+            When text is set it will be displayed on the device
+            
+            Only ASCII 32-95 are valid. Function aborts for invalid characters
+            Must be <= 12 Characters while , and . do not count as character.
+                consecutive , and . may not work
+                using . or , after character 12 may not work
+                Function aborts for too long strings
+        online : bool, optional
+            When True the device just shows the text but keeps all functionality online
+            When False the device will turn off all dedicated annunciators and stop updating
+                the display once the text was drwn. This will free up ressources and enable
+                faster measurement speeds. Using False takes about 30mS to complete. If the
+                updating is stopped for over 10 minutes if will shut down as in blank screen.
+            by default True
+
+        Returns
+        -------
+        bool
+            Wheather setting the text worked as expected
+        """
+        cmd = self.displayCmd(text, online)
+        if cmd is None:
+            return False
+
+        self.gpib.cmdWrite(cmd, self.addr)
+
+        if self.gpib.trace is not None:
+            if cmd == "D1":
+                self.gpib.log("Display reset to standard mode")
+            elif not online:
+                self.gpib.log("Display changed to '" + text + "' (updates paused)")
+            else:
+                self.gpib.log("Display changed to '" + text + "'")
+
+        #@TODO we could check status/errors to catch syntax errors here
         return True
 
+    def setFunction(self, function : int, noUpdate: bool=False) -> bool:
+        """Change current measurement function
+
+        Parameters
+        ----------
+        function : int
+            numeric function representation
+            you may also use the following class constants:
+                VDC,VAC,Ω2W,Ω4W,ADC,AAC,EXTΩ
+        noUpdate : bool, optional
+            If True do not update status object to verify change was successful
+            by default False
+
+        Returns
+        -------
+        bool
+            Whether update succeeded or not; not verified if `noUpdate` was True
+        """
+        with self.gpib.transaction(self.priority):
+            if function <= 0 or function > 7:
+                print("!! Invalid function")
+                return False
+        
+            self.gpib.cmdWrite("F" + str(function), self.addr)
+
+            if not noUpdate:
+                self.getStatus()
+                return self.checkFunction(function)
+            elif self.gpib.trace is not None:
+                self.gpib.log("Probably changed to function " + self.getFunction(function))
+        
+            return True
+
+    def setRange(self, range : str, noUpdate : bool=False) -> bool:
+        """Change current measurement range
+
+        Parameters
+        ----------
+        range : str|float
+            Range as SI-Value or float
+            Valid values:
+            A or AUTO to enable Auto-Range
+            30m,300m,3,30,300,3k,30k,300k,3M,30M
+            0.03,0.3,3,30,300,3000,30000,300000,3000000,30000000
+            Not all ranges can be used in all measurement functions
+        noUpdate : bool, optional
+            If True do not update status object to verify change was successful
+            by default False
+
+        Returns
+        -------
+        bool
+            Whether update succeeded or not; not verified if `noUpdate` was True
+        """
+        with self.gpib.transaction(self.priority):
+            newRange, newRangeF = self.parseRange(range)
+        
+            if newRange is None:
+                print("!! Invalid range")
+                return False
+        
+            self.gpib.cmdWrite("R" + str(newRange), self.addr)
+
+            if not noUpdate:
+                self.getStatus()
+                return self.checkRange(range, newRange, newRangeF)
+            elif self.gpib.trace is not None:
+                self.gpib.log("Probably changed to range " + str(range))
+        
+            return True
+
     def setDigits(self, digits : float, noUpdate : bool=False) -> bool:
         """Change current measurement resolution
 
@@ -770,30 +1594,21 @@ class hp3478a(object):
         bool
             Whether update succeeded or not; not verified if `noUpdate` was True
         """
-        newDigits = None
-        if digits == 3 or digits == 3.5:
-            newDigits = "3"
-        elif digits == 4 or digits == 4.5:
-            newDigits = "4"
-        elif digits == 5 or digits == 5.5:
-            newDigits = "5"
-        else:
-            print("!! Invalid digits")
-            return False
+        with self.gpib.transaction(self.priority):
+            newDigits = self.parseDigits(digits)
+            if newDigits is None:
+                print("!! Invalid digits")
+                return False
 
-        self.gpib.cmdWrite("N"+newDigits, self.addr)
+            self.gpib.cmdWrite("N"+newDigits, self.addr)
 
-        if not noUpdate:
-            self.getStatus()
-            if int(self.getDigits()) != int(newDigits):
-                print("!! Tried to set digits to " + str(int(newDigits)) + "½ but device reported " + str(int(self.getDigits())) + "½")
-                return False
-            elif self.gpib.debug:
-                print(".. Set digits to " + str(int(self.getDigits())) + "½")
-        elif self.gpib.debug:
-            print(".. Probably changed digits to " + str(int(self.getDigits())) + "½")
+            if not noUpdate:
+                self.getStatus()
+                return self.checkDigits(newDigits)
+            elif self.gpib.trace is not None:
+                self.gpib.log("Probably changed digits to " + newDigits + "½")
         
-        return True
+            return True
 
     def setTrigger(self, trigger : int, noUpdate : bool=False) -> bool:
         """Change current measurement trigger
@@ -817,44 +1632,206 @@ class hp3478a(object):
         bool
             Whether update succeeded or not; not verified if `noUpdate` was True
         """
-        if trigger <= 0 or trigger > 5:
-            print("!! Invalid digits")
-            return False
+        with self.gpib.transaction(self.priority):
+            if trigger <= 0 or trigger > 5:
+                print("!! Invalid digits")
+                return False
 
-        self.gpib.cmdWrite("T" + str(trigger), self.addr)
+            self.gpib.cmdWrite("T" + str(trigger), self.addr)
 
-        if not noUpdate:
-            self.getStatus()
-            if trigger == self.TRIG_EXT and not self.status.triggerExternal:
-                print("!! Tried to enable external trigger but flag did not update")
-                return False
-            elif trigger == self.TRIG_SIN and self.status.triggerInternal:
-                print("!! Tried to enable singe trigger but auto trigger flag is still active")
-                return False
-            elif trigger == self.TRIG_INT and not self.status.triggerInternal:
-                print("!! Tried to enable internal trigger but auto trigger flag is not active")
-                return False
-            elif trigger == self.TRIG_HLD and self.status.triggerInternal:
-                print("!! Tried to enable trigger hold but auto trigger flag is still active")
-                return False
+            if not noUpdate:
+                self.getStatus()
+                if not self.checkTrigger(trigger):
+                    return False
         
-        if self.gpib.debug:
-            print(".. Probably changed trigger to " + str(trigger))
+            if self.gpib.trace is not None:
+                self.gpib.log("Probably changed trigger to " + str(trigger))
         
-        return True
+            return True
 
-    def setSRQ(self, srq:int):
+    def setSRQ(self, srq:int) -> bool:
         """Set Serial Poll Register Mask
 
-        @TODO Not tested and no validations
-
         Parameters
         ----------
         srq : int
-            Parameter must be two digits exactly. Bits 0-5 of the binary representation
-            are used to set the mask
+            Bits 0-5 are used to set the mask, see the SRQ_* class constants
+            e.g. `SRQ_READING | SRQ_SYNTAX | SRQ_HWERR`
+
+        Returns
+        -------
+        bool
+            Whether the mask was valid and sent
+        """
+        if srq < 0 or srq > 0b111111:
+            print("!! Invalid SRQ mask")
+            return False
+        self.gpib.cmdWrite("M" + format(srq, '02o'), self.addr)
+        return True
+
+    def serialPoll(self) -> int:
+        """Serial poll the device
+
+        Returns
+        -------
+        int|None
+            Serial Poll Register, see the SRQ_* class constants
+            None if the device did not respond
+        """
+        return self.gpib.cmdSpoll(self.addr)
+
+    @staticmethod
+    def groupTrigger(devices: list) -> tuple:
+        """Trigger multiple devices at once and read all readings
+
+        Devices must be armed using `TRIG_HLD` or `TRIG_SIN` and share the
+        same prologix instance, see `groupStream`. All readings are collected
+        in one pipelined transfer after a single `++trg`.
+
+        Parameters
+        ----------
+        devices : list
+            hp3478a instances
+
+        Returns
+        -------
+        tuple
+            (monotonic trigger timestamp, list of values in device order)
+            values are None for devices not responding
+        """
+        gpib = devices[0].gpib
+        with gpib.transaction(min(device.priority for device in devices)):
+            gpib.cmdTrigger([device.addr for device in devices])
+            timestamp = time.monotonic()
+            responses = gpib.cmdPollMulti([(device.addr, " ", False, prologix.FRAME_LINE, device.measureKind) for device in devices])
+        values = []
+        for response in responses:
+            try:
+                values.append(float(response))
+            except (TypeError, ValueError):
+                values.append(None)
+        return (timestamp, values)
+
+    @staticmethod
+    def groupStream(devices: list, count: int=None, trigger: int=hp3478aCodec.TRIG_HLD):
+        """Acquire synchronized readings of multiple devices using group trigger
+
+        Sets all devices to the given trigger mode, yields one frame per
+        `groupTrigger` and restores the previous trigger modes afterwards.
+
+        Parameters
+        ----------
+        devices : list
+            hp3478a instances sharing the same prologix instance
+        count : int, optional
+            number of frames to acquire
+            by default None (until the generator is closed)
+        trigger : int, optional
+            TRIG_HLD or TRIG_SIN
+            by default TRIG_HLD
+
+        Yields
+        ------
+        tuple
+            (monotonic trigger timestamp, list of values in device order)
+        """
+        if len(devices) == 0:
+            return
+        if trigger != hp3478a.TRIG_HLD and trigger != hp3478a.TRIG_SIN:
+            print("!! Group trigger requires TRIG_HLD or TRIG_SIN")
+            return
+        previous = {}
+        for device in devices:
+            status = device.getStatus()
+            if status.triggerInternal:
+                previous[device] = hp3478a.TRIG_INT
+            elif status.triggerExternal:
+                previous[device] = hp3478a.TRIG_EXT
+            else:
+                previous[device] = hp3478a.TRIG_HLD
+            device.setTrigger(trigger, noUpdate=True)
+
+        try:
+            n = 0
+            while count is None or n < count:
+                yield hp3478a.groupTrigger(devices)
+                n += 1
+        finally:
+            for device in devices:
+                device.setTrigger(previous[device], noUpdate=True)
+
+    @staticmethod
+    def srqStream(devices: list, count: int=None, interval: float=0.001, onError=None):
+        """Acquire readings of multiple devices driven by SRQ instead of blind polling
+
+        Every device is set up to assert SRQ when a reading is available or a
+        syntax or hardware error occurred. The SRQ line is watched using `++srq`,
+        on SRQ all devices are serial polled and only devices with a new reading
+        are read. The previous SRQ masks are restored afterwards.
+
+        All devices must share the same prologix instance.
+
+        Parameters
+        ----------
+        devices : list
+            hp3478a instances
+        count : int, optional
+            number of readings to acquire over all devices
+            by default None (until the generator is closed)
+        interval : float, optional
+            seconds to wait between checks of the SRQ line
+            by default 0.001
+        onError : callable, optional
+            called with (device, serial poll register, error register) on
+            syntax or hardware errors
+            by default errors are printed
+
+        Yields
+        ------
+        tuple
+            (monotonic timestamp, device, value) for each reading;
+            stops early if the adapter does not answer `++srq`
         """
-        self.gpib.cmdWrite(srq, self.addr)
+        if len(devices) == 0:
+            return
+        gpib = devices[0].gpib
+        mask = hp3478a.SRQ_READING | hp3478a.SRQ_SYNTAX | hp3478a.SRQ_HWERR
+        previous = {}
+        for device in devices:
+            previous[device] = device.getSRQ(device.getStatus())
+            device.setSRQ(mask)
+            device.clearSPR()
+
+        try:
+            n = 0
+            while count is None or n < count:
+                srq = gpib.cmdSrq()
+                if srq is None:
+                    print("!! Adapter did not report the SRQ line, stopping")
+                    return
+                if not srq:
+                    sleep(interval)
+                    continue
+                for device in devices:
+                    spr = device.serialPoll()
+                    if spr is None:
+                        continue
+                    if spr & (hp3478a.SRQ_SYNTAX | hp3478a.SRQ_HWERR):
+                        err = None
+                        if spr & hp3478a.SRQ_HWERR:
+                            err = device.clearERR()
+                        device.clearSPR()
+                        if onError is not None:
+                            onError(device, spr, err)
+                        else:
+                            print("!! Device " + str(device.addr) + " reported error; SPR " + str(spr) + ", ERR " + str(err))
+                    if spr & hp3478a.SRQ_READING and (count is None or n < count):
+                        value = device.getMeasure()
+                        yield (time.monotonic(), device, value)
+                        n += 1
+        finally:
+            for device in devices:
+                device.setSRQ(previous[device])
 
     def clearSPR(self):
         """Clear Serial Poll Register (SPR)
@@ -0,0 +1,268 @@
+import time
+import heapq
+import queue
+import multiprocessing
+from typing import NamedTuple
+
+from hp3478a import hp3478a
+
+class reading(NamedTuple):
+    """Single measurement received from an adapter worker
+
+    Attributes
+    ----------
+    timestamp : float
+        Unix time the reading was received by the worker
+    port : str
+        serial port of the adapter
+    addr : int
+        GPIB address of the device
+    value : float
+        measured value; None if the device did not respond
+    """
+    timestamp: float
+    port: str
+    addr: int
+    value: float
+
+def worker(port: str, addrs: list, out, stop, interval: float=0, baud: int=921600, timeout: float=0.25):
+    """Poll all devices on one adapter until `stop` is set
+
+    Runs in its own process, see `adapterManager`
+
+    Parameters
+    ----------
+    port : str
+        serial port of the adapter
+    addrs : list
+        GPIB addresses of HP3478A devices on this adapter
+    out : multiprocessing.Queue
+        receives `(port, [(timestamp, addr, value), ...])` once per poll cycle
+    stop : multiprocessing.Event
+        ends the worker when set
+    interval : float, optional
+        minimum seconds between poll cycles
+        by default 0
+    baud : int, optional
+        baudrate used for serial communication
+        by default 921600
+    timeout : float, optional
+        serial timeout in seconds
+        by default 0.25
+    """
+    first = hp3478a(addrs[0], port, baud=baud, timeout=timeout)
+    if first.gpib.serial is None:
+        raise SystemExit(1)
+    gpib = first.gpib
+    queries = [(addr, " ", False) for addr in addrs]
+
+    while not stop.is_set():
+        start = time.monotonic()
+        responses = gpib.cmdPollMulti(queries)
+        now = time.time()
+        batch = []
+        for addr, response in zip(addrs, responses):
+            try:
+                value = float(response)
+            except (TypeError, ValueError):
+                value = None
+            batch.append((now, addr, value))
+        out.put((port, batch))
+        if interval > 0:
+            remaining = interval - (time.monotonic() - start)
+            if remaining > 0:
+                stop.wait(remaining)
+
+class adapterManager(object):
+    """Run one worker process per Prologix adapter and merge their readings
+
+    Each worker owns its `prologix` and polls all given HP3478A devices.
+    Readings of all workers are merged into a single stream ordered by timestamp.
+    Crashed workers are restarted.
+
+    Attributes
+    ----------
+    adapters : dict
+        GPIB addresses of HP3478A devices by serial port
+    interval : float
+        minimum seconds between poll cycles of each worker
+    reorder : float
+        seconds readings are held back to sort them into the merged stream
+    restartDelay : float
+        seconds to wait before restarting a crashed worker
+    restarts : dict
+        number of restarts by serial port
+    counts : dict
+        number of received readings by serial port
+    """
+
+    def __init__(self, adapters: dict, interval: float=0, reorder: float=0.2, restartDelay: float=1.0, baud: int=921600, timeout: float=0.25):
+        """
+
+        Parameters
+        ----------
+        adapters : dict
+            GPIB addresses of HP3478A devices by serial port
+            Example: `{"/dev/ttyACM0": [22, 23], "/dev/ttyACM1": [5]}`
+        interval : float, optional
+            minimum seconds between poll cycles of each worker
+            by default 0 (as fast as possible)
+        reorder : float, optional
+            seconds readings are held back to sort them into the merged stream
+            by default 0.2
+        restartDelay : float, optional
+            seconds to wait before restarting a crashed worker
+            by default 1.0
+        baud : int, optional
+            baudrate used for serial communication
+            by default 921600
+        timeout : float, optional
+            serial timeout in seconds
+            by default 0.25
+        """
+        self.adapters = adapters
+        self.interval = interval
+        self.reorder = reorder
+        self.restartDelay = restartDelay
+        self.baud = baud
+        self.timeout = timeout
+
+        self.queue = multiprocessing.Queue()
+        self.stopEvent = multiprocessing.Event()
+        self.processes = {}
+        self.died = {}
+        self.restarts = {port: 0 for port in adapters}
+        self.counts = {port: 0 for port in adapters}
+        self.lastCounts = dict(self.counts)
+        self.lastRates = time.monotonic()
+        self.pending = []
+        self.running = False
+
+    def spawn(self, port: str):
+        process = multiprocessing.Process(
+            target=worker,
+            args=(port, self.adapters[port], self.queue, self.stopEvent, self.interval, self.baud, self.timeout),
+            name="prologix " + port,
+            daemon=True,
+        )
+        process.start()
+        self.processes[port] = process
+
+    def start(self):
+        """Start all workers
+        """
+        self.running = True
+        self.stopEvent.clear()
+        for port in self.adapters:
+            self.spawn(port)
+
+    def stop(self, timeout: float=2.0):
+        """Stop all workers
+
+        Parameters
+        ----------
+        timeout : float, optional
+            seconds to wait for each worker to finish before terminating it
+            by default 2.0
+        """
+        self.running = False
+        self.stopEvent.set()
+        for process in self.processes.values():
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+
+    def supervise(self):
+        """Restart workers which died unexpectedly
+        """
+        if not self.running:
+            return
+        now = time.monotonic()
+        for port, process in self.processes.items():
+            if process.is_alive():
+                continue
+            if port not in self.died:
+                print("!! Worker for " + port + " exited with code " + str(process.exitcode))
+                self.died[port] = now
+            elif now - self.died[port] >= self.restartDelay:
+                del self.died[port]
+                self.restarts[port] += 1
+                self.spawn(port)
+
+    def receive(self, timeout: float):
+        """Move readings from the worker queue into the reorder buffer
+
+        Parameters
+        ----------
+        timeout : float
+            seconds to wait for the first message
+        """
+        try:
+            port, batch = self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return
+        while True:
+            self.counts[port] += len(batch)
+            for timestamp, addr, value in batch:
+                heapq.heappush(self.pending, reading(timestamp, port, addr, value))
+            try:
+                port, batch = self.queue.get_nowait()
+            except queue.Empty:
+                return
+
+    def readings(self, duration: float=None):
+        """Iterate over the merged, time ordered readings of all adapters
+
+        Parameters
+        ----------
+        duration : float, optional
+            stop iterating after this many seconds
+            by default None (until `stop` is called)
+
+        Yields
+        ------
+        reading
+            next reading
+        """
+        end = None
+        if duration is not None:
+            end = time.monotonic() + duration
+        while self.running and (end is None or time.monotonic() < end):
+            self.supervise()
+            self.receive(0.05)
+            limit = time.time() - self.reorder
+            while len(self.pending) > 0 and self.pending[0].timestamp <= limit:
+                yield heapq.heappop(self.pending)
+        while len(self.pending) > 0:
+            yield heapq.heappop(self.pending)
+
+    def run(self, callback, duration: float=None):
+        """Call a function for each merged reading
+
+        Parameters
+        ----------
+        callback : callable
+            called with each `reading`
+        duration : float, optional
+            stop after this many seconds
+            by default None (until `stop` is called)
+        """
+        for r in self.readings(duration):
+            callback(r)
+
+    def rates(self) -> dict:
+        """Get readings per second for each adapter since the last call
+
+        Returns
+        -------
+        dict
+            readings/s by serial port
+        """
+        now = time.monotonic()
+        elapsed = now - self.lastRates
+        out = {}
+        for port, count in self.counts.items():
+            out[port] = (count - self.lastCounts[port]) / elapsed if elapsed > 0 else 0.0
+        self.lastCounts = dict(self.counts)
+        self.lastRates = now
+        return out
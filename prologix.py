@@ -1,37 +1,1227 @@
 import serial
 import datetime
 import os
+import time
+import threading
+import itertools
+import contextlib
+import json
+from collections import deque
 
-class prologix(object):
-    """Class for handling prologix protocol based GPIB communication
+class busArbiter(object):
+    """Serialize whole GPIB transactions between threads
 
-    Based on code by Daniel Stadelmann and Tobias Badertscher
+    Waiting transactions are granted by priority (lower value first). To stay
+    fair the effective priority of a waiting transaction improves by `aging`
+    every second so low priority work does not starve.
+
+    The arbiter is reentrant: a thread already owning the bus may start nested
+    transactions which are granted immediately.
+
+    Attributes
+    ----------
+    aging : float
+        Priority improvement per second of waiting
+    transactions : int
+        Number of granted (outermost) transactions
+    maxQueueDepth : int
+        Highest number of waiting transactions seen
+    waitTotal : float
+        Sum of all wait times in seconds
+    waitMax : float
+        Longest wait time in seconds
+    waits : deque
+        Most recent wait times in seconds
+    """
+
+    aging: float = 10.0
+    transactions: int = 0
+    maxQueueDepth: int = 0
+    waitTotal: float = 0.0
+    waitMax: float = 0.0
+
+    def __init__(self, aging: float=10.0, history: int=1000):
+        """
+
+        Parameters
+        ----------
+        aging : float, optional
+            Priority improvement per second of waiting
+            by default 10.0
+        history : int, optional
+            Number of recent wait times kept for percentiles
+            by default 1000
+        """
+        self.aging = aging
+        self.cond = threading.Condition()
+        self.owner = None
+        self.depth = 0
+        self.waiting = []
+        self.seq = itertools.count()
+        self.waits = deque(maxlen=history)
+
+    def acquire(self, priority: int=10):
+        """Wait until the calling thread owns the bus
+
+        Parameters
+        ----------
+        priority : int, optional
+            lower values are granted first
+            by default 10
+        """
+        me = threading.get_ident()
+        with self.cond:
+            if self.owner == me:
+                self.depth += 1
+                return
+            start = time.monotonic()
+            if self.owner is not None or len(self.waiting) > 0:
+                # Effective priority is priority - aging * waited; the current
+                # time is the same for all waiters so it can be left out
+                ticket = (priority + self.aging * start, next(self.seq))
+                self.waiting.append(ticket)
+                self.maxQueueDepth = max(self.maxQueueDepth, len(self.waiting))
+                while self.owner is not None or min(self.waiting) != ticket:
+                    self.cond.wait()
+                self.waiting.remove(ticket)
+            self.owner = me
+            self.depth = 1
+            waited = time.monotonic() - start
+            self.transactions += 1
+            self.waitTotal += waited
+            self.waitMax = max(self.waitMax, waited)
+            self.waits.append(waited)
+
+    def release(self):
+        """Release the bus after `acquire`
+        """
+        with self.cond:
+            if self.owner != threading.get_ident():
+                raise RuntimeError("Bus released by a thread not owning it")
+            self.depth -= 1
+            if self.depth == 0:
+                self.owner = None
+                self.cond.notify_all()
+
+    @contextlib.contextmanager
+    def transaction(self, priority: int=10):
+        """Context manager around `acquire` and `release`
+
+        Parameters
+        ----------
+        priority : int, optional
+            lower values are granted first
+            by default 10
+        """
+        self.acquire(priority)
+        try:
+            yield self
+        finally:
+            self.release()
+
+    def queueDepth(self) -> int:
+        """Get the number of waiting transactions
+
+        Returns
+        -------
+        int
+            waiting transactions
+        """
+        return len(self.waiting)
+
+    def stats(self) -> dict:
+        """Get queue and wait time metrics
+
+        Returns
+        -------
+        dict
+            queueDepth, maxQueueDepth, transactions, waitTotal, waitMax,
+            waitMean, waitP50 and waitP99 (seconds, of the recent history)
+        """
+        with self.cond:
+            waits = sorted(self.waits)
+            out = {
+                "queueDepth": len(self.waiting),
+                "maxQueueDepth": self.maxQueueDepth,
+                "transactions": self.transactions,
+                "waitTotal": self.waitTotal,
+                "waitMax": self.waitMax,
+                "waitMean": None,
+                "waitP50": None,
+                "waitP99": None,
+            }
+        if self.transactions > 0:
+            out["waitMean"] = self.waitTotal / self.transactions
+        if len(waits) > 0:
+            out["waitP50"] = waits[int(0.50 * (len(waits)-1))]
+            out["waitP99"] = waits[int(0.99 * (len(waits)-1))]
+        return out
+
+class latencyTracker(object):
+    """Learn response times and derive read timeouts from them
+
+    Response times are kept per key, usually `(address, command class)`.
+    Once enough samples were recorded the timeout for a key is a percentile
+    of its response times times `margin`. Every timeout doubles the next
+    timeout of that key until a response arrives in time again.
+
+    Attributes
+    ----------
+    minSamples : int
+        Number of samples required before learned timeouts are used
+    percentile : float
+        Percentile of response times the timeout is based on
+    margin : float
+        Factor applied to the percentile
+    minimum : float
+        Shortest timeout in seconds
+    maximum : float
+        Longest timeout in seconds
+    maxBackoff : int
+        Highest factor applied after repeated timeouts
+    """
+
+    minSamples: int = 16
+    percentile: float = 0.99
+    margin: float = 2.0
+    minimum: float = 0.01
+    maximum: float = 10.0
+    maxBackoff: int = 16
+
+    def __init__(self, history: int=256, minSamples: int=16, percentile: float=0.99, margin: float=2.0, minimum: float=0.01, maximum: float=10.0):
+        """
+
+        Parameters
+        ----------
+        history : int, optional
+            Number of recent response times kept per key
+            by default 256
+        minSamples : int, optional
+            Number of samples required before learned timeouts are used
+            by default 16
+        percentile : float, optional
+            Percentile of response times the timeout is based on
+            by default 0.99
+        margin : float, optional
+            Factor applied to the percentile
+            by default 2.0
+        minimum : float, optional
+            Shortest timeout in seconds
+            by default 0.01
+        maximum : float, optional
+            Longest timeout in seconds
+            by default 10.0
+        """
+        self.history = history
+        self.minSamples = minSamples
+        self.percentile = percentile
+        self.margin = margin
+        self.minimum = minimum
+        self.maximum = maximum
+        self.samples = {}
+        self.learned = {}
+        self.backoff = {}
+        self.timeouts = {}
+
+    def record(self, key, seconds: float):
+        """Record the response time of a successful read
+
+        Parameters
+        ----------
+        key : object
+            hashable key, e.g. `(22, "B")`
+        seconds : float
+            time until the response was complete
+        """
+        samples = self.samples.get(key)
+        if samples is None:
+            samples = self.samples[key] = deque(maxlen=self.history)
+        samples.append(seconds)
+        self.backoff.pop(key, None)
+        # sorting on every read would cost more than the read itself
+        if len(samples) >= self.minSamples and (key not in self.learned or len(samples) % 16 == 0):
+            ordered = sorted(samples)
+            self.learned[key] = ordered[int(self.percentile * (len(ordered)-1))]
+
+    def failed(self, key):
+        """Record a read which timed out
+
+        Parameters
+        ----------
+        key : object
+            see `record`
+        """
+        self.backoff[key] = min(self.backoff.get(key, 1) * 2, self.maxBackoff)
+        self.timeouts[key] = self.timeouts.get(key, 0) + 1
+
+    def timeout(self, key, default: float) -> float:
+        """Get the timeout to use for a read
+
+        Parameters
+        ----------
+        key : object
+            see `record`
+        default : float
+            timeout in seconds used until enough samples were recorded
+
+        Returns
+        -------
+        float
+            timeout in seconds
+        """
+        learned = self.learned.get(key)
+        if learned is None:
+            timeout = default
+        else:
+            timeout = max(self.minimum, learned * self.margin)
+        return min(timeout * self.backoff.get(key, 1), self.maximum)
+
+    def stats(self) -> dict:
+        """Get learned response times
+
+        Returns
+        -------
+        dict
+            per key: `samples`, `p50` and `p99` in seconds (None while
+            unknown) and the number of `timeouts`
+        """
+        out = {}
+        for key in set(self.samples) | set(self.timeouts):
+            ordered = sorted(self.samples.get(key, ()))
+            out[key] = {
+                "samples": len(ordered),
+                "p50": ordered[int(0.50 * (len(ordered)-1))] if len(ordered) > 0 else None,
+                "p99": ordered[int(0.99 * (len(ordered)-1))] if len(ordered) > 0 else None,
+                "timeouts": self.timeouts.get(key, 0),
+            }
+        return out
+
+class busMetrics(object):
+    """Counters and response time histograms of an adapter
+
+    Response times are counted in power of two buckets: bucket `i` holds
+    responses which took less than `2**i` microseconds (and at least
+    `2**(i-1)`), the last bucket everything slower.
+    Only the first response of a pipelined transfer is counted in the
+    histograms, see `prologix.readFrame`.
+
+    Attributes
+    ----------
+    bytesOut : int
+        Bytes written to the adapter
+    bytesIn : int
+        Bytes of responses read from the adapter
+    writes : int
+        Number of serial writes
+    responses : int
+        Number of complete responses
+    timeouts : int
+        Number of responses which timed out
+    late : int
+        Number of late responses, see `receiveEngine`
+    commands : dict
+        Number of device commands by address
+    histograms : dict
+        Response time bucket counts by `(addr, kind)`, see `prologix.cmdPoll`
+    """
+
+    BUCKETS = 28
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Set all counters to zero
+        """
+        self.bytesOut = 0
+        self.bytesIn = 0
+        self.writes = 0
+        self.responses = 0
+        self.timeouts = 0
+        self.late = 0
+        self.commands = {}
+        self.histograms = {}
+
+    def written(self, size: int):
+        self.writes += 1
+        self.bytesOut += size
+
+    def command(self, addr: int):
+        self.commands[addr] = self.commands.get(addr, 0) + 1
+
+    def response(self, key, size: int, seconds: float, complete: bool):
+        self.bytesIn += size
+        if not complete:
+            self.timeouts += 1
+            return
+        self.responses += 1
+        if seconds is None:
+            return
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = [0] * self.BUCKETS
+        histogram[min(int(seconds * 1e6).bit_length(), self.BUCKETS - 1)] += 1
+
+    def percentile(self, key, percentile: float) -> float:
+        """Estimate a response time percentile from a histogram
+
+        Parameters
+        ----------
+        key : tuple
+            `(addr, kind)` of the histogram
+        percentile : float
+            between 0 and 1
+
+        Returns
+        -------
+        float
+            upper bound of the bucket containing the percentile in seconds;
+            None if there are no responses
+        """
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            return None
+        target = percentile * sum(histogram)
+        seen = 0
+        for bucket, count in enumerate(histogram):
+            seen += count
+            if count > 0 and seen >= target:
+                return (1 << bucket) / 1e6
+        return None
+
+    def snapshot(self) -> dict:
+        """Get a copy of all counters
+
+        Returns
+        -------
+        dict
+            counters, `commands` and `histograms` as nested dicts plus
+            `p50`/`p99` per histogram key
+        """
+        return {
+            "bytesOut": self.bytesOut,
+            "bytesIn": self.bytesIn,
+            "writes": self.writes,
+            "responses": self.responses,
+            "timeouts": self.timeouts,
+            "late": self.late,
+            "commands": dict(self.commands),
+            "histograms": {key: list(histogram) for key, histogram in self.histograms.items()},
+            "p50": {key: self.percentile(key, 0.50) for key in self.histograms},
+            "p99": {key: self.percentile(key, 0.99) for key in self.histograms},
+        }
+
+def printTrace(event: dict):
+    """Trace sink printing events in human readable form, installed by `debug=True`
+
+    Parameters
+    ----------
+    event : dict
+        trace event, see `prologix.emit`
+    """
+    kind = event["type"]
+    if kind == "write":
+        cmd = event["cmd"]
+        print(">> " + (cmd if isinstance(cmd, str) else repr(bytes(cmd))))
+    elif kind == "skip":
+        print(".. Skipped " + event["cmd"])
+    elif kind == "read":
+        data = event["data"]
+        print("<< " + (data if isinstance(data, str) else bytes(data).hex(" ")))
+    elif kind == "timeout":
+        print(".. Timeout waiting for " + str(event["key"]))
+    elif kind == "late":
+        print("!! Late response " + repr(event["data"]) + " for " + str(event["key"]))
+    else:
+        print(".. " + str(event.get("message")))
+
+class traceFile(object):
+    """Trace sink writing one JSON object per line
+
+    Binary data is written as hex string.
+
+    Attributes
+    ----------
+    fp : file
+        output file
+    """
+
+    def __init__(self, filename: str):
+        """
+
+        Parameters
+        ----------
+        filename : str
+            file to append events to
+        """
+        self.fp = open(filename, "a")
+
+    def __call__(self, event: dict):
+        out = {}
+        for key, value in event.items():
+            if isinstance(value, (bytes, bytearray, memoryview)):
+                value = bytes(value).hex()
+            elif isinstance(value, tuple):
+                value = list(value)
+            out[key] = value
+        self.fp.write(json.dumps(out) + "\n")
+
+    def close(self):
+        self.fp.close()
+
+class receiveEngine(object):
+    """Read the serial port of a `prologix` in a background thread
+
+    Received data is stored in a preallocated buffer. Frames are located in
+    place and copied out once when a transaction takes them. Data still in
+    the buffer when the next transaction starts belongs to reads which timed
+    out; it is attributed to those reads and kept in `late` instead of being
+    thrown away.
+
+    Attributes
+    ----------
+    buffer : bytearray
+        receive buffer, unread data is `buffer[start:end]`
+    late : deque
+        Most recent late responses as `(key, data, complete)`, key is the
+        `(addr, kind)` of the read which timed out or None if unknown
+    lateCount : int
+        Number of late responses seen
+    overflows : int
+        Number of times unread data was dropped because the buffer was full
+    lateWindow : float
+        Seconds after a timeout in which a late response is attributed to it
+    """
+
+    lateCount: int = 0
+    overflows: int = 0
+    lateWindow: float = 3.5
+
+    def __init__(self, gpib, capacity: int=65536, history: int=100):
+        """
+
+        Parameters
+        ----------
+        gpib : prologix
+            adapter to read from
+        capacity : int, optional
+            size of the receive buffer in bytes
+            by default 65536
+        history : int, optional
+            number of late responses kept
+            by default 100
+        """
+        self.gpib = gpib
+        self.buffer = bytearray(capacity)
+        self.view = memoryview(self.buffer)
+        self.start = 0
+        self.end = 0
+        self.cond = threading.Condition()
+        self.outstanding = deque()
+        self.late = deque(maxlen=history)
+        self.lateCount = 0
+        self.overflows = 0
+        self.running = False
+        self.thread = None
+
+    def begin(self):
+        """Start the reader thread
+        """
+        self.running = True
+        self.gpib.serial.timeout = 0.05
+        self.thread = threading.Thread(target=self.run, name="prologix reader", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop the reader thread
+        """
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        with self.cond:
+            self.cond.notify_all()
+
+    def run(self):
+        serialPort = self.gpib.serial
+        while self.running:
+            try:
+                data = serialPort.read(max(serialPort.in_waiting, 1))
+            except (serial.SerialException, OSError, TypeError):
+                break
+            if len(data) == 0:
+                continue
+            with self.cond:
+                self.store(data)
+                self.cond.notify_all()
+        self.running = False
+        with self.cond:
+            self.cond.notify_all()
+
+    def store(self, data: bytes):
+        n = len(data)
+        if self.end + n > len(self.buffer):
+            unread = self.end - self.start
+            if unread + n > len(self.buffer):
+                self.overflows += 1
+                unread = 0
+                data = data[-len(self.buffer):]
+                n = len(data)
+            else:
+                # move unread data to the front once per pass through the buffer
+                self.buffer[0:unread] = bytes(self.view[self.start:self.end])
+            self.start = 0
+            self.end = unread
+        self.view[self.end:self.end+n] = data
+        self.end += n
+
+    def readFrame(self, frame=None, timeout: float=1.0) -> tuple:
+        """Wait for a frame
+
+        Parameters
+        ----------
+        frame : None|int|str, optional
+            see `prologix.readFrame`, by default FRAME_LINE
+        timeout : float, optional
+            seconds to wait, by default 1.0
+
+        Returns
+        -------
+        tuple
+            (data, complete); incomplete data stays in the buffer
+        """
+        deadline = time.monotonic() + timeout
+        with self.cond:
+            while True:
+                n = self.gpib.frameEnd(self.buffer, frame, self.start, self.end)
+                if n is not None:
+                    out = bytes(self.view[self.start:self.start+n])
+                    self.start += n
+                    return out, True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self.running:
+                    return bytes(self.view[self.start:self.end]), False
+                self.cond.wait(remaining)
+
+    def timedOut(self, key, frame=None):
+        """Remember a read which timed out so a late response can be attributed to it
+
+        Parameters
+        ----------
+        key : tuple
+            `(addr, kind)` of the read
+        frame : None|int|str, optional
+            frame type of the read, by default FRAME_LINE
+        """
+        with self.cond:
+            self.outstanding.append((time.monotonic(), key, frame))
+
+    def drain(self):
+        """Move all received data into `late` before a new transaction starts
+        """
+        with self.cond:
+            now = time.monotonic()
+            while len(self.outstanding) > 0 and now - self.outstanding[0][0] > self.lateWindow:
+                self.outstanding.popleft()
+            while self.start < self.end:
+                key, frame = None, None
+                if len(self.outstanding) > 0:
+                    timestamp, key, frame = self.outstanding.popleft()
+                n = self.gpib.frameEnd(self.buffer, frame, self.start, self.end)
+                complete = n is not None
+                if not complete:
+                    n = self.end - self.start
+                data = bytes(self.view[self.start:self.start+n])
+                self.start += n
+                self.late.append((key, data, complete))
+                self.lateCount += 1
+                if self.gpib.metrics is not None:
+                    self.gpib.metrics.late += 1
+                if self.gpib.trace is not None:
+                    self.gpib.emit("late", key=key, data=data, complete=complete)
+            self.start = self.end = 0
+
+class prologixCodec(object):
+    """Transport independent part of the Prologix protocol
+
+    Encodes commands and reads, keeps the shadow state of the adapter and
+    learned timeouts, and cuts and decodes responses. No I/O is done here,
+    `prologix` and `AsyncPrologix` add the serial transport.
 
     Attributes
     ----------
-    serial : object
-        PySerial object used to communicate with the prologix dongle
     debug : bool
         Whether to print verbose status messages and all communication
+        using `printTrace`
     timeout : float
         Timeout for serial and GPIB operations
     EOL : str
         Characters to append to all commands sent to USB
+    cache : bool
+        Whether to skip `++` configuration commands which would not change
+        the last known adapter state
+    state : dict
+        Shadow copy of the adapter state as last written by us
+        Maps the `++` command to its last argument, e.g. `{"++addr": "22"}`
+    skipped : int
+        Number of commands not sent because the shadow state already matched
+    eotChar : int
+        Character appended by the adapter to responses read as `FRAME_EOT`
+    adaptive : bool
+        Whether read timeouts are learned per address and command class
+    trace : list
+        Trace sinks called with every event, see `emit`; None if tracing is off
+    metrics : busMetrics
+        Counters and response time histograms; None if not enabled
+    latency : latencyTracker
+        Learned response times
 
     """
 
-    serial: object = None
     debug: bool = False
     timeout: float = 2.5
     EOL: str = "\n"
+    cache: bool = True
+    state: dict = None
+    skipped: int = 0
+
+    eotChar: int = 4
+    adaptive: bool = True
+    latency: latencyTracker = None
+    trace: list = None
+    metrics: busMetrics = None
+
+    # Response framing, see `readFrame`; an int frame reads exactly that many bytes
+    FRAME_LINE  = None
+    FRAME_EOT   = "eot"
+    FRAME_BLOCK = "block"
+
+    # Characters which must be preceded by ESC to reach the device,
+    # ESC itself first so inserted ESCs are not escaped again
+    ESCAPE_BYTES = tuple((bytes([c]), bytes([27, c])) for c in (27, 10, 13, 43))
+    ESCAPE_STR   = tuple((chr(c), chr(27) + chr(c)) for c in (27, 10, 13, 43))
+
+    STATE_CMDS = ("++addr", "++auto", "++eoi", "++eos", "++eot_enable", "++eot_char", "++read_tmo_ms", "++mode")
+
+    def __init__(self, timeout: float=2.5, debug: bool=False, cache: bool=True, adaptive: bool=True, metrics: bool=False):
+        """
+
+        Parameters
+        ----------
+        timeout : float, optional
+            number of seconds to wait at maximum for a response
+            by default 2.5 seconds
+        debug : bool, optional
+            Whether to print verbose status messages and all communication
+            by default False
+        cache : bool, optional
+            Whether to skip redundant `++addr` and configuration commands
+            by default True
+        adaptive : bool, optional
+            Whether to learn read timeouts from observed response times
+            by default True
+        metrics : bool, optional
+            Whether to collect counters and histograms, see `enableMetrics`
+            by default False
+        """
+        if timeout is not None:
+            self.timeout = timeout
 
-    def __init__(self, port: str, baud: int=921600, timeout: float=2.5, debug: bool=False):
+        self.debug = debug
+        self.cache = cache
+        self.state = {}
+        self.skipped = 0
+        self.adaptive = adaptive
+        self.latency = latencyTracker()
+        if debug:
+            self.addTrace(printTrace)
+        if metrics:
+            self.enableMetrics()
+
+    def addTrace(self, sink):
+        """Add a trace sink
+
+        Parameters
+        ----------
+        sink : callable
+            called with each event dict, see `emit`.
+            Examples: `printTrace`, `traceFile("trace.jsonl")`
+        """
+        if self.trace is None:
+            self.trace = []
+        self.trace.append(sink)
+
+    def removeTrace(self, sink):
+        """Remove a trace sink added using `addTrace`
+
+        Parameters
+        ----------
+        sink : callable
+            sink to remove
+        """
+        if self.trace is not None and sink in self.trace:
+            self.trace.remove(sink)
+            if len(self.trace) == 0:
+                self.trace = None
+
+    def emit(self, type: str, **fields):
+        """Pass an event to all trace sinks
+
+        Callers check `trace` first so building events costs nothing while
+        tracing is off.
+
+        Parameters
+        ----------
+        type : str
+            `write`, `skip`, `read`, `timeout`, `late` or `info`
+        fields
+            event data like `addr`, `cmd`, `data`, `key` or `message`
+        """
+        fields["time"] = time.monotonic()
+        fields["type"] = type
+        for sink in self.trace:
+            sink(fields)
+
+    def log(self, message: str):
+        """Pass a status message to all trace sinks
+
+        Parameters
+        ----------
+        message : str
+            message text
+        """
+        if self.trace is not None:
+            self.emit("info", message=message)
+
+    def enableMetrics(self) -> busMetrics:
+        """Start collecting counters and response time histograms
+
+        Returns
+        -------
+        busMetrics
+            collected metrics, also available as `metrics`
+        """
+        if self.metrics is None:
+            self.metrics = busMetrics()
+        return self.metrics
+
+    def invalidate(self):
+        """Forget the shadow state
+
+        The next `++addr` and configuration commands will be sent to the adapter
+        regardless of their previous value
+        """
+        self.state = {}
+
+    def updateState(self, cmd: str) -> bool:
+        """Track adapter configuration commands in the shadow state
+
+        Parameters
+        ----------
+        cmd : str
+            The command string about to be sent
+
+        Returns
+        -------
+        bool
+            True if the command would not change the adapter state and may be skipped
+        """
+        if not cmd.startswith("++"):
+            return False
+        parts = cmd.split(None, 1)
+        if parts[0] == "++rst":
+            self.invalidate()
+            return False
+        if parts[0] not in self.STATE_CMDS or len(parts) < 2:
+            # Queries and other adapter commands are always sent
+            return False
+        value = parts[1].strip()
+        if self.cache and self.state.get(parts[0]) == value:
+            self.skipped += 1
+            return True
+        self.state[parts[0]] = value
+        return False
+
+    def encodeCmd(self, cmd: str, addr: int=None) -> bytes:
+        """Encode a command for the wire, including a preceding `++addr` if needed
+
+        Commands which would not change the adapter state are left out.
+
+        Parameters
+        ----------
+        cmd : str|bytes
+            The command string to be sent
+            bytes are sent unchanged and must already be escaped, see `escapeCmd`
+        addr : int, optional
+            address of the targeted device. If set an `++addr` will be prepended
+            unless the adapter is already set to this address
+            by default None
+
+        Returns
+        -------
+        bytes
+            Data to write to the serial port; may be empty
         """
+        out = b""
+        if addr is not None:
+            out = self.encodeCmd("++addr " + str(addr))
+            if self.metrics is not None:
+                self.metrics.command(addr)
+        if isinstance(cmd, (bytes, bytearray)):
+            if self.trace is not None:
+                self.emit("write", addr=addr, cmd=bytes(cmd))
+            return out + bytes(cmd) + str.encode(self.EOL)
+        if self.updateState(cmd):
+            if self.trace is not None:
+                self.emit("skip", addr=addr, cmd=cmd)
+            return out
+        if self.trace is not None:
+            self.emit("write", addr=addr, cmd=cmd)
+        return out + str.encode(cmd+self.EOL)
+
+    def encodeRead(self, frame=FRAME_LINE, key=None) -> bytes:
+        """Encode a `++read eoi` including the EOT and timeout settings required
 
         Parameters
         ----------
-        port : str
+        frame : None|int|str, optional
+            see `readFrame`, by default FRAME_LINE
+        key : tuple, optional
+            `(addr, kind)` to use the learned timeout for, see `readTimeout`
+            by default None
+
+        Returns
+        -------
+        bytes
+            Data to write to the serial port
+        """
+        if frame == self.FRAME_EOT:
+            out = self.encodeCmd("++eot_char " + str(self.eotChar))
+            out += self.encodeCmd("++eot_enable 1")
+        else:
+            out = self.encodeCmd("++eot_enable 0")
+        out += self.encodeCmd(self.readTmoCmd(self.readTimeout(key)))
+        return out + self.encodeCmd("++read eoi")
+
+    def readTimeout(self, key=None) -> float:
+        """Get the timeout for a response
+
+        Parameters
+        ----------
+        key : tuple, optional
+            `(addr, kind)` of the query, see `cmdPoll`
+            by default None (use `timeout`)
+
+        Returns
+        -------
+        float
+            timeout in seconds, never longer than `timeout`.
+            Learned timeouts are rounded up to a power of two milliseconds
+            so adapter and serial port are not reconfigured for small changes
+        """
+        if key is None or not self.adaptive or key not in self.latency.learned:
+            return self.timeout
+        ms = 1
+        while ms < self.latency.timeout(key, self.timeout) * 1000:
+            ms *= 2
+        return min(ms / 1000, self.timeout)
+
+    def readTmoCmd(self, timeout: float) -> str:
+        """Build the `++read_tmo_ms` command for a timeout
+
+        Parameters
+        ----------
+        timeout : float
+            timeout in seconds, limited to the 1 to 3000 ms supported by the adapter
+
+        Returns
+        -------
+        str
+            adapter command
+        """
+        return "++read_tmo_ms " + str(min(max(int(round(timeout * 1000)), 1), 3000))
+
+    def accountRead(self, key, size: int, seconds: float, complete: bool, learn: bool=True):
+        """Account a read for learned timeouts, metrics and tracing
+
+        Parameters
+        ----------
+        key : tuple
+            `(addr, kind)` of the read; None for untracked reads
+        size : int
+            number of bytes received
+        seconds : float
+            time spent waiting
+        complete : bool
+            False if the read timed out
+        learn : bool, optional
+            False to keep `seconds` out of learned timeouts and histograms,
+            see `readFrame`
+            by default True
+        """
+        if key is not None:
+            if not complete:
+                self.latency.failed(key)
+            elif learn:
+                self.latency.record(key, seconds)
+        if self.metrics is not None:
+            self.metrics.response(key, size, seconds if learn else None, complete)
+        if not complete and self.trace is not None:
+            self.emit("timeout", key=key, seconds=seconds)
+
+    def frameEnd(self, buffer: bytearray, frame=FRAME_LINE, start: int=0, stop: int=None) -> int:
+        """Find the end of a frame at the start of received data
+
+        Parameters
+        ----------
+        buffer : bytearray
+            received data
+        frame : None|int|str, optional
+            see `readFrame`, by default FRAME_LINE
+        start : int, optional
+            position of the first received byte in `buffer`, by default 0
+        stop : int, optional
+            position after the last received byte, by default `len(buffer)`
+
+        Returns
+        -------
+        int
+            number of bytes belonging to the frame; None if it is not complete yet
+        """
+        if stop is None:
+            stop = len(buffer)
+        size = stop - start
+        if isinstance(frame, int):
+            return frame if size >= frame else None
+        if frame == self.FRAME_EOT:
+            pos = buffer.find(self.eotChar, start, stop)
+            return pos-start+1 if pos >= 0 else None
+        if frame == self.FRAME_BLOCK:
+            header = self.blockHeader(buffer, start, stop)
+            if header is None:
+                return None
+            offset, length = header
+            if length is not None:
+                end = offset + length
+                if size < end:
+                    return None
+                # consume the terminator if it arrived together with the block
+                if size > end and buffer[start+end] == 10:
+                    end += 1
+                return end
+        pos = buffer.find(b"\n", start, stop)
+        return pos-start+1 if pos >= 0 else None
+
+    def blockHeader(self, buffer: bytes, start: int=0, stop: int=None) -> tuple:
+        """Parse the header of an IEEE 488.2 arbitrary block
+
+        Parameters
+        ----------
+        buffer : bytes
+            received data
+        start : int, optional
+            position of the first received byte in `buffer`, by default 0
+        stop : int, optional
+            position after the last received byte, by default `len(buffer)`
+
+        Returns
+        -------
+        tuple
+            (data offset, data length) relative to `start`; length is None for
+            indefinite length blocks (`#0`) and data which is not a block at
+            all, these end with a newline. None if the header is not complete yet
+        """
+        if stop is None:
+            stop = len(buffer)
+        if stop - start < 2:
+            return None
+        if buffer[start] != 0x23 or buffer[start+1] < 0x30 or buffer[start+1] > 0x39:
+            return (0, None)
+        digits = buffer[start+1] - 0x30
+        if digits == 0:
+            return (2, None)
+        if stop - start < 2 + digits:
+            return None
+        return (2 + digits, int(bytes(buffer[start+2:start+2+digits])))
+
+    def frameData(self, out: bytes, frame=FRAME_LINE):
+        """Strip framing from a complete frame
+
+        Parameters
+        ----------
+        out : bytes
+            frame as returned by `frameEnd`
+        frame : None|int|str, optional
+            see `readFrame`, by default FRAME_LINE
+
+        Returns
+        -------
+        bytes|memoryview
+            data without framing, a memoryview on `out` for blocks
+        """
+        if frame == self.FRAME_EOT and len(out) > 0 and out[-1] == self.eotChar:
+            return out[:-1]
+        if frame == self.FRAME_BLOCK:
+            header = self.blockHeader(out)
+            if header is None:
+                return out
+            start, length = header
+            if length is None:
+                end = len(out)
+                if out.endswith(b"\n"):
+                    end -= 1
+                return memoryview(out)[start:end]
+            return memoryview(out)[start:start+length]
+        return out
+
+    def decodeResponse(self, out: bytes, binary: bool=False):
+        """Decode a raw response read from the adapter
+
+        Parameters
+        ----------
+        out : bytes
+            raw response
+        binary : bool, optional
+            If False responses are decoded and returned as String
+            If True resonses are unchanged and returned as byte array
+            by default False
+
+        Returns
+        -------
+        None|str|bytearray
+            None for empty responses
+            str or bytearray depending on `binary` parameter
+        """
+        if len(out) == 0:
+            return None
+        if not binary:
+            out = str(out, "utf-8")
+            out = out.strip()
+        if self.trace is not None and len(out) > 0:
+            self.emit("read", data=out)
+        return out
+
+    def escapeCmd(self, cmd : str) -> str:
+        """Escape device command so they traverse the Prologix protocol
+
+        Only LF, CR, ESC and '+' need to be escaped. Binary data should be
+        passed as bytes; characters above 127 in a str would be sent as UTF-8.
+
+        Parameters
+        ----------
+        cmd : str|bytes
+            command to send
+
+        Returns
+        -------
+        str|bytes
+            escaped command to send, str for str and bytes otherwise
+        """
+        if isinstance(cmd, str):
+            escapes = self.ESCAPE_STR
+        else:
+            escapes = self.ESCAPE_BYTES
+            cmd = bytes(cmd)
+        # One C level pass per character instead of a Python loop per byte
+        for char, escaped in escapes:
+            cmd = cmd.replace(char, escaped)
+        return cmd
+
+    def encodeData(self, data, addr: int=None, prefix: bytes=b"", chunk: int=4096):
+        """Encode binary data as a single device command in pieces
+
+        Escaping works per byte, so the pieces can be written one after
+        another without holding the whole escaped payload in memory. Only
+        the final piece ends the command with `EOL`.
+
+        Parameters
+        ----------
+        data : bytes|iterable
+            bytes-like payload or an iterable of bytes-like chunks,
+            e.g. a generator reading a file
+        addr : int, optional
+            address of the targeted device. If set an `++addr` will be issued first
+            unless the adapter is already set to this address
+            by default None
+        prefix : bytes, optional
+            command preceding the data, escaped like the data
+            by default empty
+        chunk : int, optional
+            bytes of a bytes-like payload escaped at once
+            by default 4096
+
+        Yields
+        ------
+        bytes
+            data to write to the serial port
+        """
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            view = memoryview(data)
+            data = (view[pos:pos+chunk] for pos in range(0, len(view), chunk))
+        out = b""
+        if addr is not None:
+            out = self.encodeCmd("++addr " + str(addr))
+            if self.metrics is not None:
+                self.metrics.command(addr)
+        out += self.escapeCmd(bytes(prefix))
+        size = 0
+        for part in data:
+            size += len(part)
+            escaped = self.escapeCmd(part)
+            if len(out) > 0:
+                escaped = out + escaped
+                out = b""
+            yield escaped
+        yield out + str.encode(self.EOL)
+        if self.trace is not None:
+            self.emit("write", addr=addr, cmd=bytes(prefix), size=size)
+
+class prologix(prologixCodec):
+    """Class for handling prologix protocol based GPIB communication
+
+    Based on code by Daniel Stadelmann and Tobias Badertscher
+
+    Adds the blocking serial transport to `prologixCodec`
+
+    Attributes
+    ----------
+    serial : object
+        PySerial object used to communicate with the prologix dongle
+    arbiter : busArbiter
+        Serializes transactions of multiple threads sharing this adapter
+    reader : receiveEngine
+        Background reader owning the read side of `serial`; None if not used
+    rx : bytearray
+        Data received after the end of the last frame
+    capture : captureSerial
+        Recorder wrapping `serial`; None while not capturing
+    writeChunk : int
+        Maximum size of a single serial write of `cmdWriteData`, 64 matches
+        the bulk endpoint of full speed USB adapters; 0 writes each piece at
+        once. Commands and queries are always sent in one write
+
+    """
+
+    serial: object = None
+    arbiter: busArbiter = None
+    reader: receiveEngine = None
+    rx: bytearray = None
+    capture: "captureSerial" = None
+    writeChunk: int = 64
+
+    PRIO_HIGH   = 0
+    PRIO_NORMAL = 10
+    PRIO_LOW    = 20
+
+    def __init__(self, port: str, baud: int=921600, timeout: float=2.5, debug: bool=False, cache: bool=True, adaptive: bool=True, reader: bool=False, metrics: bool=False, capture: str=None):
+        """
+
+        Parameters
+        ----------
+        port : str|object
             path of the serial device to use. Example: `/dev/ttyACM0` or `COM3`
+            An already opened PySerial compatible object like `replaySerial`
+            is used as is
         baud : int, optional
             baudrate used for serial communication
             921600 should work with most USB dongles
@@ -43,20 +1233,44 @@ class prologix(object):
         debug : bool, optional
             Whether to print verbose status messages and all communication
             by default False
+        cache : bool, optional
+            Whether to skip redundant `++addr` and configuration commands
+            Only disable this if someone else is using the adapter at the same time
+            by default True
+        adaptive : bool, optional
+            Whether to learn read timeouts from observed response times
+            `timeout` is used until enough responses were seen
+            by default True
+        reader : bool, optional
+            Whether to receive using a background thread, see `startReader`
+            by default False
+        metrics : bool, optional
+            Whether to collect counters and histograms, see `enableMetrics`
+            by default False
+        capture : str, optional
+            Record all serial traffic to this file, see `startCapture`
+            by default None
 
         """
-        if timeout is not None:
-            self.timeout = timeout
-
-        self.debug = debug
+        super().__init__(timeout, debug, cache, adaptive, metrics)
+        self.arbiter = busArbiter()
+        self.rx = bytearray()
 
         #Establish connection
-        try:
-            self.serial = serial.Serial(port, baudrate=baud, timeout=self.timeout)
-        except serial.SerialException:
-            print("!! Port " + port + " could not be opened")
-            self.serial = None
-            return None
+        if isinstance(port, str):
+            try:
+                self.serial = serial.Serial(port, baudrate=baud, timeout=self.timeout)
+            except serial.SerialException:
+                print("!! Port " + port + " could not be opened")
+                self.serial = None
+                return None
+        else:
+            self.serial = port
+            self.serial.timeout = self.timeout
+            port = str(port.port)
+
+        if capture is not None:
+            self.startCapture(capture, handshake=False)
 
         #Check for Prologix device
         check = self.cmdPoll("++ver", read=False)
@@ -69,17 +1283,156 @@ class prologix(object):
             print(check)
             self.serial = None
             return None
-        elif debug:
-            print(".. Found Prologix compatible device on port " + port)
+        elif self.trace is not None:
+            self.log("Found Prologix compatible device on port " + port)
 
         #Initialize basic parameters
+        self.resync()
+        self.cmdWrite("++ifc")                                  # Assert IFC to indicate we're taking control of the bus
+
+        if reader:
+            self.startReader()
+
+    def send(self, data: bytes, chunk: int=0):
+        """Write encoded commands to the adapter
+
+        Parameters
+        ----------
+        data : bytes
+            data to write
+        chunk : int, optional
+            split into writes of at most this many bytes
+            by default 0 (a single write)
+        """
+        if chunk > 0 and len(data) > chunk:
+            with memoryview(data) as view:
+                for pos in range(0, len(data), chunk):
+                    self.serial.write(view[pos:pos+chunk])
+        else:
+            self.serial.write(data)
+        self.serial.flush()
+        if self.metrics is not None:
+            self.metrics.written(len(data))
+
+    def startCapture(self, filename: str, handshake: bool=True) -> "captureSerial":
+        """Record all serial traffic to a capture file
+
+        Each write and each received chunk is stored with a monotonic
+        timestamp. Use `replaySerial` to play the file back.
+
+        A new `prologix` on a `replaySerial` expects the file to start with
+        the connection handshake (`++ver`, configuration, `++ifc`), so it is
+        performed again when capturing an already running session.
+
+        Parameters
+        ----------
+        filename : str
+            capture file to create
+        handshake : bool, optional
+            Whether to record the connection handshake first
+            by default True
+
+        Returns
+        -------
+        captureSerial
+            the recorder, also available as `capture`
+        """
+        from capture import captureSerial
+
+        with self.transaction(self.PRIO_HIGH):
+            self.stopCapture()
+            reader = self.reader is not None
+            if reader:
+                self.stopReader()
+            self.capture = captureSerial(self.serial, filename)
+            self.serial = self.capture
+            if reader:
+                self.startReader()
+            if handshake:
+                self.cmdPoll("++ver", read=False)
+                self.resync()
+                self.cmdWrite("++ifc")
+        return self.capture
+
+    def stopCapture(self):
+        """Finish the capture file started using `startCapture`
+        """
+        with self.transaction(self.PRIO_HIGH):
+            if self.capture is None:
+                return
+            reader = self.reader is not None
+            if reader:
+                self.stopReader()
+            self.serial = self.capture.stop()
+            self.capture = None
+            if reader:
+                self.startReader()
+
+    def startReader(self, capacity: int=65536) -> receiveEngine:
+        """Receive using a background thread
+
+        The thread fills a preallocated buffer which responses are taken from.
+        Data arriving after a read timed out is attributed to that read and
+        kept in `reader.late` instead of being discarded.
+
+        Parameters
+        ----------
+        capacity : int, optional
+            size of the receive buffer in bytes
+            by default 65536
+
+        Returns
+        -------
+        receiveEngine
+            the running reader
+        """
+        with self.transaction(self.PRIO_HIGH):
+            if self.reader is None:
+                self.rx.clear()
+                self.reader = receiveEngine(self, capacity)
+                self.reader.begin()
+        return self.reader
+
+    def stopReader(self):
+        """Stop the background reader and read directly again
+        """
+        with self.transaction(self.PRIO_HIGH):
+            if self.reader is not None:
+                self.reader.stop()
+                self.reader = None
+
+    def transaction(self, priority: int=PRIO_NORMAL):
+        """Own the bus for a sequence of commands
+
+        Use as context manager around commands which must not be interleaved
+        with commands of other threads, e.g. a write followed by a status check.
+        Single `cmdWrite`/`cmdPoll` calls are always atomic.
+
+        Parameters
+        ----------
+        priority : int, optional
+            lower values are granted first, see `PRIO_HIGH`, `PRIO_NORMAL`, `PRIO_LOW`
+            by default PRIO_NORMAL
+
+        Returns
+        -------
+        contextmanager
+            context owning the bus
+        """
+        return self.arbiter.transaction(priority)
+
+    def resync(self):
+        """Forget the shadow state and send our adapter configuration again
+
+        Use this if someone else may have changed the adapter settings
+        """
+        self.invalidate()
         self.cmdWrite("++mode 1")                               # Change to controller mode
         self.cmdWrite("++auto 0")                               # Do not automatically read device after each command
         self.cmdWrite("++eoi 0")                                # Do not assert EOI after commandI
         self.cmdWrite("++eos 0")                                # Append CR+LF to all commands
         self.cmdWrite("++eot_enable 0")                         # Do not append EOT to USB output after EOI
-        self.cmdWrite("++read_tmo_ms " + str(self.timeout))     # Transmission timeout
-        self.cmdWrite("++ifc")                                  # Assert IFC to indicate we're taking control of the bus
+        self.cmdWrite(self.readTmoCmd(self.readTimeout()))       # Transmission timeout
 
     def cmdWrite(self, cmd: str, addr: int=None):
         """Write a single, returnless command to a GPIB device
@@ -90,20 +1443,15 @@ class prologix(object):
             The command string to be sent
         addr : int, optional
             address of the targeted device. If set an `++addr` will be issued first
+            unless the adapter is already set to this address
             by default None
         """
-        if addr is not None:
-            """
-            @TODO we probably could skip addr if this is equal to the last addr call and 
-            we're sure noone else is using the bus to reduce bus load.
-            """
-            self.cmdWrite("++addr " + str(addr), addr=None)
-        self.serial.write(str.encode(cmd+self.EOL))
-        if self.debug:
-            print(">> " + cmd)
-        self.serial.flush()
+        with self.transaction():
+            data = self.encodeCmd(cmd, addr)
+            if len(data) > 0:
+                self.send(data)
 
-    def cmdPoll(self, cmd: str, addr: int=None, binary: bool=False, read: bool=True):
+    def cmdPoll(self, cmd: str, addr: int=None, binary: bool=False, read: bool=True, frame=prologixCodec.FRAME_LINE, kind: str=None):
         """Write a single command to a GPIB device and fetch response
 
         Parameters
@@ -123,6 +1471,14 @@ class prologix(object):
                 or while operating with `++auto 1` might return data without polling
                 first
             by default True
+        frame : None|int|str, optional
+            How the end of the response is detected, see `readFrame`
+            by default FRAME_LINE
+        kind : str, optional
+            Command class response times are learned for together with `addr`
+            Commands with different response times like readings at different
+            resolutions should use different classes
+            by default the command itself
 
         Returns
         -------
@@ -130,25 +1486,159 @@ class prologix(object):
             None for empty responses
             str or bytearray depending on `binary` parameter
         """
-        self.serial.reset_input_buffer()
-        self.cmdWrite(cmd, addr)
-        if self.debug and binary:
-            for c in cmd:
-                print("  -> 0b" + format(ord(c), '08b'))
+        key = None
         if read:
-            self.cmdWrite("++read eoi", None)
-        out = self.serial.readline()
-        if len(out) == 0:
-            return None
-        if not binary:
-            out = out.decode()
-            out = out.strip()
-            if self.debug and len(out) > 0:
-                print("<< " + out)
-        elif self.debug and len(out) > 0:
-            for b in out:
-                print("<< 0b" + format(b, '08b'))
-        return out
+            key = (addr, cmd if kind is None else kind)
+        with self.transaction():
+            self.clearInput()
+            data = self.encodeCmd(cmd, addr)
+            if read:
+                data += self.encodeRead(frame, key)
+            self.send(data)
+            return self.readResponse(binary, frame, key)
+
+    def cmdPollMulti(self, queries: list) -> list:
+        """Send several queries in one serial write and fetch all responses
+
+        All `++addr`, command and `++read eoi` sequences are coalesced into
+        a single USB transfer. The adapter works through them in order so
+        responses are read back in the same order afterwards.
+
+        Parameters
+        ----------
+        queries : list
+            List of `(addr, cmd, binary)`, `(addr, cmd, binary, frame)` or
+            `(addr, cmd, binary, frame, kind)` tuples
+            addr, binary, frame and kind have the same meaning as for `cmdPoll`
+
+        Returns
+        -------
+        list
+            One response per query, None for empty responses
+            Beware: if a device does not respond in time the following
+                responses may be shifted
+        """
+        with self.transaction():
+            self.clearInput()
+            data = bytearray()
+            reads = []
+            for query in queries:
+                frame = query[3] if len(query) > 3 else self.FRAME_LINE
+                key = (query[0], query[4] if len(query) > 4 else query[1])
+                data += self.encodeCmd(query[1], query[0])
+                data += self.encodeRead(frame, key)
+                reads.append((query[2], frame, key))
+            self.send(data)
+            # Later responses were already waiting behind the earlier ones,
+            # their read time says nothing about the device latency
+            return [self.readResponse(*read, learn=(i == 0)) for i, read in enumerate(reads)]
+
+    def clearInput(self):
+        """Discard received data before a new transaction
+
+        With a background reader the data is kept as late responses instead
+        """
+        if self.reader is not None:
+            self.reader.drain()
+        else:
+            self.serial.reset_input_buffer()
+            self.rx.clear()
+
+    def readResponse(self, binary: bool=False, frame=prologixCodec.FRAME_LINE, key=None, learn: bool=True):
+        """Read a single response from the adapter
+
+        Parameters
+        ----------
+        binary : bool, optional
+            If False responses are decoded and returned as String
+            If True resonses are unchanged and returned as byte array
+            by default False
+        frame : None|int|str, optional
+            see `readFrame`, by default FRAME_LINE
+        key : tuple, optional
+            see `readFrame`, by default None
+        learn : bool, optional
+            see `readFrame`, by default True
+
+        Returns
+        -------
+        None|str|bytes|memoryview
+            None for empty responses
+            str or bytes depending on `binary` parameter
+        """
+        return self.decodeResponse(self.readFrame(frame, key, learn), binary)
+
+    def readFrame(self, frame=prologixCodec.FRAME_LINE, key=None, learn: bool=True):
+        """Read a single response frame
+
+        Returns as soon as the frame is complete. Data received beyond the
+        end of the frame is kept for the next call.
+
+        Parameters
+        ----------
+        frame : None|int|str, optional
+            FRAME_LINE: up to and including the next newline
+            int: exactly this many bytes
+            FRAME_EOT: up to `eotChar` appended by the adapter on EOI, which
+                is removed. Binary data must not contain `eotChar`
+            FRAME_BLOCK: IEEE 488.2 definite length block `#<n><length><data>`,
+                only the data is returned
+            by default FRAME_LINE
+        key : tuple, optional
+            `(addr, kind)` to learn the response time for and take the
+            timeout from, see `readTimeout`
+            by default None (use `timeout`)
+        learn : bool, optional
+            Whether the time spent waiting is the response time of the
+            device. False for reads of a pipeline after the first one, see
+            `cmdPollMulti`; only timeouts are learned then
+            by default True
+
+        Returns
+        -------
+        bytes|memoryview
+            received frame; may be incomplete or empty after the timeout
+        """
+        timeout = self.readTimeout(key)
+        start = time.monotonic()
+        if self.reader is not None:
+            out, complete = self.reader.readFrame(frame, timeout)
+            if not complete:
+                self.reader.timedOut(key, frame)
+            self.accountRead(key, len(out), time.monotonic() - start, complete, learn)
+            return self.frameData(out, frame)
+
+        if self.serial.timeout != timeout:
+            self.serial.timeout = timeout
+        deadline = start + timeout
+        complete = True
+        while True:
+            end = self.frameEnd(self.rx, frame)
+            if end is not None:
+                break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                complete = False
+                end = len(self.rx)
+                break
+            # Later chunks only get the time left, the first read uses the
+            # full timeout without reconfiguring the port
+            if remaining < self.serial.timeout - 0.001:
+                self.serial.timeout = remaining
+            if isinstance(frame, int):
+                data = self.serial.read(frame - len(self.rx))
+            else:
+                data = self.serial.read(max(self.serial.in_waiting, 1))
+            self.rx += data
+            if len(data) == 0:
+                complete = False
+                end = len(self.rx)
+                break
+        with memoryview(self.rx) as view:
+            out = bytes(view[:end])
+        del self.rx[:end]
+        self.accountRead(key, end, time.monotonic() - start, complete, learn)
+        return self.frameData(out, frame)
 
     def cmdClr(self, addr: int=None):
         """Send `SDC` (selected device clear) to device
@@ -161,22 +1651,80 @@ class prologix(object):
         """
         self.cmdWrite("++clr", addr)
 
-    def escapeCmd(self, cmd : str) -> str:
-        """Escape device command so they traverse the Prologix protocol
+    def cmdTrigger(self, addrs: list=None):
+        """Send `GET` (group execute trigger) to one or more devices at once
 
         Parameters
         ----------
-        cmd : str
-            command to send
+        addrs : list, optional
+            addresses of up to 15 devices to trigger
+            by default None (currently addressed device)
+        """
+        cmd = "++trg"
+        if addrs is not None:
+            if len(addrs) > 15:
+                print("!! ++trg supports at most 15 addresses")
+                return
+            cmd = cmd + "".join(" " + str(addr) for addr in addrs)
+        self.cmdWrite(cmd)
+
+    def cmdSrq(self) -> bool:
+        """Check whether any device asserts SRQ
 
         Returns
         -------
-        str
-            escaped command to send
-        """
-        out = ""
-        for c in cmd:
-            if c == chr(10) or c == chr(13) or chr(27) or chr(43):
-                c = chr(27)+c
-            out = out + c
-        return out
\ No newline at end of file
+        bool|None
+            State of the SRQ line; None if the adapter did not respond
+        """
+        srq = self.cmdPoll("++srq", read=False)
+        if srq == "1":
+            return True
+        elif srq == "0":
+            return False
+        return None
+
+    def cmdSpoll(self, addr: int=None) -> int:
+        """Serial poll a device
+
+        Parameters
+        ----------
+        addr : int, optional
+            address of the device to poll
+            by default None (currently addressed device)
+
+        Returns
+        -------
+        int|None
+            Status byte; None if the device did not respond
+        """
+        cmd = "++spoll"
+        if addr is not None:
+            cmd = cmd + " " + str(addr)
+        status = self.cmdPoll(cmd, read=False)
+        if status is None or not status.isdigit():
+            return None
+        return int(status)
+
+    def cmdWriteData(self, data, addr: int=None, prefix: bytes=b"", chunk: int=4096):
+        """Write binary data as a single, returnless command to a GPIB device
+
+        Use for multi-kilobyte uploads like arbitrary waveforms. LF, CR, ESC
+        and '+' are escaped, the payload is streamed in pieces, see `encodeData`.
+
+        Parameters
+        ----------
+        data : bytes|iterable
+            bytes-like payload or an iterable of bytes-like chunks
+        addr : int, optional
+            address of the targeted device
+            by default None
+        prefix : bytes, optional
+            command preceding the data, e.g. `b"X"`
+            by default empty
+        chunk : int, optional
+            bytes of a bytes-like payload escaped at once
+            by default 4096
+        """
+        with self.transaction():
+            for part in self.encodeData(data, addr, prefix, chunk):
+                self.send(part, self.writeChunk)
@@ -0,0 +1,356 @@
+import os
+import mmap
+import math
+import time
+import struct
+import threading
+
+class readingStore(object):
+    """Append-only on-disk log of readings in memory-mapped segment files
+
+    Records have a fixed width and the same layout as `sampleBuffer.DTYPE`
+    (timestamp, value, function, range, device), so a segment can also be
+    loaded using numpy. Appending only writes into the mapping, the kernel
+    writes dirty pages back in the background.
+
+    Each segment starts with a header and a sparse index holding the lowest
+    and highest timestamp of every `blockSize` records. Range queries only
+    look at blocks overlapping the requested time span, so readings from
+    several threads do not need to arrive in exact time order.
+
+    A new segment is started once the current one is full or older than
+    `segmentSeconds`. The oldest segments are deleted beyond `maxSegments`.
+
+    Attributes
+    ----------
+    directory : str
+        folder holding the segment files
+    segmentSize : int
+        maximum size of a segment file in bytes
+    blockSize : int
+        records per index entry
+    segmentSeconds : float
+        maximum time span of a segment; None for no limit
+    maxSegments : int
+        number of segments to keep; None to keep all
+    offset : float
+        seconds added to every timestamp, see `monotonic`
+    total : int
+        number of records in all segments
+    """
+
+    MAGIC = b"HPSTORE1"
+    # magic, record size, block size, capacity in records, number of records
+    HEADER = struct.Struct("<8sIIQQ")
+    # timestamp, value, function, range, device; same as sampleBuffer.DTYPE
+    RECORD = struct.Struct("<ddBBH")
+    # lowest and highest timestamp of a block
+    BLOCK = struct.Struct("<dd")
+
+    def __init__(self, directory: str, segmentSize: int=64*1024*1024, blockSize: int=4096, segmentSeconds: float=None, maxSegments: int=None, monotonic: bool=False):
+        """
+
+        Parameters
+        ----------
+        directory : str
+            folder holding the segment files, created if missing
+            existing segments are kept, new records go to a new segment
+        segmentSize : int, optional
+            maximum size of a segment file in bytes
+            by default 64 MiB (about 3.3 million records)
+        blockSize : int, optional
+            records per index entry
+            by default 4096
+        segmentSeconds : float, optional
+            start a new segment after this many seconds
+            by default None (only rotate full segments)
+        maxSegments : int, optional
+            delete the oldest segments beyond this number
+            by default None (keep all)
+        monotonic : bool, optional
+            Whether appended timestamps are `time.monotonic()` values like
+            those of `hp3478a.stream`; they are stored as Unix time
+            by default False
+        """
+        self.directory = directory
+        self.segmentSize = segmentSize
+        self.blockSize = blockSize
+        self.segmentSeconds = segmentSeconds
+        self.maxSegments = maxSegments
+        self.offset = time.time() - time.monotonic() if monotonic else 0.0
+        self.lock = threading.Lock()
+
+        self.current = None
+        self.fp = None
+        self.map = None
+        self.count = 0
+        self.capacity = 0
+        self.started = None
+
+        os.makedirs(directory, exist_ok=True)
+        self.segments = []
+        self.maps = {}
+        for name in sorted(os.listdir(directory)):
+            if name.startswith("segment-") and name.endswith(".dat"):
+                self.segments.append(int(name[8:-4]))
+        self.total = sum(self.header(number)[4] for number in self.segments)
+
+    def __len__(self) -> int:
+        return self.total
+
+    def filename(self, number: int) -> str:
+        return os.path.join(self.directory, "segment-%08d.dat" % number)
+
+    def dataStart(self, blocks: int) -> int:
+        """Get the offset of the first record
+
+        Parameters
+        ----------
+        blocks : int
+            number of index entries
+
+        Returns
+        -------
+        int
+            offset in bytes
+        """
+        return self.HEADER.size + blocks * self.BLOCK.size
+
+    def open(self, number: int) -> mmap.mmap:
+        """Map a segment for reading
+
+        Parameters
+        ----------
+        number : int
+            segment number
+
+        Returns
+        -------
+        mmap.mmap
+            mapping of the whole file
+        """
+        if number == self.current:
+            return self.map
+        if number not in self.maps:
+            with open(self.filename(number), "rb") as fp:
+                self.maps[number] = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        return self.maps[number]
+
+    def header(self, number: int) -> tuple:
+        """Read the header of a segment
+
+        Parameters
+        ----------
+        number : int
+            segment number
+
+        Returns
+        -------
+        tuple
+            (magic, record size, block size, capacity, number of records)
+        """
+        header = self.HEADER.unpack_from(self.open(number), 0)
+        if header[0] != self.MAGIC or header[1] != self.RECORD.size:
+            print("!! " + self.filename(number) + " is not a reading store segment")
+            return (header[0], self.RECORD.size, 1, 0, 0)
+        return header
+
+    def rotate(self):
+        """Finish the current segment and start a new one
+        """
+        self.finish()
+        number = self.segments[-1] + 1 if len(self.segments) > 0 else 0
+
+        blocks = (self.segmentSize - self.HEADER.size) // (self.blockSize * self.RECORD.size + self.BLOCK.size)
+        self.capacity = blocks * self.blockSize
+        size = self.dataStart(blocks) + self.capacity * self.RECORD.size
+
+        self.fp = open(self.filename(number), "w+b")
+        self.fp.truncate(size)
+        self.map = mmap.mmap(self.fp.fileno(), size)
+        self.HEADER.pack_into(self.map, 0, self.MAGIC, self.RECORD.size, self.blockSize, self.capacity, 0)
+        self.first = self.dataStart(blocks)
+        self.current = number
+        self.count = 0
+        self.started = time.monotonic()
+        self.segments.append(number)
+
+        if self.maxSegments is not None:
+            while len(self.segments) > self.maxSegments:
+                self.delete(self.segments[0])
+
+    def finish(self):
+        """Write back the current segment and cut off its unused space
+        """
+        if self.map is None:
+            return
+        blocks = self.capacity // self.blockSize
+        self.map.flush()
+        self.map.close()
+        # Keep the index entries in place, only records are cut off
+        self.fp.truncate(self.dataStart(blocks) + self.count * self.RECORD.size)
+        self.fp.close()
+        self.map = None
+        self.fp = None
+        self.current = None
+
+    def delete(self, number: int):
+        """Remove a segment file
+
+        Parameters
+        ----------
+        number : int
+            segment number
+        """
+        self.total -= self.header(number)[4]
+        if number in self.maps:
+            self.maps.pop(number).close()
+        os.remove(self.filename(number))
+        self.segments.remove(number)
+
+    def append(self, timestamp: float, value: float, function: int=0, range: int=0, device: int=0):
+        """Store a single reading
+
+        Same signature as `sampleBuffer.append`, so a store can be passed to
+        `hp3478a.stream(buffer=...)`
+
+        Parameters
+        ----------
+        timestamp : float
+            time of the reading, see `monotonic`
+        value : float
+            reading; None is stored as NaN
+        function : int, optional
+            numeric function representation, by default 0
+        range : int, optional
+            numeric range representation, by default 0
+        device : int, optional
+            device id, by default 0
+        """
+        if value is None:
+            value = math.nan
+        timestamp += self.offset
+        with self.lock:
+            if self.count >= self.capacity or (self.segmentSeconds is not None and time.monotonic() - self.started >= self.segmentSeconds):
+                self.rotate()
+            n = self.count
+            self.RECORD.pack_into(self.map, self.first + n * self.RECORD.size, timestamp, value, function, range, device)
+
+            block = self.HEADER.size + (n // self.blockSize) * self.BLOCK.size
+            if n % self.blockSize == 0:
+                self.BLOCK.pack_into(self.map, block, timestamp, timestamp)
+            else:
+                low, high = self.BLOCK.unpack_from(self.map, block)
+                if timestamp < low or timestamp > high:
+                    self.BLOCK.pack_into(self.map, block, min(low, timestamp), max(high, timestamp))
+
+            self.count = n + 1
+            self.total += 1
+            # Store the count last so a crash never exposes unwritten records
+            struct.pack_into("<Q", self.map, self.HEADER.size - 8, self.count)
+
+    def flush(self):
+        """Write dirty pages of the current segment back to disk now
+        """
+        with self.lock:
+            if self.map is not None:
+                self.map.flush()
+
+    def close(self):
+        """Finish the current segment and release all mappings
+        """
+        with self.lock:
+            self.finish()
+            for m in self.maps.values():
+                m.close()
+            self.maps = {}
+
+    def query(self, start: float=None, end: float=None, device: int=None):
+        """Iterate over stored readings within a time span
+
+        Parameters
+        ----------
+        start : float, optional
+            first Unix time to include
+            by default from the oldest reading
+        end : float, optional
+            Unix time to stop before
+            by default up to the latest reading
+        device : int, optional
+            only return readings of this device
+            by default all devices
+
+        Yields
+        ------
+        tuple
+            (timestamp, value, function, range, device) in stored order;
+            value is NaN if the device did not respond
+        """
+        if start is None:
+            start = -math.inf
+        if end is None:
+            end = math.inf
+        for number in list(self.segments):
+            with self.lock:
+                if number not in self.segments:
+                    continue
+                data = self.open(number)
+                magic, size, blockSize, capacity, count = self.header(number)
+                if number == self.current:
+                    count = self.count
+                first = self.dataStart(capacity // blockSize)
+                blocks = []
+                for block in range((count + blockSize - 1) // blockSize):
+                    low, high = self.BLOCK.unpack_from(data, self.HEADER.size + block * self.BLOCK.size)
+                    if high >= start and low < end:
+                        blocks.append(block)
+            for block in blocks:
+                a = block * blockSize
+                b = min(a + blockSize, count)
+                # Copy a block at a time so appends are not held up
+                with self.lock:
+                    if number not in self.segments:
+                        break
+                    span = self.open(number)[first + a * self.RECORD.size:first + b * self.RECORD.size]
+                for record in self.RECORD.iter_unpack(span):
+                    if start <= record[0] < end and (device is None or record[4] == device):
+                        yield record
+
+    def replay(self, sink, start: float=None, end: float=None, device: int=None, batch: int=5000) -> float:
+        """Pass stored readings to a sink in batches
+
+        Use to fill a database with readings stored while it was unreachable.
+        The returned timestamp can be passed as `start` of the next replay.
+
+        Parameters
+        ----------
+        sink : callable
+            called with a list of up to `batch` records, see `query`
+        start : float, optional
+            see `query`
+        end : float, optional
+            see `query`
+        device : int, optional
+            see `query`
+        batch : int, optional
+            maximum records per call
+            by default 5000
+
+        Returns
+        -------
+        float
+            timestamp just after the latest replayed reading; `start` if
+            nothing was replayed
+        """
+        latest = start
+        records = []
+        for record in self.query(start, end, device):
+            records.append(record)
+            if latest is None or record[0] >= latest:
+                latest = math.nextafter(record[0], math.inf)
+            if len(records) >= batch:
+                sink(records)
+                records = []
+        if len(records) > 0:
+            sink(records)
+        return latest
@@ -0,0 +1,180 @@
+import numpy as np
+
+class sampleBuffer(object):
+    """Preallocated ring buffer for readings backed by a NumPy structured array
+
+    Memory usage is fixed by `capacity`; once full the oldest samples are
+    overwritten. Consumers get views into the storage without copying.
+
+    Requires numpy
+
+    Attributes
+    ----------
+    data : numpy.ndarray
+        ring storage using `DTYPE`
+    capacity : int
+        number of samples which fit into the buffer
+    total : int
+        number of samples appended since creation
+    """
+
+    DTYPE = np.dtype([
+        ("timestamp", "f8"),    # monotonic time
+        ("value", "f8"),        # NaN if the device did not respond
+        ("function", "u1"),     # hp3478aStatus.function
+        ("range", "u1"),        # hp3478aStatus.range
+        ("device", "u2"),       # GPIB address or other device id
+    ])
+
+    def __init__(self, capacity: int=1048576):
+        """
+
+        Parameters
+        ----------
+        capacity : int, optional
+            number of samples to keep
+            by default 1048576 (20 MiB)
+        """
+        self.capacity = capacity
+        self.data = np.zeros(capacity, dtype=self.DTYPE)
+        self.total = 0
+
+    def __len__(self) -> int:
+        return min(self.total, self.capacity)
+
+    def dropped(self) -> int:
+        """Get the number of samples overwritten so far
+
+        Returns
+        -------
+        int
+            overwritten samples
+        """
+        return max(self.total - self.capacity, 0)
+
+    def append(self, timestamp: float, value: float, function: int=0, range: int=0, device: int=0):
+        """Store a single sample
+
+        Parameters
+        ----------
+        timestamp : float
+            monotonic time of the reading
+        value : float
+            reading; None is stored as NaN
+        function : int, optional
+            numeric function representation, by default 0
+        range : int, optional
+            numeric range representation, by default 0
+        device : int, optional
+            device id, by default 0
+        """
+        if value is None:
+            value = np.nan
+        self.data[self.total % self.capacity] = (timestamp, value, function, range, device)
+        self.total += 1
+
+    def extend(self, samples: np.ndarray):
+        """Store many samples at once
+
+        Parameters
+        ----------
+        samples : numpy.ndarray
+            structured array using `DTYPE`
+        """
+        n = len(samples)
+        if n >= self.capacity:
+            samples = samples[n-self.capacity:]
+            self.total += n - self.capacity
+            n = self.capacity
+        start = self.total % self.capacity
+        first = min(n, self.capacity - start)
+        self.data[start:start+first] = samples[:first]
+        self.data[:n-first] = samples[first:]
+        self.total += n
+
+    def views(self, start: int=None, end: int=None) -> tuple:
+        """Get zero-copy views of stored samples in chronological order
+
+        The ring may wrap, so up to two views are returned. Views stay valid
+        until the samples are overwritten by later appends.
+
+        Parameters
+        ----------
+        start : int, optional
+            absolute sample number (see `total`) to start at
+            by default the oldest stored sample
+        end : int, optional
+            absolute sample number to stop before
+            by default `total`
+
+        Returns
+        -------
+        tuple
+            one or two numpy.ndarray views; may be empty
+        """
+        if end is None or end > self.total:
+            end = self.total
+        oldest = self.dropped()
+        if start is None or start < oldest:
+            start = oldest
+        if start >= end:
+            return ()
+        a = start % self.capacity
+        b = end % self.capacity
+        if a < b:
+            return (self.data[a:b],)
+        if b == 0:
+            return (self.data[a:],)
+        return (self.data[a:], self.data[:b])
+
+    def latest(self, n: int) -> tuple:
+        """Get zero-copy views of the `n` most recent samples
+
+        Parameters
+        ----------
+        n : int
+            number of samples
+
+        Returns
+        -------
+        tuple
+            see `views`
+        """
+        return self.views(self.total - n)
+
+    def read(self, position: int) -> tuple:
+        """Get all samples appended since a previous read
+
+        Parameters
+        ----------
+        position : int
+            value returned by the previous call, 0 for the first call
+
+        Returns
+        -------
+        tuple
+            (views, new position); samples overwritten in the meantime are skipped
+        """
+        return self.views(position), self.total
+
+    def array(self, start: int=None, end: int=None) -> np.ndarray:
+        """Get a contiguous copy of stored samples
+
+        Parameters
+        ----------
+        start : int, optional
+            see `views`
+        end : int, optional
+            see `views`
+
+        Returns
+        -------
+        numpy.ndarray
+            structured array using `DTYPE`
+        """
+        views = self.views(start, end)
+        if len(views) == 0:
+            return np.zeros(0, dtype=self.DTYPE)
+        if len(views) == 1:
+            return views[0].copy()
+        return np.concatenate(views)
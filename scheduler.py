@@ -0,0 +1,350 @@
+import math
+import time
+import threading
+from collections import deque
+from typing import NamedTuple
+
+from prologix import prologix
+
+class scheduledReading(NamedTuple):
+    """Single reading taken by `pollScheduler`
+
+    Attributes
+    ----------
+    deadline : float
+        monotonic time the reading was scheduled for
+    timestamp : float
+        monotonic time the response was received
+    addr : int
+        GPIB address of the device
+    value : float
+        measured value; None if the device did not respond
+    lateness : float
+        seconds the poll started after `deadline`; negative if it was
+        started early to share a transaction
+    """
+    deadline: float
+    timestamp: float
+    addr: int
+    value: float
+    lateness: float
+
+class pollSchedule(object):
+    """Polling plan and statistics of a single device, see `pollScheduler.add`
+
+    Deadlines are computed as `start + index * interval` instead of adding up
+    intervals, so rounding errors do not accumulate over days.
+
+    Attributes
+    ----------
+    device : hp3478a
+        polled device
+    interval : float
+        seconds between readings
+    start : float
+        monotonic time of the first deadline
+    index : int
+        number of the next deadline
+    status : bool
+        Whether the device status is read along with each reading
+    callback : callable
+        called with each `scheduledReading`; None to use the scheduler's
+    polls : int
+        number of readings taken
+    missed : int
+        number of deadlines skipped because the bus was saturated
+    late : int
+        number of readings started later than `pollScheduler.tolerance`
+    latenessMax : float
+        highest lateness in seconds
+    lateness : deque
+        most recent lateness values in seconds
+    """
+
+    def __init__(self, device, interval: float, start: float, status: bool=False, callback=None, history: int=1000):
+        self.device = device
+        self.interval = interval
+        self.start = start
+        self.index = 0
+        self.status = status
+        self.callback = callback
+        self.polls = 0
+        self.missed = 0
+        self.late = 0
+        self.latenessTotal = 0.0
+        self.latenessMax = 0.0
+        self.lateness = deque(maxlen=history)
+
+    def deadline(self) -> float:
+        """Get the next deadline
+
+        Returns
+        -------
+        float
+            monotonic time
+        """
+        return self.start + self.index * self.interval
+
+    def stats(self) -> dict:
+        """Get poll statistics
+
+        Returns
+        -------
+        dict
+            address, interval, polls, missed and late counts, lateness mean,
+            p99 and max in seconds
+        """
+        lateness = sorted(self.lateness)
+        return {
+            "addr": self.device.addr,
+            "interval": self.interval,
+            "polls": self.polls,
+            "missed": self.missed,
+            "late": self.late,
+            "latenessMean": self.latenessTotal / self.polls if self.polls > 0 else None,
+            "latenessP99": lateness[int(0.99 * (len(lateness)-1))] if len(lateness) > 0 else None,
+            "latenessMax": self.latenessMax,
+        }
+
+class pollScheduler(object):
+    """Poll HP3478A devices at individual rates using deadlines
+
+    All devices due within `window` are polled in one pipelined transfer per
+    adapter, see `prologix.cmdPollMulti`. If the bus can not keep up late
+    deadlines are either skipped (`POLICY_SKIP`) so the rate drops but
+    readings stay on the grid, or all polled as fast as possible until the
+    schedule is met again (`POLICY_CATCHUP`), at most `maxBacklog` deadlines
+    per device.
+
+    Attributes
+    ----------
+    policy : str
+        `POLICY_SKIP` or `POLICY_CATCHUP`
+    window : float
+        seconds a poll may be started early to share a transaction
+    tolerance : float
+        lateness in seconds up to which a poll counts as on time
+    maxBacklog : int
+        deadlines per device caught up at most with `POLICY_CATCHUP`
+    schedules : list
+        `pollSchedule` of every device
+    cycles : int
+        number of transactions
+    busy : float
+        seconds spent polling
+    """
+
+    POLICY_SKIP    = "skip"
+    POLICY_CATCHUP = "catch-up"
+
+    def __init__(self, policy: str=POLICY_SKIP, window: float=0.005, tolerance: float=0.01, maxBacklog: int=100, callback=None):
+        """
+
+        Parameters
+        ----------
+        policy : str, optional
+            `POLICY_SKIP` or `POLICY_CATCHUP`
+            by default POLICY_SKIP
+        window : float, optional
+            seconds a poll may be started early to share a transaction
+            by default 0.005
+        tolerance : float, optional
+            lateness in seconds up to which a poll counts as on time
+            by default 0.01
+        maxBacklog : int, optional
+            deadlines per device caught up at most with `POLICY_CATCHUP`,
+            older ones are skipped
+            by default 100
+        callback : callable, optional
+            called with each `scheduledReading` of devices added without
+            their own callback
+            by default None
+        """
+        self.policy = policy
+        self.window = window
+        self.tolerance = tolerance
+        self.maxBacklog = maxBacklog
+        self.callback = callback
+        self.schedules = []
+        self.stopEvent = threading.Event()
+        self.cycles = 0
+        self.busy = 0.0
+        self.started = None
+
+    def add(self, device, interval: float, phase: float=0.0, status: bool=False, callback=None) -> pollSchedule:
+        """Poll a device regularly
+
+        Parameters
+        ----------
+        device : hp3478a
+            device to poll
+        interval : float
+            seconds between readings
+        phase : float, optional
+            seconds from now to the first deadline
+            by default 0.0
+        status : bool, optional
+            Whether to read the device status along with each reading so
+            `device.status` stays current
+            by default False
+        callback : callable, optional
+            called with each `scheduledReading` of this device
+            by default None (use the scheduler's callback)
+
+        Returns
+        -------
+        pollSchedule
+            plan and statistics of the device
+        """
+        schedule = pollSchedule(device, interval, time.monotonic() + phase, status, callback)
+        self.schedules.append(schedule)
+        return schedule
+
+    def remove(self, device):
+        """Stop polling a device
+
+        Parameters
+        ----------
+        device : hp3478a
+            device added using `add`
+        """
+        self.schedules = [schedule for schedule in self.schedules if schedule.device is not device]
+
+    def stop(self):
+        """End `run` after the current transaction
+        """
+        self.stopEvent.set()
+
+    def advance(self, schedule: pollSchedule, now: float):
+        """Move a schedule to its next deadline after a poll
+
+        Parameters
+        ----------
+        schedule : pollSchedule
+            polled schedule
+        now : float
+            monotonic time the poll started
+        """
+        schedule.index += 1
+        behind = math.floor((now - schedule.deadline()) / schedule.interval)
+        if behind < 0:
+            return
+        if self.policy == self.POLICY_SKIP:
+            skip = behind + 1
+        else:
+            skip = max(behind + 1 - self.maxBacklog, 0)
+        schedule.index += skip
+        schedule.missed += skip
+
+    def poll(self, schedules: list, now: float):
+        """Poll due devices sharing an adapter in one transaction
+
+        Parameters
+        ----------
+        schedules : list
+            due `pollSchedule` objects whose devices share one `prologix`
+        now : float
+            monotonic time the poll starts
+        """
+        gpib = schedules[0].device.gpib
+        queries = []
+        for schedule in schedules:
+            device = schedule.device
+            if schedule.status:
+                queries.append((device.addr, "B", True, 5, "B"))
+            queries.append((device.addr, " ", False, prologix.FRAME_LINE, device.measureKind))
+
+        with gpib.transaction(min(schedule.device.priority for schedule in schedules)):
+            responses = gpib.cmdPollMulti(queries)
+        timestamp = time.monotonic()
+
+        responses = iter(responses)
+        for schedule in schedules:
+            device = schedule.device
+            if schedule.status:
+                status = next(responses)
+                if status is not None and len(status) >= 5:
+                    device.decodeStatus(status)
+            try:
+                value = float(next(responses))
+            except (TypeError, ValueError):
+                value = None
+
+            deadline = schedule.deadline()
+            lateness = now - deadline
+            schedule.polls += 1
+            schedule.lateness.append(lateness)
+            schedule.latenessTotal += lateness
+            if lateness > schedule.latenessMax:
+                schedule.latenessMax = lateness
+            if lateness > self.tolerance:
+                schedule.late += 1
+            self.advance(schedule, now)
+
+            callback = schedule.callback if schedule.callback is not None else self.callback
+            if callback is not None:
+                callback(scheduledReading(deadline, timestamp, device.addr, value, lateness))
+
+    def runOnce(self) -> float:
+        """Poll all devices which are due
+
+        Returns
+        -------
+        float
+            seconds until the next deadline; None without devices
+        """
+        if len(self.schedules) == 0:
+            return None
+        now = time.monotonic()
+        due = {}
+        for schedule in self.schedules:
+            if schedule.deadline() <= now + self.window:
+                due.setdefault(id(schedule.device.gpib), []).append(schedule)
+        for schedules in due.values():
+            start = time.monotonic()
+            self.poll(schedules, start)
+            self.busy += time.monotonic() - start
+            self.cycles += 1
+        return min(schedule.deadline() for schedule in self.schedules) - time.monotonic()
+
+    def run(self, duration: float=None):
+        """Poll until `stop` is called
+
+        Parameters
+        ----------
+        duration : float, optional
+            stop after this many seconds
+            by default None (until `stop` is called)
+        """
+        self.stopEvent.clear()
+        if self.started is None:
+            self.started = time.monotonic()
+        end = None
+        if duration is not None:
+            end = time.monotonic() + duration
+        while not self.stopEvent.is_set():
+            remaining = self.runOnce()
+            if remaining is None:
+                remaining = 0.1
+            if end is not None:
+                if time.monotonic() >= end:
+                    break
+                remaining = min(remaining, end - time.monotonic())
+            if remaining > 0:
+                self.stopEvent.wait(remaining)
+
+    def stats(self) -> dict:
+        """Get scheduler and per device statistics
+
+        Returns
+        -------
+        dict
+            cycles, utilization (share of time spent polling) and a list of
+            `pollSchedule.stats` of all devices
+        """
+        elapsed = time.monotonic() - self.started if self.started is not None else 0.0
+        return {
+            "cycles": self.cycles,
+            "utilization": self.busy / elapsed if elapsed > 0 else None,
+            "devices": [schedule.stats() for schedule in self.schedules],
+        }
@@ -0,0 +1,811 @@
+#!/usr/bin/env python3
+
+# Software Prologix adapter with emulated HP3478A multimeters behind a pseudo-terminal
+#
+# Usage: python3 simulator.py --device 22 --device 23
+# then point prologix/hp3478a to the printed port
+
+import os
+import tty
+import math
+import time
+import queue
+import random
+import select
+import argparse
+import threading
+
+class hp3478aSimulator(object):
+    """Emulated HP3478A multimeter
+
+    Implements the HP-IB program codes used by `hp3478a` including the
+    undocumented `W`/`X` calibration RAM access.
+
+    Attributes
+    ----------
+    function : int
+        Measurement function, same numbering as `hp3478a.VDC` and following
+    range : int
+        Measurement range as reported in status byte 1
+    autoRange : bool
+        Auto-Range is enabled
+    digits : int
+        Resolution as reported in status byte 1: 1=5½, 2=4½, 3=3½
+    trigger : int
+        Trigger mode, same numbering as `hp3478a.TRIG_INT` and following
+    autoZero : bool
+        Auto-Zero is enabled
+    display : int
+        Display mode: 1 normal, 2 text, 3 text with updates paused
+    text : str
+        Text shown on the display for mode 2 and 3
+    srqMask : int
+        Serial poll mask as set by `M`
+    spr : int
+        Serial poll register
+    err : int
+        Error register as returned by `E`
+    calRAM : list
+        256 calibration RAM nibbles
+    calEnable : bool
+        Front panel CAL ENABLE switch; required for `X` writes
+    frontPorts : bool
+        Front/Rear switch; True = Front
+    freq50Hz : bool
+        Line frequency setting
+    readTimes : dict
+        Seconds per reading for each digits setting with Auto-Zero off
+    displayTime : float
+        Additional seconds per reading while the display is updated
+    source : callable
+        Called with the measurement function, returns the value to measure
+        by default a fixed value with some noise for each function
+    """
+
+    SPR_READING = 1<<0
+    SPR_SYNTAX  = 1<<2
+    SPR_HWERR   = 1<<3
+    SPR_KBD     = 1<<4
+    SPR_CAL     = 1<<5
+    SPR_RQS     = 1<<6
+    SPR_PON     = 1<<7
+
+    # Offset between program range code and status range; valid status ranges
+    RANGES = {
+        1: (3, 1, 5),
+        2: (2, 1, 4),
+        3: (0, 1, 7),
+        4: (0, 1, 7),
+        5: (2, 1, 2),
+        6: (2, 1, 2),
+        7: (0, 1, 1),
+    }
+
+    # Full scale of status range 1 for each function
+    SCALE = {1: 0.03, 2: 0.3, 3: 30.0, 4: 30.0, 5: 0.3, 6: 0.3, 7: 3e10}
+
+    NOMINAL = {1: 1.23456, 2: 0.5, 3: 1000.0, 4: 1000.0, 5: 0.01, 6: 0.01, 7: 1e9}
+
+    def __init__(self, readTimes: dict=None, displayTime: float=0.002, source=None, calRAM: list=None, seed: int=None):
+        """
+
+        Parameters
+        ----------
+        readTimes : dict, optional
+            Seconds per reading for each digits setting (1=5½, 2=4½, 3=3½)
+            with Auto-Zero off. Auto-Zero on doubles the time
+            by default roughly the rates given in the HP3478A datasheet
+        displayTime : float, optional
+            Additional seconds per reading while the display is updated
+            by default 0.002
+        source : callable, optional
+            Called with the measurement function, returns the value to measure
+            by default a fixed value with some noise for each function
+        calRAM : list, optional
+            256 nibbles of calibration RAM
+            by default random data with valid checksums
+        seed : int, optional
+            Seed for noise and generated calibration data
+            by default None
+        """
+        self.random = random.Random(seed)
+        if readTimes is None:
+            readTimes = {1: 1/9, 2: 1/57, 3: 1/71}
+        self.readTimes = readTimes
+        self.displayTime = displayTime
+        self.source = source
+        if calRAM is None:
+            calRAM = self.randomCalibration()
+        self.calRAM = list(calRAM)
+        self.calEnable = False
+        self.frontPorts = True
+        self.freq50Hz = True
+        self.lock = threading.RLock()
+        self.srqMask = 0
+        self.spr = 0
+        self.err = 0
+        self.reset()
+        self.spr = self.SPR_PON
+
+    def randomCalibration(self) -> list:
+        """Generate calibration RAM contents with valid checksums
+
+        Returns
+        -------
+        list
+            256 nibbles
+        """
+        nibbles = [self.random.randrange(16) for n in range(256)]
+        for entry in range(19):
+            base = 1 + entry*13
+            csum = 0xff - sum(nibbles[base:base+11])
+            nibbles[base+11] = (csum >> 4) & 0xf
+            nibbles[base+12] = csum & 0xf
+        return nibbles
+
+    def reset(self):
+        """Return to power-on settings as done by device clear
+        """
+        with self.lock:
+            self.function = 1
+            self.range = 3
+            self.autoRange = True
+            self.digits = 1
+            self.trigger = 1
+            self.autoZero = True
+            self.display = 1
+            self.text = ""
+            self.srqMask = 0
+            self.spr = 0
+            self.output = None
+            self.restart()
+
+    def restart(self):
+        """Abort the current reading and start measuring again
+        """
+        self.cycleStart = time.monotonic()
+        self.consumed = 0
+        self.triggered = None
+        self.notified = 0
+
+    def readTime(self) -> float:
+        """Get the time a single reading takes with current settings
+
+        Returns
+        -------
+        float
+            Seconds per reading
+        """
+        t = self.readTimes[self.digits]
+        if self.autoZero:
+            t = t * 2
+        if self.display != 3:
+            t = t + self.displayTime
+        return t
+
+    def fullScale(self, rng: int=None) -> float:
+        """Get full scale value of a range
+
+        Parameters
+        ----------
+        rng : int, optional
+            status range number, by default the current range
+
+        Returns
+        -------
+        float
+            Full scale value
+        """
+        if rng is None:
+            rng = self.range
+        return self.SCALE[self.function] * 10**(rng-1)
+
+    def setRange(self, code: int):
+        offset, low, high = self.RANGES[self.function]
+        self.range = min(max(code + offset, low), high)
+
+    def measure(self) -> float:
+        """Take a single measurement value
+
+        Returns
+        -------
+        float
+            Measured value
+        """
+        if self.source is not None:
+            return self.source(self.function)
+        value = self.NOMINAL[self.function]
+        return value + self.random.gauss(0, abs(value)*1e-5)
+
+    def formatReading(self, value: float) -> bytes:
+        """Format a reading like the HP3478A does
+
+        Parameters
+        ----------
+        value : float
+            Measured value
+
+        Returns
+        -------
+        bytes
+            Reading including CR LF
+        """
+        offset, low, high = self.RANGES[self.function]
+        if self.autoRange:
+            self.range = high
+            for rng in range(low, high+1):
+                if abs(value) <= self.fullScale(rng):
+                    self.range = rng
+                    break
+        fs = self.fullScale()
+        if abs(value) > fs * 1.013:
+            return b"+9.99999E+9\r\n"
+        exp = 3 * math.floor(math.log10(fs) / 3)
+        intDigits = len(str(int(round(fs / 10**exp))))
+        decimals = {1: 6, 2: 5, 3: 4}[self.digits] - intDigits
+        return ("{:+.{}f}E{:+d}\r\n".format(value / 10**exp, decimals, exp)).encode()
+
+    def update(self, now: float):
+        """Advance the reading state machine and raise SRQ for new readings
+
+        Parameters
+        ----------
+        now : float
+            current monotonic time
+        """
+        if self.readyAt(now) is not None and self.readyAt(now) <= now:
+            self.spr |= self.SPR_READING
+            count = self.completed(now)
+            if count > self.notified:
+                self.notified = count
+                self.event(self.SPR_READING)
+        else:
+            self.spr &= ~self.SPR_READING
+
+    def completed(self, now: float) -> int:
+        if self.trigger == 1:
+            return int((now - self.cycleStart) / self.readTime())
+        if self.triggered is not None and now >= self.triggered + self.readTime():
+            return self.consumed + 1
+        return self.consumed
+
+    def readyAt(self, now: float):
+        """Get the time the next unread reading is or will be available
+
+        Parameters
+        ----------
+        now : float
+            current monotonic time
+
+        Returns
+        -------
+        float|None
+            monotonic time; None if no reading was triggered
+        """
+        if self.trigger == 1:
+            return self.cycleStart + (self.consumed+1) * self.readTime()
+        if self.triggered is None:
+            return None
+        return self.triggered + self.readTime()
+
+    def event(self, bit: int):
+        """Set a bit in the serial poll register and request service if unmasked
+
+        Parameters
+        ----------
+        bit : int
+            serial poll register bit
+        """
+        self.spr |= bit
+        if bit & self.srqMask & 0x3f:
+            self.spr |= self.SPR_RQS
+
+    def srq(self) -> bool:
+        """Whether the device currently asserts SRQ
+
+        Returns
+        -------
+        bool
+            SRQ state
+        """
+        with self.lock:
+            self.update(time.monotonic())
+            return self.spr & self.SPR_RQS != 0
+
+    def serialPoll(self) -> int:
+        """Answer a serial poll
+
+        Returns
+        -------
+        int
+            serial poll register; RQS is cleared afterwards
+        """
+        with self.lock:
+            self.update(time.monotonic())
+            out = self.spr
+            self.spr &= ~self.SPR_RQS
+            return out
+
+    def clear(self):
+        """Handle SDC/DCL
+        """
+        self.reset()
+
+    def triggerReading(self):
+        """Handle GET
+        """
+        with self.lock:
+            if self.trigger != 1:
+                self.output = None
+                self.triggered = time.monotonic()
+                self.consumed = 0
+                self.notified = 0
+
+    def syntaxError(self):
+        self.event(self.SPR_SYNTAX)
+
+    def hardwareError(self, bits: int):
+        """Inject a hardware error
+
+        Parameters
+        ----------
+        bits : int
+            error register bits, see `hp3478a.hp3478aStatus`
+        """
+        with self.lock:
+            self.err |= bits
+            self.event(self.SPR_HWERR)
+
+    def write(self, data: bytes):
+        """Handle data sent to the device while addressed to listen
+
+        Parameters
+        ----------
+        data : bytes
+            Program codes
+        """
+        with self.lock:
+            self.parse(data)
+
+    def parse(self, data: bytes):
+        i = 0
+        while i < len(data):
+            c = chr(data[i])
+            i += 1
+            if c in " \r\n,;":
+                continue
+            arg = chr(data[i]) if i < len(data) else ""
+            if c == "F" and arg in "1234567" and arg != "":
+                code = self.range - self.RANGES[self.function][0]
+                self.function = int(arg)
+                self.setRange(code)
+                self.restart()
+                i += 1
+            elif c == "R":
+                if arg == "A":
+                    self.autoRange = True
+                    i += 1
+                else:
+                    sign = 1
+                    if arg == "-":
+                        sign = -1
+                        i += 1
+                        arg = chr(data[i]) if i < len(data) else ""
+                    if arg == "" or not arg.isdigit():
+                        self.syntaxError()
+                        continue
+                    self.autoRange = False
+                    self.setRange(sign * int(arg))
+                    i += 1
+                self.restart()
+            elif c == "N" and arg in "345" and arg != "":
+                self.digits = 6 - int(arg)
+                self.restart()
+                i += 1
+            elif c == "T" and arg in "12345" and arg != "":
+                self.trigger = int(arg)
+                self.restart()
+                if self.trigger in (3, 5):
+                    self.triggered = time.monotonic()
+                i += 1
+            elif c == "Z" and arg in "01" and arg != "":
+                self.autoZero = arg == "1"
+                self.restart()
+                i += 1
+            elif c == "D" and arg in "123" and arg != "":
+                i += 1
+                self.display = int(arg)
+                if self.display == 1:
+                    self.text = ""
+                    continue
+                end = i
+                while end < len(data) and data[end] not in (10, 13):
+                    end += 1
+                self.text = data[i:end].decode(errors="replace")
+                i = end
+            elif c == "M" and len(data) >= i+2:
+                try:
+                    self.srqMask = int(data[i:i+2].decode(), 8)
+                except ValueError:
+                    self.syntaxError()
+                i += 2
+            elif c == "K":
+                self.spr = 0
+            elif c == "H" and arg in "01234567" and arg != "":
+                self.reset()
+                if arg != "0":
+                    self.function = int(arg)
+                i += 1
+            elif c == "B":
+                self.output = self.statusBytes()
+            elif c == "S":
+                self.output = b"1\r\n" if self.frontPorts else b"0\r\n"
+            elif c == "E":
+                self.output = ("{:02o}\r\n".format(self.err)).encode()
+                self.err = 0
+                self.spr &= ~self.SPR_HWERR
+            elif c == "W" and i < len(data):
+                self.output = bytes([0x40 | self.calRAM[data[i]]])
+                i += 1
+            elif c == "X" and len(data) >= i+2:
+                if self.calEnable:
+                    self.calRAM[data[i]] = data[i+1] & 0xf
+                i += 2
+            else:
+                self.syntaxError()
+
+    def statusBytes(self) -> bytes:
+        """Build the 5 byte binary status returned for `B`
+
+        Returns
+        -------
+        bytes
+            status bytes
+        """
+        sb1 = (self.function << 5) | (self.range << 2) | self.digits
+        sb2 = 0
+        if self.trigger == 1:  sb2 |= 1<<0
+        if self.autoRange:     sb2 |= 1<<1
+        if self.autoZero:      sb2 |= 1<<2
+        if self.freq50Hz:      sb2 |= 1<<3
+        if self.frontPorts:    sb2 |= 1<<4
+        if self.calEnable:     sb2 |= 1<<5
+        if self.trigger == 2:  sb2 |= 1<<6
+        return bytes([sb1, sb2, self.srqMask, self.err, 0])
+
+    def talk(self, timeout: float):
+        """Handle the device being addressed to talk
+
+        Blocks until a response is available like the real device holds the bus
+
+        Parameters
+        ----------
+        timeout : float
+            seconds to wait for a reading
+
+        Returns
+        -------
+        bytes|None
+            response; None if nothing was available before timeout
+        """
+        with self.lock:
+            if self.output is not None:
+                out = self.output
+                self.output = None
+                return out
+            now = time.monotonic()
+            ready = self.readyAt(now)
+        if ready is None:
+            time.sleep(timeout)
+            return None
+        if ready > now + timeout:
+            time.sleep(timeout)
+            return None
+        if ready > now:
+            time.sleep(ready - now)
+        with self.lock:
+            value = self.measure()
+            if self.trigger == 1:
+                self.consumed = max(self.consumed+1, self.completed(time.monotonic()))
+            else:
+                self.triggered = None
+                self.consumed += 1
+            self.notified = max(self.notified, self.consumed)
+            self.spr &= ~self.SPR_READING
+            return self.formatReading(value)
+
+
+class prologixSimulator(object):
+    """Emulated Prologix compatible USB-GPIB adapter on a pseudo-terminal
+
+    Attributes
+    ----------
+    port : str
+        path of the pseudo-terminal to open using `prologix`
+    devices : dict
+        Emulated instruments by GPIB address
+    latency : float
+        USB round trip time in seconds; half of it is applied in each direction
+    faults : dict
+        Probabilities for injected faults on responses:
+        `drop` (response lost), `corrupt` (single byte flipped),
+        `delay` (response delayed by `faultDelay` seconds)
+    faultDelay : float
+        Seconds a response is delayed by a `delay` fault
+    stats : dict
+        Counters for `transfers`, `commands`, `bytesIn` and `bytesOut`
+    """
+
+    VERSION = b"Prologix GPIB-USB Controller version 6.107 (simulated)\r\n"
+
+    def __init__(self, devices: dict=None, latency: float=0.002, faults: dict=None, faultDelay: float=0.1, seed: int=None):
+        """
+
+        Parameters
+        ----------
+        devices : dict, optional
+            Emulated instruments by GPIB address
+            by default a single hp3478aSimulator at address 22
+        latency : float, optional
+            USB round trip time in seconds
+            by default 0.002
+        faults : dict, optional
+            Probabilities for `drop`, `corrupt` and `delay` faults
+            by default None
+        faultDelay : float, optional
+            Seconds a response is delayed by a `delay` fault
+            by default 0.1
+        seed : int, optional
+            Seed for fault injection
+            by default None
+        """
+        if devices is None:
+            devices = {22: hp3478aSimulator(seed=seed)}
+        self.devices = devices
+        self.latency = latency
+        self.faults = faults or {}
+        self.faultDelay = faultDelay
+        self.random = random.Random(seed)
+        self.stats = {"transfers": 0, "commands": 0, "bytesIn": 0, "bytesOut": 0}
+        self.reset()
+
+        self.line = bytearray()
+        self.escape = False
+        self.escaped = False
+
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        self.port = os.ttyname(self.slave)
+        self.outQueue = queue.Queue()
+        self.running = False
+        self.threads = []
+
+    def reset(self):
+        """Return adapter settings to their defaults
+        """
+        self.addr = None
+        self.mode = 1
+        self.auto = 0
+        self.eoi = 0
+        self.eos = 0
+        self.eotEnable = 0
+        self.eotChar = 10
+        self.readTimeout = 0.5
+
+    def start(self):
+        """Start serving the pseudo-terminal
+
+        Returns
+        -------
+        prologixSimulator
+            self
+        """
+        self.running = True
+        self.threads = [
+            threading.Thread(target=self.runInput, daemon=True),
+            threading.Thread(target=self.runOutput, daemon=True),
+        ]
+        for thread in self.threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving and close the pseudo-terminal
+        """
+        self.running = False
+        self.outQueue.put(None)
+        for thread in self.threads:
+            thread.join()
+        os.close(self.master)
+        os.close(self.slave)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def runInput(self):
+        while self.running:
+            ready, _, _ = select.select([self.master], [], [], 0.05)
+            if not ready:
+                continue
+            try:
+                data = os.read(self.master, 65536)
+            except OSError:
+                return
+            self.stats["transfers"] += 1
+            self.stats["bytesIn"] += len(data)
+            time.sleep(self.latency / 2)
+            self.feed(data)
+
+    def runOutput(self):
+        while True:
+            item = self.outQueue.get()
+            if item is None:
+                return
+            due, data = item
+            delay = due - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            try:
+                os.write(self.master, data)
+            except OSError:
+                return
+            self.stats["bytesOut"] += len(data)
+
+    def respond(self, data: bytes):
+        """Queue data to be sent to the host after the USB latency
+
+        Parameters
+        ----------
+        data : bytes
+            response to send
+        """
+        delay = self.latency / 2
+        if self.random.random() < self.faults.get("drop", 0):
+            return
+        if len(data) > 0 and self.random.random() < self.faults.get("corrupt", 0):
+            data = bytearray(data)
+            pos = self.random.randrange(len(data))
+            data[pos] ^= 1 << self.random.randrange(8)
+            data = bytes(data)
+        if self.random.random() < self.faults.get("delay", 0):
+            delay += self.faultDelay
+        self.outQueue.put((time.monotonic() + delay, data))
+
+    def feed(self, data: bytes):
+        """Process data received from the host
+
+        Parameters
+        ----------
+        data : bytes
+            raw serial data
+        """
+        for b in data:
+            if self.escape:
+                self.escape = False
+                if len(self.line) < 2:
+                    self.escaped = True
+                self.line.append(b)
+            elif b == 27:
+                self.escape = True
+            elif b in (10, 13):
+                if len(self.line) > 0:
+                    line = bytes(self.line)
+                    escaped = self.escaped
+                    self.line = bytearray()
+                    self.escaped = False
+                    if line.startswith(b"++") and not escaped:
+                        self.command(line.decode(errors="replace"))
+                    else:
+                        self.deviceWrite(line)
+            else:
+                self.line.append(b)
+
+    def device(self, addr: int=None):
+        if addr is None:
+            addr = self.addr
+        return self.devices.get(addr)
+
+    def deviceWrite(self, data: bytes):
+        self.stats["commands"] += 1
+        device = self.device()
+        if device is None:
+            return
+        terminator = (b"\r\n", b"\r", b"\n", b"")[self.eos]
+        device.write(data + terminator)
+        if self.auto:
+            self.deviceRead()
+
+    def deviceRead(self, until: int=None):
+        device = self.device()
+        if device is None:
+            time.sleep(self.readTimeout)
+            return
+        out = device.talk(self.readTimeout)
+        if out is None:
+            return
+        if until is not None and until in out:
+            out = out[:out.index(until)+1]
+        if self.eotEnable:
+            out = out + bytes([self.eotChar])
+        self.respond(out)
+
+    def command(self, line: str):
+        self.stats["commands"] += 1
+        parts = line.split()
+        cmd = parts[0]
+        args = parts[1:]
+        if cmd == "++ver":
+            self.respond(self.VERSION)
+        elif cmd == "++addr":
+            if len(args) == 0:
+                self.respond((str(self.addr) + "\r\n").encode())
+            else:
+                self.addr = int(args[0])
+        elif cmd == "++read":
+            until = None
+            if len(args) > 0 and args[0] != "eoi":
+                until = int(args[0])
+            self.deviceRead(until)
+        elif cmd == "++clr":
+            device = self.device()
+            if device is not None:
+                device.clear()
+        elif cmd == "++trg":
+            addrs = [int(a) for a in args] if len(args) > 0 else [self.addr]
+            for addr in addrs:
+                device = self.device(addr)
+                if device is not None:
+                    device.triggerReading()
+        elif cmd == "++spoll":
+            device = self.device(int(args[0]) if len(args) > 0 else None)
+            if device is None:
+                time.sleep(self.readTimeout)
+                return
+            self.respond((str(device.serialPoll()) + "\r\n").encode())
+        elif cmd == "++srq":
+            srq = any(device.srq() for device in self.devices.values())
+            self.respond(b"1\r\n" if srq else b"0\r\n")
+        elif cmd == "++read_tmo_ms":
+            if len(args) == 0:
+                self.respond((str(int(self.readTimeout*1000)) + "\r\n").encode())
+            elif args[0].isdigit() and 1 <= int(args[0]) <= 3000:
+                self.readTimeout = int(args[0]) / 1000
+        elif cmd in ("++mode", "++auto", "++eoi", "++eos", "++eot_enable", "++eot_char"):
+            attr = {"++mode": "mode", "++auto": "auto", "++eoi": "eoi", "++eos": "eos",
+                    "++eot_enable": "eotEnable", "++eot_char": "eotChar"}[cmd]
+            if len(args) == 0:
+                self.respond((str(getattr(self, attr)) + "\r\n").encode())
+            elif args[0].isdigit():
+                setattr(self, attr, int(args[0]))
+        elif cmd == "++rst":
+            self.reset()
+        # ++ifc, ++loc, ++llo, ++savecfg and unknown commands are accepted silently
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Simulate a Prologix adapter with HP3478A multimeters")
+    parser.add_argument("--device", type=int, action="append", help="GPIB address of an emulated HP3478A; may be repeated")
+    parser.add_argument("--latency", type=float, default=0.002, help="USB round trip time in seconds")
+    parser.add_argument("--drop", type=float, default=0, help="Probability of dropped responses")
+    parser.add_argument("--corrupt", type=float, default=0, help="Probability of corrupted responses")
+    parser.add_argument("--delay", type=float, default=0, help="Probability of delayed responses")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed")
+    args = parser.parse_args()
+
+    addrs = args.device or [22]
+    sim = prologixSimulator(
+        devices={addr: hp3478aSimulator(seed=args.seed) for addr in addrs},
+        latency=args.latency,
+        faults={"drop": args.drop, "corrupt": args.corrupt, "delay": args.delay},
+        seed=args.seed,
+    )
+    sim.start()
+    print("Simulated Prologix adapter on " + sim.port + " with HP3478A at " + ", ".join(str(a) for a in addrs))
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        sim.stop()
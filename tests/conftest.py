@@ -0,0 +1,32 @@
+import os
+import sys
+
+import pytest
+
+# Modules live flat in the repository root, clients in their own folder
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "clients"))
+
+from simulator import prologixSimulator, hp3478aSimulator
+from prologix import prologix
+from hp3478a import hp3478a
+
+@pytest.fixture
+def meter():
+    return hp3478aSimulator(seed=1)
+
+@pytest.fixture
+def adapter(meter):
+    with prologixSimulator({22: meter}, seed=1) as sim:
+        yield sim
+
+@pytest.fixture
+def gpib(adapter):
+    gpib = prologix(adapter.port, timeout=0.5)
+    yield gpib
+    gpib.serial.close()
+
+@pytest.fixture
+def device(gpib):
+    return hp3478a(22, prologixGpib=gpib)
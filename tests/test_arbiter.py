@@ -0,0 +1,83 @@
+import time
+import threading
+
+import pytest
+
+from prologix import busArbiter
+
+def waitFor(condition, timeout: float=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+def grantOrder(arbiter: busArbiter, priorities: list) -> list:
+    """Queue one transaction per priority while the bus is taken, return the grant order
+    """
+    order = []
+    def worker(name, priority):
+        with arbiter.transaction(priority):
+            order.append(name)
+
+    arbiter.acquire()
+    threads = []
+    for name, priority in enumerate(priorities):
+        thread = threading.Thread(target=worker, args=(name, priority))
+        thread.start()
+        threads.append(thread)
+        # queue in a known order so equal priorities are comparable
+        waitFor(lambda: arbiter.queueDepth() == name + 1)
+    arbiter.release()
+    for thread in threads:
+        thread.join()
+    return order
+
+def test_lower_priority_value_is_granted_first():
+    assert grantOrder(busArbiter(aging=0.0), [20, 10, 0]) == [2, 1, 0]
+
+def test_equal_priorities_are_granted_in_order():
+    assert grantOrder(busArbiter(aging=0.0), [10, 10, 10]) == [0, 1, 2]
+
+def test_waiting_improves_priority():
+    # 10 priority levels per millisecond, the low priority waiter catches up quickly
+    arbiter = busArbiter(aging=10000.0)
+    order = []
+    def worker(name, priority):
+        with arbiter.transaction(priority):
+            order.append(name)
+
+    arbiter.acquire()
+    first = threading.Thread(target=worker, args=("low", 20))
+    first.start()
+    waitFor(lambda: arbiter.queueDepth() == 1)
+    time.sleep(0.05)
+    second = threading.Thread(target=worker, args=("high", 0))
+    second.start()
+    waitFor(lambda: arbiter.queueDepth() == 2)
+    arbiter.release()
+    first.join()
+    second.join()
+    assert order == ["low", "high"]
+
+def test_nested_transactions_are_granted_immediately():
+    arbiter = busArbiter()
+    with arbiter.transaction():
+        with arbiter.transaction(20):
+            assert arbiter.depth == 2
+    assert arbiter.owner is None
+    assert arbiter.stats()["transactions"] == 1
+
+def test_release_by_other_thread_fails():
+    arbiter = busArbiter()
+    arbiter.acquire()
+    errors = []
+    def release():
+        try:
+            arbiter.release()
+        except RuntimeError as e:
+            errors.append(e)
+    thread = threading.Thread(target=release)
+    thread.start()
+    thread.join()
+    arbiter.release()
+    assert len(errors) == 1
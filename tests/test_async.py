@@ -0,0 +1,170 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("serial_asyncio")
+
+from simulator import prologixSimulator, hp3478aSimulator
+from asyncprologix import AsyncPrologix, asyncArbiter
+from asynchp3478a import AsyncHp3478a
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+def test_arbiter_grants_by_priority():
+    async def main():
+        arbiter = asyncArbiter(aging=0.0)
+        order = []
+        async def worker(name, priority):
+            async with arbiter.transaction(priority):
+                order.append(name)
+        await arbiter.acquire()
+        tasks = []
+        for name, priority in enumerate([20, 10, 10, 0]):
+            tasks.append(asyncio.create_task(worker(name, priority)))
+            await asyncio.sleep(0)
+        await arbiter.release()
+        await asyncio.gather(*tasks)
+        return order
+    assert run(main()) == [3, 1, 2, 0]
+
+def test_arbiter_is_reentrant_per_task():
+    async def main():
+        arbiter = asyncArbiter()
+        async with arbiter.transaction():
+            async with arbiter.transaction():
+                assert arbiter.depth == 2
+        return arbiter.owner, arbiter.transactions
+    assert run(main()) == (None, 1)
+
+def test_cancelled_waiter_does_not_block():
+    async def main():
+        arbiter = asyncArbiter()
+        await arbiter.acquire()
+        first = asyncio.create_task(arbiter.acquire())
+        second = asyncio.create_task(arbiter.acquire(20))
+        await asyncio.sleep(0)
+        first.cancel()
+        await arbiter.release()
+        await asyncio.wait_for(second, 1.0)
+        return arbiter.owner is second, arbiter.queueDepth()
+    assert run(main()) == (True, 0)
+
+def test_device_shares_codec_state(adapter):
+    async def main():
+        meter = AsyncHp3478a(22, adapter.port, timeout=0.5)
+        assert await meter.connect()
+        try:
+            assert meter.codec.gpib is meter.gpib.codec
+            assert await meter.setFunction(meter.Ω2W)
+            assert meter.getFunction() == meter.FUNCTIONS[meter.Ω2W]
+            assert await meter.getMeasure() is not None
+            assert meter.gpib.skipped > 0
+        finally:
+            meter.gpib.close()
+    run(main())
+
+def test_set_and_verify_are_one_transaction(adapter):
+    async def main():
+        gpib = AsyncPrologix(adapter.port, timeout=0.5)
+        assert await gpib.connect()
+        first = AsyncHp3478a(22, prologixGpib=gpib)
+        second = AsyncHp3478a(22, prologixGpib=gpib)
+        writes = []
+        gpib.addTrace(lambda event: writes.append(event["cmd"]) if event["type"] == "write" and event["addr"] == 22 else None)
+        try:
+            assert await asyncio.gather(first.setFunction(first.VDC), second.setFunction(second.ADC)) == [True, True]
+        finally:
+            gpib.close()
+        return writes
+    assert run(main()) == ["F1", "B", "F5", "B"]
+
+def test_calibration_round_trip(meter, adapter):
+    async def main():
+        device = AsyncHp3478a(22, adapter.port, timeout=0.5)
+        await device.connect()
+        try:
+            return await device.getCalibration()
+        finally:
+            device.gpib.close()
+    assert run(main()) == bytes(0x40 | nibble for nibble in meter.calRAM)
+
+def test_acquire_restores_configuration(meter, adapter):
+    async def main():
+        device = AsyncHp3478a(22, adapter.port, timeout=0.5)
+        await device.connect()
+        try:
+            before = await device.getStatus()
+            readings = await device.acquire(5, digits=3.5)
+            after = await device.getStatus()
+        finally:
+            device.gpib.close()
+        return before, readings, after
+    before, readings, after = run(main())
+    assert len(readings) == 5
+    assert all(value is not None for timestamp, value in readings)
+    assert (after.digits, after.autoZero, after.range) == (before.digits, before.autoZero, before.range)
+
+def test_srq_stream(adapter):
+    async def main():
+        device = AsyncHp3478a(22, adapter.port, timeout=0.5)
+        await device.connect()
+        try:
+            readings = [reading async for reading in AsyncHp3478a.srqStream([device], count=3)]
+            mask = device.getSRQ(await device.getStatus())
+        finally:
+            device.gpib.close()
+        return readings, mask
+    readings, mask = run(main())
+    assert len(readings) == 3
+    assert all(value is not None for timestamp, device, value in readings)
+    assert mask == 0
+
+def test_srq_stream_stops_without_adapter(adapter, capsys):
+    async def main():
+        device = AsyncHp3478a(22, adapter.port, timeout=0.2)
+        await device.connect()
+        try:
+            stream = AsyncHp3478a.srqStream([device])
+            await stream.__anext__()
+            adapter.faults = {"drop": 1.0}
+            return [reading async for reading in stream]
+        finally:
+            device.gpib.close()
+    assert run(main()) == []
+    assert "did not report the SRQ line" in capsys.readouterr().out
+
+def test_group_stream_restores_trigger():
+    async def main(port):
+        gpib = AsyncPrologix(port, timeout=0.5)
+        await gpib.connect()
+        devices = [AsyncHp3478a(addr, prologixGpib=gpib) for addr in (22, 23)]
+        try:
+            frames = [frame async for frame in AsyncHp3478a.groupStream(devices, count=3)]
+            status = [await device.getStatus() for device in devices]
+        finally:
+            gpib.close()
+        return frames, status
+    with prologixSimulator({22: hp3478aSimulator(seed=1), 23: hp3478aSimulator(seed=2)}, seed=1) as sim:
+        frames, status = run(main(sim.port))
+    assert len(frames) == 3
+    assert all(len(values) == 2 and None not in values for timestamp, values in frames)
+    assert all(s.triggerInternal for s in status)
+
+def test_calibrations_of_several_adapters(tmp_path):
+    meters = [hp3478aSimulator(seed=seed) for seed in range(3)]
+    async def main(ports):
+        first = AsyncPrologix(ports[0], timeout=0.5)
+        second = AsyncPrologix(ports[1], timeout=0.5)
+        devices = [AsyncHp3478a(22, prologixGpib=first), AsyncHp3478a(23, prologixGpib=first), AsyncHp3478a(5, prologixGpib=second)]
+        await first.connect()
+        await second.connect()
+        try:
+            return await AsyncHp3478a.getCalibrations(devices, str(tmp_path / "cal-{index}-{addr}.data"))
+        finally:
+            first.close()
+            second.close()
+    with prologixSimulator({22: meters[0], 23: meters[1]}, seed=1) as first, prologixSimulator({5: meters[2]}, seed=2) as second:
+        results = run(main([first.port, second.port]))
+    assert results == [bytes(0x40 | nibble for nibble in meter.calRAM) for meter in meters]
+    assert (tmp_path / "cal-2-5.data").read_bytes() == results[2]
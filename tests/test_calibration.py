@@ -0,0 +1,46 @@
+from simulator import hp3478aSimulator
+
+def dump(nibbles: list) -> bytes:
+    return bytes(0x40 | nibble for nibble in nibbles)
+
+def test_dump_matches_calibration_ram(meter, device):
+    cdata = device.getCalibration()
+    assert cdata == dump(meter.calRAM)
+    assert device.calibrationErrors(cdata) == []
+
+def test_wrong_checksum_is_found(meter, device):
+    cdata = bytearray(dump(meter.calRAM))
+    # first cell of record 3
+    cdata[1 + 3*device.CAL_RECORD_SIZE] ^= 0x01
+    assert device.calibrationErrors(cdata) == [3]
+
+def test_wrong_checksum_is_not_written(meter, device, capsys):
+    meter.calEnable = True
+    original = list(meter.calRAM)
+    cdata = bytearray(dump(hp3478aSimulator(seed=2).calRAM))
+    cdata[1] ^= 0x01
+    assert not device.setCalibration(cdata)
+    assert meter.calRAM == original
+    assert "Wrong checksum" in capsys.readouterr().out
+
+def test_write_protected_calibration(meter, device, capsys):
+    original = list(meter.calRAM)
+    assert not device.setCalibration(dump(hp3478aSimulator(seed=2).calRAM))
+    assert meter.calRAM == original
+    assert "CAL ENABLE" in capsys.readouterr().out
+
+def test_write_calibration(meter, device):
+    meter.calEnable = True
+    new = hp3478aSimulator(seed=2).calRAM
+    assert device.setCalibration(dump(new))
+    assert meter.calRAM == new
+
+def test_write_legacy_255_byte_dump(meter, device):
+    meter.calEnable = True
+    last = meter.calRAM[255]
+    new = hp3478aSimulator(seed=2).calRAM
+    cdata = dump(new)[:device.CAL_SIZE_LEGACY]
+    assert device.calibrationErrors(cdata) == []
+    assert device.setCalibration(cdata)
+    assert meter.calRAM[:255] == new[:255]
+    assert meter.calRAM[255] == last
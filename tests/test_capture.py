@@ -0,0 +1,36 @@
+from capture import readCapture, replaySerial, DIR_WRITE, DIR_READ
+from prologix import prologix
+from hp3478a import hp3478a
+
+def test_capture_round_trip(adapter, tmp_path):
+    filename = str(tmp_path / "session.cap")
+    gpib = prologix(adapter.port, timeout=0.5, adaptive=False, capture=filename)
+    response = gpib.cmdPoll("B", 22)
+    gpib.stopCapture()
+    gpib.serial.close()
+
+    records = readCapture(filename)
+    writes = [data for direction, timestamp, data in records if direction == DIR_WRITE]
+    reads = b"".join(data for direction, timestamp, data in records if direction == DIR_READ)
+    assert writes[0] == b"++ver\n"
+    assert b"\nB\n" in writes[-1]
+    assert reads.endswith(response.encode("ascii"))
+    assert [timestamp for direction, timestamp, data in records] == sorted(timestamp for direction, timestamp, data in records)
+
+def test_capture_mid_session_replays(adapter, tmp_path):
+    filename = str(tmp_path / "traffic.cap")
+    gpib = prologix(adapter.port, timeout=0.5, adaptive=False)
+    meter = hp3478a(22, prologixGpib=gpib)
+    meter.getMeasure()
+
+    gpib.startCapture(filename)
+    captured = [meter.getMeasure() for i in range(5)]
+    gpib.stopCapture()
+    gpib.serial.close()
+
+    replay = replaySerial(filename)
+    meter = hp3478a(22, replay, timeout=0.5)
+    assert meter.gpib.serial is replay
+    assert [meter.getMeasure() for i in range(5)] == captured
+    assert replay.mismatches == 0
+    assert replay.finished()
@@ -0,0 +1,13 @@
+from hp3478a import hp3478a
+
+def test_srq_stream_yields_readings(device):
+    readings = list(hp3478a.srqStream([device], count=3))
+    assert len(readings) == 3
+    assert all(reading[1] is device and reading[2] is not None for reading in readings)
+
+def test_srq_stream_stops_without_adapter(adapter, device, capsys):
+    stream = hp3478a.srqStream([device])
+    next(stream)
+    adapter.faults = {"drop": 1.0}
+    assert list(stream) == []
+    assert "did not report the SRQ line" in capsys.readouterr().out
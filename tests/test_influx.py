@@ -0,0 +1,110 @@
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+from influx import influxWriter
+
+class fakeInflux(ThreadingHTTPServer):
+    """Collect posted points, answer 503 while `down` is set
+    """
+
+    def __init__(self):
+        self.down = False
+        self.posts = 0
+        self.lines = []
+        self.lock = threading.Lock()
+        super().__init__(("127.0.0.1", 0), fakeHandler)
+
+class fakeHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"])).decode()
+        with self.server.lock:
+            self.server.posts += 1
+            if not self.server.down:
+                self.server.lines += body.splitlines()
+        self.send_response(503 if self.server.down else 204)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def server():
+    server = fakeInflux()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def writer(server, tmp_path, **kwargs) -> influxWriter:
+    return influxWriter(port=server.server_address[1], spillFile=str(tmp_path / "influx.spill"), **kwargs)
+
+def test_points_are_written_in_batches(server, tmp_path):
+    out = writer(server, tmp_path, batchSize=10, maxAge=0.05)
+    out.start()
+    for i in range(25):
+        out.put("m v=" + str(i) + "i " + str(i))
+    out.stop()
+    assert server.lines == ["m v=" + str(i) + "i " + str(i) for i in range(25)]
+    assert out.stats()["points"] == 25
+
+def test_new_points_do_not_shorten_retry_delay(server, tmp_path, capsys):
+    server.down = True
+    out = writer(server, tmp_path, batchSize=1, maxAge=0.0, retryDelay=0.5)
+    out.start()
+    end = time.monotonic() + 1.5
+    i = 0
+    while time.monotonic() < end:
+        out.put("m v=" + str(i) + "i " + str(i))
+        i += 1
+        time.sleep(0.01)
+    posts = server.posts
+    server.down = False
+    out.stop()
+    assert 2 <= posts <= 4
+    assert len(server.lines) == i
+
+def test_failed_batches_are_kept_in_the_queue(server, tmp_path, capsys):
+    server.down = True
+    out = writer(server, tmp_path, batchSize=5, maxAge=0.0, retryDelay=0.1, capacity=100, policy=influxWriter.POLICY_SPILL)
+    out.start()
+    for i in range(20):
+        out.put("m v=" + str(i) + "i " + str(i))
+    time.sleep(0.3)
+    assert out.stats()["spilled"] == 0
+    server.down = False
+    out.stop()
+    assert len(server.lines) == 20
+
+def test_overflow_is_spilled_and_written_later(server, tmp_path, capsys):
+    server.down = True
+    out = writer(server, tmp_path, batchSize=5, maxAge=0.0, retryDelay=0.1, capacity=10, policy=influxWriter.POLICY_SPILL)
+    out.start()
+    for i in range(30):
+        out.put("m v=" + str(i) + "i " + str(i))
+    time.sleep(0.3)
+    assert out.stats()["spilled"] == 20
+    server.down = False
+    deadline = time.monotonic() + 5.0
+    while out.stats()["spilled"] > 0 or out.stats()["depth"] > 0:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    out.stop()
+    assert sorted(server.lines) == sorted("m v=" + str(i) + "i " + str(i) for i in range(30))
+    assert not (tmp_path / "influx.spill").exists()
+    assert not (tmp_path / "influx.spill.draining").exists()
+
+def test_queue_overflow_drops_oldest(server, tmp_path, capsys):
+    server.down = True
+    out = writer(server, tmp_path, batchSize=5, maxAge=0.0, retryDelay=0.1, capacity=10)
+    out.start()
+    for i in range(30):
+        out.put("m v=" + str(i) + "i " + str(i))
+    time.sleep(0.3)
+    server.down = False
+    out.stop()
+    assert out.stats()["dropped"] == 20
+    assert server.lines == ["m v=" + str(i) + "i " + str(i) for i in range(20, 30)]
@@ -0,0 +1,74 @@
+import pytest
+
+from prologix import prologix, latencyTracker
+
+KEY = (22, "B")
+
+def learn(gpib, seconds: float, key=KEY, count: int=16):
+    for i in range(count):
+        gpib.latency.record(key, seconds)
+
+def test_tracker_waits_for_enough_samples():
+    tracker = latencyTracker(minSamples=4)
+    for i in range(3):
+        tracker.record(KEY, 0.1)
+    assert tracker.timeout(KEY, 2.5) == 2.5
+    tracker.record(KEY, 0.1)
+    assert tracker.timeout(KEY, 2.5) == pytest.approx(0.2)
+
+def test_tracker_limits():
+    tracker = latencyTracker(minSamples=1, minimum=0.05, maximum=1.0)
+    tracker.record(KEY, 0.001)
+    assert tracker.timeout(KEY, 2.5) == 0.05
+    tracker.record("slow", 5.0)
+    assert tracker.timeout("slow", 2.5) == 1.0
+
+def test_tracker_backs_off_after_timeouts():
+    tracker = latencyTracker(minSamples=1)
+    tracker.record(KEY, 0.1)
+    for i in range(10):
+        tracker.failed(KEY)
+    assert tracker.timeout(KEY, 2.5) == pytest.approx(0.2 * tracker.maxBackoff)
+    tracker.record(KEY, 0.1)
+    assert tracker.timeout(KEY, 2.5) == pytest.approx(0.2)
+
+@pytest.mark.parametrize("timeout", [2.5, 1.1, 0.3])
+def test_configured_timeout_is_not_rounded(adapter, timeout):
+    gpib = prologix(adapter.port, timeout=timeout)
+    try:
+        assert gpib.readTimeout() == timeout
+        assert gpib.readTimeout(KEY) == timeout
+        gpib.latency.failed(KEY)
+        assert gpib.readTimeout(KEY) == timeout
+    finally:
+        gpib.serial.close()
+
+def test_learned_timeout_is_quantized(gpib):
+    learn(gpib, 0.03)
+    # 2 * 30 ms rounded up to 64 ms
+    assert gpib.readTimeout(KEY) == 0.064
+    learn(gpib, 0.031)
+    assert gpib.readTimeout(KEY) == 0.064
+
+def test_learned_timeout_is_capped_by_configured_timeout(gpib):
+    learn(gpib, 0.2)
+    # 2 * 200 ms would round up to 512 ms
+    assert gpib.readTimeout(KEY) == gpib.timeout
+
+def test_backoff_is_capped_by_configured_timeout(gpib):
+    learn(gpib, 0.01)
+    gpib.latency.failed(KEY)
+    gpib.latency.failed(KEY)
+    # 2 * 10 ms, four times, rounded up
+    assert gpib.readTimeout(KEY) == 0.128
+    for i in range(4):
+        gpib.latency.failed(KEY)
+    assert gpib.readTimeout(KEY) == gpib.timeout
+
+def test_fixed_timeout_without_adaption(adapter):
+    gpib = prologix(adapter.port, timeout=0.5, adaptive=False)
+    try:
+        learn(gpib, 0.01)
+        assert gpib.readTimeout(KEY) == 0.5
+    finally:
+        gpib.serial.close()
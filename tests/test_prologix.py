@@ -0,0 +1,40 @@
+from prologix import prologix
+
+def test_repeated_address_is_skipped(gpib):
+    gpib.cmdWrite("F1", 22)
+    skipped = gpib.skipped
+    gpib.cmdWrite("F2", 22)
+    assert gpib.skipped == skipped + 1
+    assert gpib.state["++addr"] == "22"
+
+def test_changed_address_is_sent(gpib):
+    gpib.cmdWrite("F1", 22)
+    events = []
+    gpib.addTrace(events.append)
+    gpib.cmdWrite("F1", 23)
+    assert [event["cmd"] for event in events if event["type"] == "write"] == ["++addr 23", "F1"]
+
+def test_queries_are_never_skipped(gpib):
+    skipped = gpib.skipped
+    assert "Prologix" in gpib.cmdPoll("++ver", read=False)
+    assert "Prologix" in gpib.cmdPoll("++ver", read=False)
+    assert gpib.skipped == skipped
+
+def test_resync_sends_configuration_again(gpib):
+    gpib.cmdWrite("F1", 22)
+    events = []
+    gpib.addTrace(events.append)
+    gpib.resync()
+    gpib.cmdWrite("F1", 22)
+    sent = [event["cmd"] for event in events if event["type"] == "write"]
+    assert "++mode 1" in sent
+    assert "++addr 22" in sent
+
+def test_cache_can_be_disabled(adapter):
+    gpib = prologix(adapter.port, timeout=0.5, cache=False)
+    try:
+        gpib.cmdWrite("F1", 22)
+        gpib.cmdWrite("F1", 22)
+        assert gpib.skipped == 0
+    finally:
+        gpib.serial.close()